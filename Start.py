@@ -1,6 +1,8 @@
 # Start.py
 
 import streamlit as st
+from shared_store import render_store_stats
+from watch_folder import render_watch_folder_controls, sync_session_from_watcher
 
 st.set_page_config(
     page_title="Kalkulator Zapotrzebowania",
@@ -12,9 +14,11 @@ st.set_page_config(
 if 'forecast_data' not in st.session_state:
     st.session_state.forecast_data = None
     st.session_state.forecast_filename = None
+    st.session_state.forecast_key = None
 if 'stock_data' not in st.session_state:
     st.session_state.stock_data = None
     st.session_state.stock_filename = None
+    st.session_state.stock_key = None
 if 'selected_material' not in st.session_state:
     st.session_state.selected_material = None
 
@@ -66,6 +70,9 @@ st.markdown("""
 # Podsumowanie w sidebarze
 st.sidebar.title("📋 Status Aplikacji")
 
+render_watch_folder_controls()
+sync_session_from_watcher()
+
 if st.session_state.forecast_filename:
     st.sidebar.success(f"✅ Prognoza: **{st.session_state.forecast_filename}**")
     if st.session_state.forecast_data is not None:
@@ -84,3 +91,5 @@ else:
 if st.session_state.forecast_data is not None and st.session_state.stock_data is not None:
     st.sidebar.success("🎉 **Gotowe do analizy!**")
     st.sidebar.info("Przejdź do Dashboard lub Analizy Szczegółowej")
+
+render_store_stats()
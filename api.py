@@ -0,0 +1,324 @@
+# api.py
+#
+# Lokalna usługa HTTP z planami AS-IS/TO-BE trzymanymi w pamięci.
+# Uruchomienie: python api.py --forecast prognoza.csv --stock dostepne_ilosci.xlsx [--port 8765]
+#
+# Endpointy (GET, odpowiedzi JSON):
+#   /health                      - stan usługi i wczytane pliki
+#   /summary?status=&limit=&offset= - podsumowanie jak na Dashboardzie
+#   /materials?q=&mode=&page=    - wyszukiwanie materiałów (prefiks lub fragment numeru)
+#   /materials/<numer>           - plan AS-IS i TO-BE jednego materiału
+#   /kpis                        - wskaźniki portfela i projekcja tydzień po tygodniu
+#   /metrics                     - opóźnienia obsługi żądań per endpoint
+#   /quality                     - raport jakości danych i materiały wykluczone z analizy
+# POST /reload - ponowne wczytanie plików z dysku.
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from material_index import MaterialIndex
+from validation import prepare_inputs
+from utils import (
+    process_forecast_file,
+    process_stock_file,
+    simulate_portfolio,
+    analyze_all_materials_batch,
+    aggregate_portfolio_projection,
+    get_date_range_from_week,
+    STATUS_LABELS
+)
+
+def _to_builtin(value):
+    """Zamienia typy numpy/pandas na typy JSON (nieskończoność i NaN jako null)."""
+    if isinstance(value, dict):
+        return {str(k): _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray, pd.Index)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+class PlanningState:
+    """Dane planistyczne wczytane raz i trzymane w pamięci między żądaniami."""
+
+    def __init__(self, forecast_path: str, stock_path: str):
+        self.forecast_path = forecast_path
+        self.stock_path = stock_path
+        self._lock = threading.RLock()
+        self.reload()
+
+    def reload(self):
+        """Wczytuje pliki przez parsery z ``utils`` i przelicza symulacje wsadowe."""
+        with open(self.forecast_path, 'rb') as forecast_file:
+            forecast_df = process_forecast_file(forecast_file)
+        with open(self.stock_path, 'rb') as stock_file:
+            stock_df = process_stock_file(stock_file, self.stock_path)
+        forecast_df, stock_df, quality_report = prepare_inputs(forecast_df, stock_df)
+
+        portfolio = simulate_portfolio(forecast_df, stock_df)
+        summary_df = analyze_all_materials_batch(forecast_df, stock_df, portfolio)
+        rows = {int(m): r for r, m in enumerate(portfolio['materials'])}
+
+        # Podmiana całego stanu naraz - równoległe żądania widzą stary albo nowy komplet
+        with self._lock:
+            self.forecast_df = forecast_df
+            self.stock_df = stock_df
+            self.portfolio = portfolio
+            self.summary_df = summary_df
+            self.quality_report = quality_report
+            self.material_index = MaterialIndex(portfolio['materials'])
+            self._rows = rows
+            self.loaded_at = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return self.portfolio, self.summary_df, self._rows
+
+    def summary(self, status: str = None, limit: int = None, offset: int = 0) -> dict:
+        _, summary_df, _ = self.snapshot()
+        if status:
+            summary_df = summary_df[summary_df['Status'] == status]
+        total = len(summary_df)
+        page = summary_df.iloc[offset:offset + limit] if limit else summary_df.iloc[offset:]
+        return {'total': total, 'offset': offset, 'items': page.to_dict('records')}
+
+    def quality(self, limit: int = 100) -> dict:
+        """Podsumowanie raportu jakości z pierwszymi wierszami każdego problemu."""
+        with self._lock:
+            report = self.quality_report
+        return {
+            'excluded_materials': report.excluded_materials,
+            'issues': [
+                {
+                    'code': code,
+                    'level': issue['level'],
+                    'description': issue['description'],
+                    'rows': len(issue['rows']),
+                    'materials': len(issue['materials']),
+                    'sample': issue['rows'].head(limit).to_dict('records')
+                }
+                for code, issue in report.issues.items()
+            ]
+        }
+
+    def kpis(self) -> dict:
+        portfolio, summary_df, _ = self.snapshot()
+        projection = aggregate_portfolio_projection(portfolio)
+        errors = summary_df['Status'].astype(str).str.startswith('❌')
+        return {
+            'materials': len(summary_df),
+            'ok': int((summary_df['Status'] == '✅ OK').sum()),
+            'shortages': int(summary_df['Braki'].sum()),
+            'excess': int(summary_df['Nadmiar'].sum()),
+            'errors': int(errors.sum()),
+            'total_stock': float(summary_df['Stan magazynowy'].sum()),
+            'projection': projection.to_dict('records')
+        }
+
+    def material_plan(self, material: int):
+        """Zwraca plan AS-IS i TO-BE materiału z macierzy symulacji wsadowej lub None."""
+        portfolio, _, rows = self.snapshot()
+        row = rows.get(material)
+        if row is None:
+            return None
+
+        as_is, to_be = portfolio['as_is'], portfolio['to_be']
+        steps = as_is['status'].shape[1]
+        weeks = [str(col).strip() for col in portfolio['weeks']]
+        forecast = portfolio['forecast'][row]
+        income = portfolio['income'][row].toarray().ravel()
+        consumption = portfolio['consumption'][row].toarray().ravel()
+
+        plan = {'as_is': [], 'to_be': []}
+        for i in range(steps):
+            week = {
+                'week': weeks[i],
+                'date_range': get_date_range_from_week(weeks[i]),
+                'demand': forecast[i],
+                'consumption_zs': consumption[i],
+                'buffer_next_week': forecast[i + 1]
+            }
+            status = int(as_is['status'][row, i])
+            plan['as_is'].append({
+                **week,
+                'stock_start': as_is['stock_start'][row, i],
+                'income_zp': income[i],
+                'stock_end': as_is['stock_end'][row, i],
+                'status': status,
+                'status_label': STATUS_LABELS[status]
+            })
+            target = int(to_be['target_week'][row, i])
+            postponed = to_be['postponed'][row, i]
+            plan['to_be'].append({
+                **week,
+                'stock_start': to_be['stock_start'][row, i],
+                'income_zp': to_be['income'][row, i],
+                'stock_end': to_be['stock_end'][row, i],
+                'production': to_be['production'][row, i],
+                'postponed': postponed,
+                'postponed_to': (weeks[target] if target >= 0 else "Poza horyzontem") if postponed > 0 else None,
+                'received': to_be['received'][row, i]
+            })
+
+        return {
+            'material': material,
+            'current_stock': portfolio['stock'][row],
+            'standard_batch': portfolio['batch'][row],
+            **plan
+        }
+
+# Endpointy z osobnymi metrykami - pozostałe ścieżki trafiają do jednego klucza '/other'
+ROUTES = {'health', 'summary', 'materials', 'kpis', 'metrics', 'quality', 'reload'}
+
+class LatencyMetrics:
+    """Opóźnienia obsługi żądań per endpoint (ostatnie ``window`` pomiarów)."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+
+    def record(self, route: str, seconds: float):
+        with self._lock:
+            self._samples[route].append(seconds * 1000)
+            self._counts[route] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            report = {}
+            for route, samples in self._samples.items():
+                values = np.fromiter(samples, dtype=float)
+                report[route] = {
+                    'count': self._counts[route],
+                    'mean_ms': values.mean(),
+                    'p50_ms': np.percentile(values, 50),
+                    'p95_ms': np.percentile(values, 95),
+                    'p99_ms': np.percentile(values, 99),
+                    'max_ms': values.max()
+                }
+            return report
+
+class PlanningRequestHandler(BaseHTTPRequestHandler):
+    """Obsługa żądań HTTP - stan i metryki są atrybutami serwera."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(_to_builtin(payload), ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method: str):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        state = self.server.state
+        # Liczba kluczy metryk nie rośnie z liczbą różnych nieznanych ścieżek
+        route = '/' + parts[0] if parts and parts[0] in ROUTES else '/other'
+
+        try:
+            if method == 'POST' and parts == ['reload']:
+                state.reload()
+                self._send_json(200, {'reloaded': True, 'materials': len(state.material_index)})
+            elif method != 'GET':
+                self._send_json(405, {'error': 'Metoda niedozwolona'})
+            elif parts == ['health']:
+                self._send_json(200, {
+                    'status': 'ok',
+                    'forecast': state.forecast_path,
+                    'stock': state.stock_path,
+                    'materials': len(state.material_index),
+                    'loaded_at': state.loaded_at
+                })
+            elif parts == ['summary']:
+                limit = int(query['limit']) if 'limit' in query else None
+                self._send_json(200, state.summary(query.get('status'), limit, int(query.get('offset', 0))))
+            elif parts == ['kpis']:
+                self._send_json(200, state.kpis())
+            elif parts == ['quality']:
+                self._send_json(200, state.quality(int(query.get('limit', 100))))
+            elif parts == ['metrics']:
+                self._send_json(200, self.server.metrics.report())
+            elif parts == ['materials']:
+                matches = state.material_index.search(query.get('q', ''), query.get('mode', 'prefix'))
+                page = int(query.get('page', 1))
+                self._send_json(200, {
+                    'total': len(matches),
+                    'page': page,
+                    'items': state.material_index.page(matches, page, int(query.get('page_size', 200)))
+                })
+            elif len(parts) == 2 and parts[0] == 'materials':
+                plan = state.material_plan(int(parts[1]))
+                if plan is None:
+                    self._send_json(404, {'error': f"Nie znaleziono danych dla materiału {parts[1]}"})
+                else:
+                    self._send_json(200, plan)
+            else:
+                self._send_json(404, {'error': 'Nieznany endpoint'})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+        finally:
+            self.server.metrics.record(f"{method} {route}", time.perf_counter() - start)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+def create_server(state: PlanningState, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    """Tworzy serwer HTTP (``port=0`` wybiera wolny port - przydatne w testach)."""
+    server = ThreadingHTTPServer((host, port), PlanningRequestHandler)
+    server.state = state
+    server.metrics = LatencyMetrics()
+    return server
+
+def serve_in_background(state: PlanningState, host: str = '127.0.0.1', port: int = 0):
+    """Uruchamia serwer w wątku w tle. Zwraca (serwer, wątek); zatrzymanie: ``server.shutdown()``."""
+    server = create_server(state, host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokalne API z planami AS-IS/TO-BE.")
+    parser.add_argument('--forecast', required=True, help="Plik prognozy (CSV/XLSX).")
+    parser.add_argument('--stock', required=True, help="Plik dostępnych ilości (CSV/XLSX).")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    state = PlanningState(args.forecast, args.stock)
+    server = create_server(state, args.host, args.port)
+    print(f"🚀 API gotowe: http://{args.host}:{server.server_address[1]} ({len(state.material_index)} materiałów)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
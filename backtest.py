@@ -0,0 +1,278 @@
+# backtest.py
+#
+# Backtest rekomendacji AS-IS/TO-BE na historycznych migawkach eksportów.
+# Uruchomienie: python backtest.py KATALOG [--workers 4] [--output backtest.xlsx]
+# Migawka = para plików (prognoza + stan) z datą RRRR-MM-DD w nazwie, np.
+# prognoza_2025-03-03.csv i stan_2025-03-03.xlsx.
+
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from validation import prepare_inputs
+from watch_folder import detect_file_kind, SUPPORTED_EXTENSIONS
+from utils import (
+    process_forecast_file,
+    process_stock_file,
+    simulate_portfolio,
+    analyze_all_materials_batch,
+    forecast_week_positions,
+    STATUS_SHORTAGE
+)
+
+SNAPSHOT_DATE = re.compile(r'(\d{4}-\d{2}-\d{2})')
+METRIC_COLUMNS = [
+    'Obserwacji', 'TP', 'FP', 'FN', 'TN', 'Precyzja', 'Czułość', 'Trafność',
+    'MAE zapasu', 'Błąd średni zapasu', 'Precyzja produkcji TO-BE', 'Pokrycie braków TO-BE'
+]
+
+def week_key(year, week):
+    """Klucz tygodnia ISO jako liczba RRRRTT (porównywalny i sortowalny)."""
+    return np.asarray(year, dtype=np.int64) * 100 + np.asarray(week, dtype=np.int64)
+
+def week_label(key) -> str:
+    return f"{int(key) // 100}-W{int(key) % 100:02d}"
+
+def find_snapshots(directory: str) -> pd.DataFrame:
+    """Migawki w katalogu: kolumny 'Data', 'Prognoza', 'Stan' (posortowane wg daty).
+
+    Typ pliku rozpoznawany jest po nagłówku jak w folderze obserwowanym;
+    daty bez kompletu plików są pomijane.
+    """
+    files = {}
+    for name in sorted(os.listdir(directory)):
+        match = SNAPSHOT_DATE.search(name)
+        path = os.path.join(directory, name)
+        if not match or not name.lower().endswith(SUPPORTED_EXTENSIONS):
+            continue
+        kind = detect_file_kind(path)
+        if kind is not None:
+            files.setdefault(match.group(1), {})[kind] = path
+
+    rows = [
+        (pd.Timestamp(date), kinds['forecast'], kinds['stock'])
+        for date, kinds in files.items() if {'forecast', 'stock'} <= kinds.keys()
+    ]
+    return pd.DataFrame(rows, columns=['Data', 'Prognoza', 'Stan']).sort_values('Data', ignore_index=True)
+
+def _week_predictions(portfolio: dict) -> pd.DataFrame:
+    """Prognozy migawki: dla każdego materiału i tygodnia - czy AS-IS przewiduje brak na jego początku.
+
+    Status AS-IS tygodnia ``i`` porównuje zapas końcowy z popytem tygodnia
+    ``i + 1``, więc przewidywanie dotyczy tygodnia ``i + 1`` (jego stanu początkowego).
+    """
+    as_is, to_be = portfolio['as_is'], portfolio['to_be']
+    materials = portfolio['materials']
+    steps = as_is['status'].shape[1]
+    positions = forecast_week_positions(portfolio['weeks'])
+    keys = np.full(len(portfolio['weeks']), -1, dtype=np.int64)
+    keys[positions['pos'].to_numpy()] = week_key(positions['year'], positions['week'])
+
+    frame = pd.DataFrame({
+        'Materiał': np.repeat(materials, steps),
+        'Tydzień': np.tile(keys[1:steps + 1], len(materials)),
+        'Horyzont [tyg.]': np.tile(np.arange(1, steps + 1), len(materials)),
+        'Brak AS-IS': (as_is['status'] == STATUS_SHORTAGE).ravel(),
+        'Zapas AS-IS': as_is['stock_end'].ravel(),
+        'Zapas TO-BE': to_be['stock_end'].ravel(),
+        'Produkcja TO-BE': (to_be['production'] > 0).ravel()
+    })
+    return frame[frame['Tydzień'] >= 0]
+
+def _observed_state(portfolio: dict, snapshot_date: pd.Timestamp) -> pd.DataFrame:
+    """Stan faktyczny z migawki: zapas na dzień migawki i popyt jej bieżącego tygodnia.
+
+    Brak faktyczny = zapas nie pokrywa popytu tygodnia migawki (jak bufor AS-IS).
+    Bez kolumny prognozy dla tego tygodnia brak nie jest oceniany.
+    """
+    year, week, _ = snapshot_date.isocalendar()
+    positions = forecast_week_positions(portfolio['weeks'])
+    current = positions[(positions['year'] == year) & (positions['week'] == week)]['pos']
+    demand = (
+        portfolio['forecast'][:, current.iloc[0]] if len(current)
+        else np.full(len(portfolio['materials']), np.nan)
+    )
+    observed = pd.DataFrame({
+        'Materiał': portfolio['materials'],
+        'Tydzień': int(week_key(year, week)),
+        'Zapas faktyczny': portfolio['stock'],
+        'Popyt tygodnia': demand,
+        'Brak faktyczny': portfolio['stock'] < demand
+    })
+    return observed[~np.isnan(demand)]
+
+def replay_snapshot(snapshot_date, forecast_path: str, stock_path: str) -> dict:
+    """Odtwarza analizę jednej migawki: wczytanie, walidacja, AS-IS/TO-BE i podsumowanie.
+
+    Podsumowanie pochodzi z ``analyze_all_materials_batch`` - wyniki zgodne
+    z ``analyze_all_materials`` (sprawdza to ``equivalence.py``).
+    """
+    snapshot_date = pd.Timestamp(snapshot_date)
+    with open(forecast_path, 'rb') as forecast_file:
+        forecast_df = process_forecast_file(forecast_file)
+    with open(stock_path, 'rb') as stock_file:
+        stock_df = process_stock_file(stock_file, stock_path)
+    forecast_df, stock_df, _ = prepare_inputs(forecast_df, stock_df)
+
+    portfolio = simulate_portfolio(forecast_df, stock_df)
+    summary = analyze_all_materials_batch(forecast_df, stock_df, portfolio)
+    year, week, _ = snapshot_date.isocalendar()
+    return {
+        'date': snapshot_date,
+        'week': int(week_key(year, week)),
+        'predictions': _week_predictions(portfolio),
+        'verdicts': summary[['Materiał', 'Status', 'Braki']],
+        'observed': _observed_state(portfolio, snapshot_date)
+    }
+
+def _metrics(matched: pd.DataFrame, keys) -> pd.DataFrame:
+    """Macierz pomyłek i miary trafności przewidywań braków (grupowane wg ``keys``)."""
+    predicted, actual = matched['Brak AS-IS'], matched['Brak faktyczny']
+    production = matched['Produkcja TO-BE']
+    error = matched['Zapas AS-IS'] - matched['Zapas faktyczny']
+    counts = pd.DataFrame({
+        'Obserwacji': 1,
+        'TP': predicted & actual,
+        'FP': predicted & ~actual,
+        'FN': ~predicted & actual,
+        'TN': ~predicted & ~actual,
+        'abs_error': error.abs(),
+        'error': error,
+        'production_hit': production & actual,
+        'production': production
+    })
+    if keys:
+        grouped = counts.groupby([matched[key] for key in keys])
+        sums, means = grouped.sum(), grouped[['abs_error', 'error']].mean()
+    else:
+        sums, means = counts.sum().to_frame().T, counts[['abs_error', 'error']].mean().to_frame().T
+
+    def ratio(numerator, denominator):
+        return numerator / denominator.where(denominator > 0)
+
+    positives = sums['TP'] + sums['FN']
+    result = sums[['Obserwacji', 'TP', 'FP', 'FN', 'TN']].astype(np.int64).assign(**{
+        'Precyzja': ratio(sums['TP'], sums['TP'] + sums['FP']),
+        'Czułość': ratio(sums['TP'], positives),
+        'Trafność': ratio(sums['TP'] + sums['TN'], sums['Obserwacji']),
+        'MAE zapasu': means['abs_error'],
+        'Błąd średni zapasu': means['error'],
+        'Precyzja produkcji TO-BE': ratio(sums['production_hit'], sums['production']),
+        'Pokrycie braków TO-BE': ratio(sums['production_hit'], positives)
+    })
+    return result.reset_index() if keys else result[METRIC_COLUMNS]
+
+def _verdict_outcomes(results) -> pd.DataFrame:
+    """Werdykt BRAKI migawki a to, czy brak faktycznie wystąpił w późniejszych migawkach jej horyzontu."""
+    observed = pd.concat([r['observed'] for r in results], ignore_index=True)
+    outcomes = []
+    for result in results:
+        horizon_end = result['predictions']['Tydzień'].max()
+        later = observed[(observed['Tydzień'] > result['week']) & (observed['Tydzień'] <= horizon_end)]
+        if later.empty:
+            continue
+        actual = later.groupby('Materiał')['Brak faktyczny'].any()
+        verdicts = result['verdicts'].set_index('Materiał')
+        verdicts = verdicts[verdicts.index.isin(actual.index)]
+        outcomes.append(pd.DataFrame({
+            'Migawka': result['date'],
+            'Materiał': verdicts.index,
+            'Werdykt': verdicts['Status'].to_numpy(),
+            'Przewidziany brak': verdicts['Braki'].to_numpy(dtype=bool),
+            'Brak w horyzoncie': actual.reindex(verdicts.index).to_numpy(dtype=bool)
+        }))
+    columns = ['Migawka', 'Materiał', 'Werdykt', 'Przewidziany brak', 'Brak w horyzoncie']
+    return pd.concat(outcomes, ignore_index=True) if outcomes else pd.DataFrame(columns=columns)
+
+def evaluate_backtest(results) -> dict:
+    """Porównuje przewidywania każdej migawki ze stanem pokazanym przez migawki późniejsze.
+
+    Zwraca słownik tabel: 'overall' (cały portfel), 'materials' (per materiał),
+    'horizon' (wg liczby tygodni wyprzedzenia), 'verdicts' (werdykty BRAKI
+    podsumowania) i 'matched' (pary przewidywanie - obserwacja).
+    """
+    results = sorted(results, key=lambda r: r['date'])
+    # Kilka migawek w jednym tygodniu - obowiązuje najwcześniejsza (stan z początku tygodnia)
+    observed = pd.concat([r['observed'] for r in results], ignore_index=True).drop_duplicates(
+        ['Materiał', 'Tydzień'], keep='first'
+    )
+    predictions = pd.concat(
+        [r['predictions'].assign(Migawka=r['date'], **{'Tydzień migawki': r['week']}) for r in results],
+        ignore_index=True
+    )
+    matched = predictions.merge(observed, on=['Materiał', 'Tydzień'])
+    matched = matched[matched['Tydzień'] > matched['Tydzień migawki']].reset_index(drop=True)
+
+    verdicts = _verdict_outcomes(results)
+    verdict_hit = verdicts['Przewidziany brak'] == verdicts['Brak w horyzoncie']
+    overall = _metrics(matched, [])
+    overall['Trafność werdyktu BRAKI'] = verdict_hit.mean() if len(verdicts) else np.nan
+
+    materials = _metrics(matched, ['Materiał']).merge(
+        verdict_hit.groupby(verdicts['Materiał']).mean().rename('Trafność werdyktu BRAKI').reset_index(),
+        on='Materiał', how='left'
+    )
+    matched['Tydzień'] = matched['Tydzień'].map(week_label)
+    return {
+        'overall': overall,
+        'materials': materials.sort_values(['Czułość', 'Obserwacji'], ascending=[True, False], ignore_index=True),
+        'horizon': _metrics(matched, ['Horyzont [tyg.]']),
+        'verdicts': verdicts,
+        'matched': matched.drop(columns='Tydzień migawki')
+    }
+
+def run_backtest(snapshots: pd.DataFrame, max_workers: int = None) -> dict:
+    """Odtwarza wszystkie migawki równolegle (procesy) i ocenia trafność przewidywań.
+
+    Każdy proces sam wczytuje pliki swojej migawki - do procesu głównego
+    wracają tylko kompaktowe tabele przewidywań i obserwacji.
+    """
+    if len(snapshots) < 2:
+        raise ValueError("Backtest wymaga co najmniej dwóch migawek z różnymi datami.")
+    workers = max_workers or min(len(snapshots), os.cpu_count() or 1)
+    if workers <= 1:
+        results = list(map(replay_snapshot, snapshots['Data'], snapshots['Prognoza'], snapshots['Stan']))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(replay_snapshot, snapshots['Data'], snapshots['Prognoza'], snapshots['Stan']))
+    return evaluate_backtest(results)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Backtest rekomendacji AS-IS/TO-BE na historycznych migawkach.")
+    parser.add_argument('directory', help="Katalog z migawkami (data RRRR-MM-DD w nazwach plików).")
+    parser.add_argument('--workers', type=int, default=None, help="Liczba procesów (domyślnie liczba CPU).")
+    parser.add_argument('--output', default=None, help="Plik .xlsx z pełnymi wynikami.")
+    args = parser.parse_args(argv)
+
+    snapshots = find_snapshots(args.directory)
+    print(f"📂 Migawki: {len(snapshots)} ({', '.join(snapshots['Data'].dt.strftime('%Y-%m-%d'))})")
+    try:
+        report = run_backtest(snapshots, args.workers)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    with pd.option_context('display.width', 200, 'display.max_columns', 20, 'display.float_format', '{:,.3f}'.format):
+        print("\n📊 Cały portfel:")
+        print(report['overall'].T.to_string(header=False))
+        print("\n⏱️ Wg horyzontu:")
+        print(report['horizon'].to_string(index=False))
+        print("\n🔻 Materiały z najniższą czułością:")
+        print(report['materials'].head(10).to_string(index=False))
+
+    if args.output:
+        with pd.ExcelWriter(args.output, engine='openpyxl') as writer:
+            report['overall'].to_excel(writer, sheet_name='Portfel', index=False)
+            report['horizon'].to_excel(writer, sheet_name='Horyzont', index=False)
+            report['materials'].to_excel(writer, sheet_name='Materiały', index=False)
+            report['verdicts'].to_excel(writer, sheet_name='Werdykty', index=False)
+        print(f"\n💾 Zapisano: {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# bom.py
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from utils import analyze_all_materials_batch
+
+# Kolumny pliku BOM i ich akceptowane nazwy
+BOM_ALIASES = {
+    'Rodzic': ['Rodzic', 'Wyrób', 'parent'],
+    'Komponent': ['Komponent', 'component'],
+    'Ilość': ['Ilość', 'Ilość na szt.', 'quantity']
+}
+DEMAND_SOURCES = {'forecast': "Prognoza wyrobów", 'production': "Produkcja TO-BE"}
+
+def read_bom(df: pd.DataFrame) -> pd.DataFrame:
+    """Struktura BOM: kolumny 'Rodzic', 'Komponent', 'Ilość' (na sztukę rodzica).
+
+    Wiersze z nieczytelnym (np. alfanumerycznym) numerem materiału lub ilością
+    <= 0 są pomijane i zwracane w ``attrs['dropped_rows']`` (oryginalne wiersze
+    pliku) do pokazania użytkownikowi. Powtórzone pary rodzic-komponent są sumowane.
+    """
+    columns = {}
+    for name, aliases in BOM_ALIASES.items():
+        source = next((col for col in aliases if col in df.columns), None)
+        if source is None:
+            raise ValueError(f"Brak kolumny '{name}' w pliku BOM.")
+        columns[name] = df[source]
+    bom = pd.DataFrame({
+        'Rodzic': pd.to_numeric(columns['Rodzic'], errors='coerce'),
+        'Komponent': pd.to_numeric(columns['Komponent'], errors='coerce'),
+        'Ilość': pd.to_numeric(columns['Ilość'].astype(str).str.replace(',', '.', regex=False), errors='coerce')
+    })
+    valid = bom.notna().all(axis=1) & (bom['Ilość'] > 0)
+    bom = bom[valid].astype({'Rodzic': np.int64, 'Komponent': np.int64})
+    if (bom['Rodzic'] == bom['Komponent']).any():
+        raise ValueError("Materiał jest własnym komponentem - cykl w strukturze BOM.")
+    result = bom.groupby(['Rodzic', 'Komponent'], as_index=False)['Ilość'].sum()
+    result.attrs['dropped_rows'] = df[~valid.to_numpy()]
+    return result
+
+def bom_matrix(bom: pd.DataFrame):
+    """Zwraca (pozycje, macierz CSR pozycje × pozycje) z ilością komponentu na sztukę rodzica."""
+    parents = bom['Rodzic'].to_numpy(dtype=np.int64)
+    components = bom['Komponent'].to_numpy(dtype=np.int64)
+    items = np.union1d(parents, components)
+    matrix = sparse.csr_matrix(
+        (bom['Ilość'].to_numpy(dtype=float), (np.searchsorted(items, parents), np.searchsorted(items, components))),
+        shape=(len(items), len(items))
+    )
+    return items, matrix
+
+def explode_demand(parent_demand: np.ndarray, matrix: sparse.csr_matrix):
+    """Zapotrzebowanie zależne wszystkich poziomów BOM (pozycje × tygodnie).
+
+    Każdy poziom to jeden iloczyn rzadkiej macierzy BOM z gęstym popytem
+    poziomu wyżej, więc koszt rośnie z liczbą powiązań × głębokość, a nie
+    z kwadratem liczby pozycji. Zwraca (popyt zależny, niski kod poziomu
+    pozycji, głębokość); niski kod = najgłębszy poziom, na którym pozycja występuje.
+    """
+    transposed = matrix.T.tocsr()
+    # Liczniki int64 - przy węższym typie suma po wielu rodzicach się przepełnia
+    links = transposed.astype(bool).astype(np.int64)
+    dependent = np.zeros_like(parent_demand, dtype=float)
+    level_code = np.zeros(matrix.shape[0], dtype=np.int64)
+    demand, reach = np.asarray(parent_demand, dtype=float), np.ones(matrix.shape[0], dtype=np.int64)
+
+    for depth in range(1, matrix.shape[0] + 2):
+        reach = (links @ reach > 0).astype(np.int64)
+        if not reach.any():
+            return dependent, level_code, depth - 1
+        level_code[reach > 0] = depth
+        demand = transposed @ demand
+        dependent += demand
+    raise ValueError("Cykl w strukturze BOM - komponent jest (pośrednio) swoim rodzicem.")
+
+def component_demand(forecast_df: pd.DataFrame, bom: pd.DataFrame, portfolio: dict = None,
+                     source: str = 'forecast') -> pd.DataFrame:
+    """Tygodniowy popyt komponentów w układzie prognozy (komponenty × tygodnie).
+
+    ``source`` - 'forecast': rozwijana jest prognoza wyrobów; 'production':
+    akcje produkcji TO-BE z ``portfolio`` (popyt komponentu w tygodniu produkcji
+    rodzica). Półprodukty są rozwijane partia na partię, bez czasów realizacji.
+    Własna prognoza komponentu (jeśli jest w pliku) jest w obu trybach dodawana
+    do jego popytu zależnego i rozwijana na jego komponenty.
+    Atrybut ``attrs['bom_depth']`` to liczba poziomów struktury.
+    """
+    items, matrix = bom_matrix(bom)
+    weeks = list(forecast_df.columns)
+    forecast_unique = forecast_df[~forecast_df.index.duplicated(keep='first')]
+    independent = forecast_unique.reindex(items).fillna(0).to_numpy(dtype=float)
+    is_component = np.isin(items, bom['Komponent'].to_numpy(dtype=np.int64))
+
+    parent_demand = independent.copy()
+    if source == 'production':
+        # Wyroby gotowe rozwijane z produkcji TO-BE, komponenty - z własnej prognozy
+        production = portfolio['to_be']['production']
+        finished = np.isin(portfolio['materials'], items[~is_component])
+        parent_demand[~is_component] = 0
+        parent_demand[np.searchsorted(items, portfolio['materials'][finished]), :production.shape[1]] = production[finished]
+
+    dependent, level_code, depth = explode_demand(parent_demand, matrix)
+    result = pd.DataFrame(
+        dependent[is_component] + independent[is_component],
+        index=pd.Index(items[is_component], name=forecast_df.index.name),
+        columns=weeks
+    )
+    result.attrs['bom_depth'] = depth
+    result.attrs['level_code'] = pd.Series(level_code[is_component], index=result.index)
+    return result
+
+def analyze_components(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, bom: pd.DataFrame,
+                       portfolio: dict = None, source: str = 'forecast') -> dict:
+    """Analiza AS-IS komponentów: rozwinięcie BOM i ta sama analiza wsadowa co dla wyrobów.
+
+    Stan, ZP i ZS komponentów pochodzą z pliku stanu; komponenty bez dokumentów
+    dostają wiersz błędu jak w ``analyze_all_materials_batch``.
+    Zwraca słownik: 'demand' (popyt komponentów), 'summary' (podsumowanie z kolumnami
+    'Poziom BOM' i 'Popyt zależny'), 'depth' (liczba poziomów BOM) i 'dropped_rows'
+    (wiersze BOM pominięte przy wczytywaniu).
+    """
+    demand = component_demand(forecast_df, bom, portfolio, source)
+    summary = analyze_all_materials_batch(demand, stock_df)
+    forecast_unique = forecast_df[~forecast_df.index.duplicated(keep='first')]
+    own_demand = forecast_unique.sum(axis=1).reindex(demand.index).fillna(0).to_numpy()
+    summary.insert(1, 'Poziom BOM', demand.attrs['level_code'].to_numpy())
+    summary.insert(4, 'Popyt zależny', demand.sum(axis=1).to_numpy() - own_demand)
+    return {
+        'demand': demand,
+        'summary': summary,
+        'depth': demand.attrs['bom_depth'],
+        'dropped_rows': bom.attrs.get('dropped_rows', pd.DataFrame())
+    }
@@ -0,0 +1,227 @@
+# bulk_export.py
+
+import io
+import os
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from scipy import sparse
+
+from utils import (
+    simulate_portfolio,
+    portfolio_records,
+    as_is_frame,
+    to_be_frame
+)
+
+EXPORT_FORMATS = {
+    'xlsx': ('plany_as_is_to_be.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'zip': ('plany_as_is_to_be.zip', 'application/zip')
+}
+# Limit wierszy arkusza Excela - dłuższe eksporty trafiają do kolejnych arkuszy
+EXCEL_MAX_ROWS = 1_048_576
+
+class ExportCancelled(Exception):
+    """Eksport przerwany, bo jego wynik nie jest już potrzebny (nowy eksport lub koniec sesji)."""
+
+def _flow_series(flows, row: int, index: pd.Index) -> pd.Series:
+    """Wiersz macierzy przepływów portfela jako seria w układzie kolumn prognozy."""
+    values = flows[row].toarray().ravel() if sparse.issparse(flows) else np.asarray(flows[row], dtype=float)
+    return pd.Series(values, index=index)
+
+def iter_material_plans(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, portfolio: dict = None):
+    """Generator zwracający po kolei (materiał, tabela AS-IS, tabela TO-BE, błąd) dla wszystkich materiałów.
+
+    Symulacje pochodzą z silników wsadowych (``simulate_portfolio``, można przekazać
+    gotowy wynik z dashboardu). Błąd jednego materiału nie przerywa eksportu - materiał
+    dostaje tabele ``None`` i opis błędu.
+    """
+    if portfolio is None:
+        portfolio = simulate_portfolio(forecast_df, stock_df)
+    forecast_unique = forecast_df[~forecast_df.index.duplicated(keep='first')]
+
+    for row, material in enumerate(portfolio['materials']):
+        material = int(material)
+        try:
+            forecast_series = forecast_unique.loc[material]
+            aligned_income = _flow_series(portfolio['income'], row, forecast_series.index)
+            aligned_consumption = _flow_series(portfolio['consumption'], row, forecast_series.index)
+            as_is, to_be = portfolio_records(portfolio, row)
+            # Etykiety renderowane tylko dla materiału zapisywanego w danej chwili
+            yield (
+                material,
+                as_is_frame(as_is, forecast_series, aligned_income, aligned_consumption),
+                to_be_frame(to_be, forecast_series, aligned_consumption),
+                None
+            )
+        except Exception as e:
+            yield material, None, None, str(e)
+
+def _errors_frame(errors) -> pd.DataFrame:
+    return pd.DataFrame(errors, columns=['Materiał', 'Błąd'])
+
+def _write_csv(zf: zipfile.ZipFile, name: str, frame: pd.DataFrame):
+    """Zapisuje tabelę w tym samym formacie co pobieranie CSV na stronie analizy."""
+    with zf.open(name, 'w') as raw:
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+        frame.to_csv(text, index=False, sep=';', decimal=',')
+        text.flush()
+        text.detach()
+
+def write_zip(plans, path: str, progress=None) -> int:
+    """Zapisuje plany jako archiwum ZIP z plikami as_is_{n}.csv i to_be_{n}.csv.
+
+    Materiały z błędem trafiają do pliku bledy.csv. Zwraca liczbę błędów.
+    """
+    errors = []
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for material, as_is_df, to_be_df, error in plans:
+            if error is not None:
+                errors.append((material, error))
+            else:
+                _write_csv(zf, f"as_is_{material}.csv", as_is_df)
+                _write_csv(zf, f"to_be_{material}.csv", to_be_df)
+            if progress:
+                progress()
+        if errors:
+            _write_csv(zf, "bledy.csv", _errors_frame(errors))
+    return len(errors)
+
+class _RollingSheet:
+    """Arkusz trybu strumieniowego przechodzący na kolejny ('AS-IS 2', ...) po osiągnięciu limitu wierszy."""
+
+    def __init__(self, wb: Workbook, name: str, max_rows: int):
+        self.wb = wb
+        self.name = name
+        self.max_rows = max_rows
+        self.count = 0
+        self.ws = None
+        self.rows = 0
+
+    def append_frame(self, material, frame: pd.DataFrame):
+        if not len(frame):
+            return
+        # Wiersze jednego materiału zostają w jednym arkuszu (nagłówek + tabela)
+        if self.ws is None or self.rows + len(frame) > self.max_rows:
+            self.count += 1
+            self.ws = self.wb.create_sheet(self.name if self.count == 1 else f"{self.name} {self.count}")
+            self.ws.append(['Materiał', *frame.columns])
+            self.rows = 1
+        for row in frame.itertuples(index=False):
+            self.ws.append([material, *row])
+        self.rows += len(frame)
+
+def write_xlsx(plans, path: str, progress=None, max_rows: int = EXCEL_MAX_ROWS) -> int:
+    """Zapisuje plany jako skoroszyt z arkuszami AS-IS i TO-BE (tryb strumieniowy openpyxl).
+
+    Po przekroczeniu ``max_rows`` wierszy arkusza kolejne materiały trafiają do
+    arkuszy 'AS-IS 2', 'TO-BE 2' itd. Materiały z błędem trafiają do arkusza 'Błędy'.
+    Zwraca liczbę błędów.
+    """
+    wb = Workbook(write_only=True)
+    sheets = {'AS-IS': _RollingSheet(wb, 'AS-IS', max_rows), 'TO-BE': _RollingSheet(wb, 'TO-BE', max_rows)}
+    errors = []
+
+    for material, as_is_df, to_be_df, error in plans:
+        if error is not None:
+            errors.append((material, error))
+        else:
+            sheets['AS-IS'].append_frame(material, as_is_df)
+            sheets['TO-BE'].append_frame(material, to_be_df)
+        if progress:
+            progress()
+
+    if errors:
+        ws = wb.create_sheet('Błędy')
+        ws.append(['Materiał', 'Błąd'])
+        for row in errors:
+            ws.append(list(row))
+    if not wb.worksheets:
+        wb.create_sheet('AS-IS')
+    wb.save(path)
+    return len(errors)
+
+class BulkExportJob:
+    """Eksport zbiorczy planów wykonywany w wątku w tle.
+
+    Wiersze są zapisywane do pliku tymczasowego na bieżąco, materiał po
+    materiale, więc zużycie pamięci nie zależy od wielkości portfela.
+    ``data_key`` identyfikuje dane wejściowe - po ich podmianie eksport jest nieaktualny.
+    """
+
+    def __init__(self, forecast_df: pd.DataFrame, stock_df: pd.DataFrame, export_format: str = 'xlsx',
+                 portfolio: dict = None, data_key=None):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Niewspierany format eksportu: {export_format}")
+        self.forecast_df = forecast_df
+        self.stock_df = stock_df
+        self.portfolio = portfolio
+        self.data_key = data_key
+        self.export_format = export_format
+        self.file_name, self.mime = EXPORT_FORMATS[export_format]
+        self.total = len(portfolio['materials']) if portfolio is not None else None
+        self.done = 0
+        self.failed = 0
+        self.error = None
+        self.path = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'BulkExportJob':
+        self._thread.start()
+        return self
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    @property
+    def finished(self) -> bool:
+        return self._thread.ident is not None and not self._thread.is_alive()
+
+    @property
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 0.0
+
+    def _advance(self):
+        if self._cancelled:
+            raise ExportCancelled()
+        self.done += 1
+
+    def _run(self):
+        fd, path = tempfile.mkstemp(suffix=f".{self.export_format}")
+        os.close(fd)
+        try:
+            if self.portfolio is None:
+                self.portfolio = simulate_portfolio(self.forecast_df, self.stock_df)
+                self.total = len(self.portfolio['materials'])
+            plans = iter_material_plans(self.forecast_df, self.stock_df, self.portfolio)
+            writer = write_xlsx if self.export_format == 'xlsx' else write_zip
+            self.failed = writer(plans, path, progress=self._advance)
+            with self._lock:
+                if not self._cancelled:
+                    self.path = path
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            if self.path != path and os.path.exists(path):
+                os.remove(path)
+            # Dane wejściowe nie są już potrzebne - nie trzymamy referencji po zakończeniu
+            self.forecast_df = None
+            self.stock_df = None
+            self.portfolio = None
+
+    def cleanup(self):
+        """Przerywa trwający eksport i usuwa plik wynikowy z dysku (wywoływane przy podmianie i końcu sesji)."""
+        with self._lock:
+            self._cancelled = True
+            path, self.path = self.path, None
+        if path and os.path.exists(path):
+            os.remove(path)
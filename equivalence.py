@@ -0,0 +1,347 @@
+# equivalence.py
+#
+# Porównanie różnicowe silników symulacji z implementacją referencyjną.
+# Uruchomienie: python equivalence.py [--seeds 5] [--materials 300]
+# Kod wyjścia 1 oznacza rozbieżność wyników lub spadek wydajności poniżej progu.
+
+import argparse
+import datetime
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from material_index import MaterialIndex
+from utils import (
+    process_forecast_file,
+    process_stock_file,
+    extract_material_data,
+    align_material_flows,
+    run_as_is_simulation,
+    run_optimized_simulation,
+    analyze_all_materials,
+    analyze_all_materials_batch,
+    build_portfolio_arrays,
+    run_as_is_batch,
+    run_optimized_batch,
+    receivable_weeks,
+    STATUS_SHORTAGE,
+    STATUS_EXCESS
+)
+
+PLAN_KEYS = ['Materiał', 'Tydzień']
+PLAN_COLUMNS = [
+    'Status AS-IS', 'Zapas koniec AS-IS',
+    'Przychód ZP TO-BE', 'Zapas koniec TO-BE', 'Produkcja', 'Przesunięto', 'Cel', 'Przyjęto'
+]
+SUMMARY_NUMERIC = ['Stan magazynowy', 'Popyt całkowity', 'Śr. popyt tyg.', 'Pokrycie [tyg.]', 'Partia std.']
+SUMMARY_FLAGS = ['Status', 'Braki', 'Nadmiar']
+
+# Partia z danych (domyślnie) - w przeciwnym razie wymuszona wartość dla wszystkich materiałów
+DATA_BATCH = object()
+
+class NamedBytes(io.BytesIO):
+    """Plik w pamięci z atrybutem ``name`` - zachowuje się jak plik wgrany w Streamlit."""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+def make_synthetic_files(n_materials: int = 200, weeks=None, seed: int = 0, missing_stock: float = 0.0,
+                         fractional: bool = False, zp_share: float = 0.5, padded_columns: bool = False,
+                         docs_per_material: int = 5, missing_weeks: int = 0):
+    """Generuje pliki prognozy i dostępnych ilości w formacie eksportu ERP (CSV ';')."""
+    rng = np.random.default_rng(seed)
+    if weeks is None:
+        weeks = [(2025, w) for w in range(10, 40)]
+    doc_weeks = list(weeks)
+    if missing_weeks:
+        # Tygodnie z dokumentami, ale bez kolumny w prognozie
+        dropped = set(rng.choice(len(weeks), size=min(missing_weeks, len(weeks)), replace=False).tolist())
+        weeks = [w for i, w in enumerate(weeks) if i not in dropped]
+
+    materials = np.arange(100000, 100000 + n_materials)
+    forecast = {'Materialnummer': materials}
+    for i, (year, week) in enumerate(weeks):
+        name = f"KW {week:02d}/{year % 100:02d}" if i % 2 == 0 else f"{week:02d}.{year}"
+        if padded_columns and i % 5 == 3:
+            name += " "
+        values = rng.integers(0, 500, n_materials).astype(float)
+        if fractional:
+            values += rng.random(n_materials).round(3)
+        forecast[name] = values
+    forecast_csv = pd.DataFrame(forecast).to_csv(sep=';', index=False, decimal=',').encode('utf-8')
+
+    rows = []
+    stock_materials = materials[rng.random(n_materials) >= missing_stock]
+    for material in stock_materials:
+        stock = float(rng.integers(0, 3000)) + (round(rng.random(), 2) if fractional else 0.0)
+        for k in range(int(rng.integers(1, docs_per_material + 1))):
+            year, week = doc_weeks[int(rng.integers(0, len(doc_weeks)))]
+            date = datetime.date.fromisocalendar(year, week, int(rng.integers(1, 6)))
+            kind = 'ZP' if rng.random() < zp_share else 'ZS'
+            quantity = float(rng.integers(50, 2000)) + (round(rng.random(), 2) if fractional else 0.0)
+            rows.append({
+                'numer indeksu': material,
+                'DocNum': f"{kind}/{k}/{year % 100}",
+                'Data dostawy': date.strftime('%d-%m-%Y') if rng.random() > 0.02 else 'brak',
+                'Zamówione': quantity,
+                'Potwierdzone': round(quantity * rng.random(), 2),
+                'w magazynie': stock
+            })
+    stock_columns = ['numer indeksu', 'DocNum', 'Data dostawy', 'Zamówione', 'Potwierdzone', 'w magazynie']
+    stock_csv = pd.DataFrame(rows, columns=stock_columns).to_csv(sep=';', index=False, decimal=',').encode('utf-8')
+
+    return NamedBytes(forecast_csv, 'prognoza.csv'), NamedBytes(stock_csv, 'dostepne_ilosci.csv')
+
+def make_synthetic_inputs(n_materials: int = 200, seed: int = 0, **kwargs):
+    """Zwraca (forecast_df, stock_df) po przejściu przez parsery z ``utils``."""
+    forecast_file, stock_file = make_synthetic_files(n_materials, seed=seed, **kwargs)
+    return process_forecast_file(forecast_file), process_stock_file(stock_file, stock_file.name)
+
+def edge_case_inputs(seed: int = 0):
+    """Zwraca listę (nazwa, forecast_df, stock_df, partia) z przypadkami brzegowymi."""
+    cases = []
+    for horizon in (1, 2, 3, 4):
+        cases.append((f"horyzont {horizon} tyg.", dict(n_materials=40, weeks=[(2025, w) for w in range(10, 10 + horizon)]), DATA_BATCH))
+    cases += [
+        ("brakujące tygodnie", dict(n_materials=80, missing_weeks=6), DATA_BATCH),
+        ("przełom roku", dict(n_materials=80, weeks=[(2024, w) for w in range(45, 53)] + [(2025, w) for w in range(1, 9)]), DATA_BATCH),
+        ("brak ZP (partia None)", dict(n_materials=60, zp_share=0.0), DATA_BATCH),
+        ("tylko ZP", dict(n_materials=60, zp_share=1.0, docs_per_material=8), DATA_BATCH),
+        ("ilości ułamkowe", dict(n_materials=80, fractional=True), DATA_BATCH),
+        ("spacje w nazwach kolumn", dict(n_materials=80, padded_columns=True), DATA_BATCH),
+        ("materiały bez stanu", dict(n_materials=80, missing_stock=0.3), DATA_BATCH),
+        ("partia 0", dict(n_materials=60), 0),
+        ("partia None", dict(n_materials=60), None),
+    ]
+    return [
+        (name, *make_synthetic_inputs(seed=seed, **params), batch)
+        for name, params, batch in cases
+    ]
+
+def _canonical_plan(material: int, weeks, as_is: np.ndarray, to_be: np.ndarray) -> pd.DataFrame:
+    """Postać kanoniczna rekordów symulacji jednego materiału."""
+    steps = len(as_is)
+    week_names = np.array([str(col).strip() for col in weeks[:steps]] + ["Poza horyzontem"], dtype=object)
+    postponed = to_be['postponed']
+    return pd.DataFrame({
+        'Materiał': np.full(steps, material, dtype=np.int64),
+        'Tydzień': week_names[:steps],
+        'Status AS-IS': as_is['status'].astype(int),
+        'Zapas koniec AS-IS': as_is['stock_end'],
+        'Przychód ZP TO-BE': to_be['income'],
+        'Zapas koniec TO-BE': to_be['stock_end'],
+        'Produkcja': to_be['production'],
+        'Przesunięto': postponed,
+        'Cel': np.where(postponed > 0, week_names[to_be['target_week']], ""),
+        'Przyjęto': to_be['received']
+    }, columns=PLAN_KEYS + PLAN_COLUMNS)
+
+def reference_plans(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, batch_override=DATA_BATCH) -> pd.DataFrame:
+    """Plany AS-IS/TO-BE z implementacji referencyjnej w postaci kanonicznej (wiersz = materiał × tydzień)."""
+    frames = []
+    for material in MaterialIndex.from_data(forecast_df, stock_df).materials:
+        material = int(material)
+        current_stock, weekly_zp, weekly_zs, batch_size = extract_material_data(stock_df, material)
+        if batch_override is not DATA_BATCH:
+            batch_size = batch_override
+        forecast_series = forecast_df.loc[material]
+        if isinstance(forecast_series, pd.DataFrame):
+            forecast_series = forecast_series.iloc[0]
+        aligned_income, aligned_consumption = align_material_flows(forecast_series, weekly_zp, weekly_zs)
+
+        as_is = run_as_is_simulation(current_stock, forecast_series, aligned_income, aligned_consumption)
+        to_be = run_optimized_simulation(current_stock, forecast_series, aligned_income, aligned_consumption, batch_size)
+        frames.append(_canonical_plan(material, forecast_series.index, as_is, to_be))
+    if not frames:
+        return pd.DataFrame(columns=PLAN_KEYS + PLAN_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def batch_plans(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, batch_override=DATA_BATCH) -> pd.DataFrame:
+    """Plany AS-IS/TO-BE z silnika wsadowego w tej samej postaci kanonicznej co ``reference_plans``."""
+    portfolio = build_portfolio_arrays(forecast_df, stock_df)
+    materials, weeks = portfolio['materials'], portfolio['weeks']
+    batch = portfolio['batch']
+    if batch_override is not DATA_BATCH:
+        batch = np.full(len(materials), np.nan if batch_override is None else float(batch_override))
+    receivable = receivable_weeks(weeks)
+
+    as_is = run_as_is_batch(portfolio['stock'], portfolio['forecast'], portfolio['income'], portfolio['consumption'])
+    to_be = run_optimized_batch(
+        portfolio['stock'], portfolio['forecast'], portfolio['income'], portfolio['consumption'], batch, receivable
+    )
+    steps = as_is['status'].shape[1]
+    week_names = np.array([str(col).strip() for col in weeks[:steps]] + ["Poza horyzontem"], dtype=object)
+
+    postponed = to_be['postponed'].ravel()
+    return pd.DataFrame({
+        'Materiał': np.repeat(materials, steps),
+        'Tydzień': np.tile(week_names[:steps], len(materials)),
+        'Status AS-IS': as_is['status'].ravel().astype(int),
+        'Zapas koniec AS-IS': as_is['stock_end'].ravel(),
+        'Przychód ZP TO-BE': to_be['income'].ravel(),
+        'Zapas koniec TO-BE': to_be['stock_end'].ravel(),
+        'Produkcja': to_be['production'].ravel(),
+        'Przesunięto': postponed,
+        'Cel': np.where(postponed > 0, week_names[to_be['target_week'].ravel()], ""),
+        'Przyjęto': to_be['received'].ravel()
+    }, columns=PLAN_KEYS + PLAN_COLUMNS)
+
+# Akcje i statusy, które musi zawierać plan referencyjny losowego portfela - inaczej porównanie niczego nie sprawdza
+COVERAGE_CHECKS = {
+    'popyt > 0': lambda forecast_df, plans: forecast_df.to_numpy().sum() > 0,
+    'BRAK AS-IS': lambda forecast_df, plans: (plans['Status AS-IS'] == STATUS_SHORTAGE).any(),
+    'NADMIAR AS-IS': lambda forecast_df, plans: (plans['Status AS-IS'] == STATUS_EXCESS).any(),
+    'PRODUKCJA': lambda forecast_df, plans: (plans['Produkcja'] > 0).any(),
+    'PRZESUNIĘTO': lambda forecast_df, plans: (plans['Przesunięto'] > 0).any(),
+    'PRZYJĘTO': lambda forecast_df, plans: (plans['Przyjęto'] > 0).any()
+}
+
+def missing_coverage(forecast_df: pd.DataFrame, plans: pd.DataFrame) -> list:
+    """Zwraca nazwy warunków z ``COVERAGE_CHECKS``, których scenariusz nie spełnia."""
+    return [name for name, check in COVERAGE_CHECKS.items() if not check(forecast_df, plans)]
+
+ENGINES = {
+    'reference': {
+        'plans': reference_plans,
+        'summary': analyze_all_materials,
+        'min_materials_per_s': 20
+    },
+    'batch': {
+        'plans': batch_plans,
+        'summary': analyze_all_materials_batch,
+        'min_materials_per_s': 2000
+    }
+}
+
+def diff_plans(expected: pd.DataFrame, actual: pd.DataFrame) -> pd.DataFrame:
+    """Porównuje plany wiersz po wierszu i zwraca listę rozbieżności."""
+    merged = expected.merge(actual, on=PLAN_KEYS, how='outer', suffixes=(' [ref]', ' [alt]'), indicator=True)
+    diffs = []
+    for _, row in merged[merged['_merge'] != 'both'].iterrows():
+        diffs.append({**{k: row[k] for k in PLAN_KEYS}, 'Kolumna': 'wiersz', 'Referencja': row['_merge'] != 'right_only', 'Silnik': row['_merge'] != 'left_only'})
+
+    both = merged[merged['_merge'] == 'both']
+    for column in PLAN_COLUMNS:
+        ref, alt = both[f"{column} [ref]"], both[f"{column} [alt]"]
+        if pd.api.types.is_float_dtype(ref) and pd.api.types.is_float_dtype(alt):
+            mismatch = ~np.isclose(ref.to_numpy(), alt.to_numpy(), rtol=1e-9, atol=1e-6)
+        else:
+            mismatch = (ref.astype(str) != alt.astype(str)).to_numpy()
+        for idx in np.flatnonzero(mismatch):
+            diffs.append({
+                'Materiał': both['Materiał'].iloc[idx],
+                'Tydzień': both['Tydzień'].iloc[idx],
+                'Kolumna': column,
+                'Referencja': ref.iloc[idx],
+                'Silnik': alt.iloc[idx]
+            })
+    return pd.DataFrame(diffs, columns=PLAN_KEYS + ['Kolumna', 'Referencja', 'Silnik'])
+
+def diff_summaries(expected: pd.DataFrame, actual: pd.DataFrame) -> pd.DataFrame:
+    """Porównuje podsumowania ``analyze_all_materials``: werdykty i statystyki wiersz po wierszu.
+
+    Dla wierszy błędów porównywany jest tylko sam fakt błędu (treść komunikatu może się różnić).
+    """
+    diffs = []
+    if len(expected) != len(actual) or not (expected['Materiał'].to_numpy() == actual['Materiał'].to_numpy()).all():
+        return pd.DataFrame([{'Materiał': None, 'Kolumna': 'Materiał', 'Referencja': len(expected), 'Silnik': len(actual)}])
+
+    ref_error = expected['Status'].astype(str).str.startswith('❌').to_numpy()
+    alt_error = actual['Status'].astype(str).str.startswith('❌').to_numpy()
+    columns = [('błąd', ref_error, alt_error, ref_error != alt_error)]
+    valid = ~ref_error & ~alt_error
+    for column in SUMMARY_FLAGS:
+        ref, alt = expected[column].to_numpy(), actual[column].to_numpy()
+        columns.append((column, ref, alt, valid & (ref != alt)))
+    for column in SUMMARY_NUMERIC:
+        ref, alt = expected[column].to_numpy(dtype=float), actual[column].to_numpy(dtype=float)
+        close = np.isclose(ref, alt, rtol=1e-9, atol=1e-6) | (np.isinf(ref) & np.isinf(alt))
+        columns.append((column, ref, alt, valid & ~close))
+
+    materials = expected['Materiał'].to_numpy()
+    for column, ref, alt, mismatch in columns:
+        for idx in np.flatnonzero(mismatch):
+            diffs.append({'Materiał': materials[idx], 'Kolumna': column, 'Referencja': ref[idx], 'Silnik': alt[idx]})
+    return pd.DataFrame(diffs, columns=['Materiał', 'Kolumna', 'Referencja', 'Silnik'])
+
+def measure_throughput(engine: dict, forecast_df: pd.DataFrame, stock_df: pd.DataFrame, repeat: int = 1) -> float:
+    """Zwraca przepustowość silnika w materiałach na sekundę (podsumowanie + plany TO-BE)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine['summary'](forecast_df, stock_df)
+        engine['plans'](forecast_df, stock_df)
+        best = min(best, time.perf_counter() - start)
+    return len(forecast_df) / best if best > 0 else float('inf')
+
+def run_harness(engines=None, seeds=(0, 1, 2), n_materials: int = 300, throughput_materials: int = 1000,
+                check_throughput: bool = True, log=print) -> bool:
+    """Uruchamia porównanie wszystkich silników z referencją i sprawdza progi przepustowości."""
+    engines = engines or [name for name in ENGINES if name != 'reference']
+    reference = ENGINES['reference']
+    ok = True
+
+    scenarios = [
+        (f"losowe, seed={seed}", *make_synthetic_inputs(n_materials, seed=seed), DATA_BATCH)
+        for seed in seeds
+    ] + edge_case_inputs(seed=seeds[0] if seeds else 0)
+
+    for name, forecast_df, stock_df, batch in scenarios:
+        expected_plans = reference_plans(forecast_df, stock_df, batch)
+        if name.startswith("losowe"):
+            # Przypadki brzegowe mogą nie mieć części akcji; losowy portfel musi mieć wszystkie
+            missing = missing_coverage(forecast_df, expected_plans)
+            ok &= not missing
+            if missing:
+                log(f"❌ {name}: scenariusz nie zawiera: {', '.join(missing)} - porównanie niemiarodajne")
+        expected_summary = reference['summary'](forecast_df, stock_df)
+        for engine_name in engines:
+            engine = ENGINES[engine_name]
+            plan_diffs = diff_plans(expected_plans, engine['plans'](forecast_df, stock_df, batch))
+            summary_diffs = diff_summaries(expected_summary, engine['summary'](forecast_df, stock_df))
+            passed = plan_diffs.empty and summary_diffs.empty
+            ok &= passed
+            log(f"{'✅' if passed else '❌'} [{engine_name}] {name}: {len(expected_plans)} wierszy planu, "
+                f"rozbieżności planu: {len(plan_diffs)}, podsumowania: {len(summary_diffs)}")
+            if not passed:
+                log(pd.concat([plan_diffs.head(10), summary_diffs.head(10)]).to_string())
+
+    if check_throughput:
+        forecast_df, stock_df = make_synthetic_inputs(throughput_materials, seed=123)
+        for engine_name in ['reference'] + list(engines):
+            engine = ENGINES[engine_name]
+            rate = measure_throughput(engine, forecast_df, stock_df)
+            passed = rate >= engine['min_materials_per_s']
+            ok &= passed
+            log(f"{'✅' if passed else '❌'} [{engine_name}] przepustowość: {rate:,.0f} mat./s "
+                f"(próg: {engine['min_materials_per_s']:,} mat./s)")
+
+    return ok
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Porównanie silników symulacji z implementacją referencyjną.")
+    parser.add_argument('--engine', action='append', choices=[name for name in ENGINES if name != 'reference'],
+                        help="Silnik do sprawdzenia (domyślnie wszystkie).")
+    parser.add_argument('--seeds', type=int, default=3, help="Liczba losowych portfeli.")
+    parser.add_argument('--materials', type=int, default=300, help="Liczba materiałów w losowym portfelu.")
+    parser.add_argument('--throughput-materials', type=int, default=1000,
+                        help="Liczba materiałów w pomiarze przepustowości.")
+    parser.add_argument('--skip-throughput', action='store_true', help="Pomiń sprawdzanie progów przepustowości.")
+    args = parser.parse_args(argv)
+
+    ok = run_harness(
+        engines=args.engine,
+        seeds=tuple(range(args.seeds)),
+        n_materials=args.materials,
+        throughput_materials=args.throughput_materials,
+        check_throughput=not args.skip_throughput
+    )
+    print("✅ Wszystkie silniki zgodne z referencją." if ok else "❌ Wykryto rozbieżności lub regresję wydajności.")
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
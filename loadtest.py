@@ -0,0 +1,209 @@
+# loadtest.py
+#
+# Test obciążeniowy: N równoległych sesji przechodzi ścieżkę wgranie plików -> dashboard -> analiza szczegółowa.
+# Uruchomienie: python loadtest.py [--sessions 8] [--materials 500] [--rounds 2] [--distinct-files 1]
+# Każda sesja działa w osobnym procesie przez streamlit.testing.AppTest (jeden przebieg AppTest na proces,
+# bez modyfikowania wewnętrznych obiektów Streamlit).
+
+import argparse
+import glob
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from equivalence import NamedBytes, make_synthetic_files
+from shared_store import estimate_size
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PERCENTILES = [50, 90, 95, 99]
+
+def _page(prefix: str) -> str:
+    """Ścieżka strony z katalogu pages (względem Start.py) po prefiksie numeru."""
+    return os.path.relpath(glob.glob(os.path.join(APP_DIR, 'pages', f'{prefix}_*.py'))[0], APP_DIR)
+
+def _rss_bytes():
+    """Bieżąca pamięć rezydentna procesu (Linux) lub None."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+class SimulatedSession:
+    """Jedna sesja planisty: kolejne przebiegi stron z pomiarem czasu każdego przebiegu."""
+
+    def __init__(self, index: int, files, timeout: float = 300):
+        self.index = index
+        self.files = files
+        self.app = AppTest.from_file(os.path.join(APP_DIR, 'Start.py'), default_timeout=timeout)
+        self.timings = []
+
+    def _run(self, page: str) -> bool:
+        """Jeden przebieg strony; zwraca False, jeśli zakończył się błędem."""
+        start = time.perf_counter()
+        error = None
+        try:
+            self.app.run()
+            # Wyjątek albo komunikat st.error (np. brak danych po wgraniu) przerywa ścieżkę
+            if len(self.app.exception):
+                error = self.app.exception[0].value
+            elif len(self.app.error):
+                error = self.app.error[0].value
+            elif not len(self.app.title):
+                error = "Przebieg przerwany przed wyrenderowaniem strony"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        self.timings.append({
+            'Sesja': self.index,
+            'Strona': page,
+            'Czas [s]': time.perf_counter() - start,
+            'Koniec': time.time(),
+            'Błąd': error
+        })
+        return error is None
+
+    def _upload(self, page: str, file) -> bool:
+        self.app.switch_page(page)
+        if not self._run(f"{page} (otwarcie)"):
+            return False
+        if not len(self.app.file_uploader):
+            self.timings[-1]['Błąd'] = "Brak pola wgrywania pliku na stronie"
+            return False
+        self.app.file_uploader[0].set_value((file.name, file.getvalue(), 'text/csv'))
+        return self._run(f"{page} (wgranie)")
+
+    def _check_demand(self) -> bool:
+        """Prognoza po wgraniu musi mieć niezerowy popyt - inaczej pomiar nie odpowiada realnej pracy."""
+        forecast = self.app.session_state['forecast_data'] if 'forecast_data' in self.app.session_state else None
+        if forecast is None or not forecast.to_numpy().sum() > 0:
+            self.timings[-1]['Błąd'] = "Prognoza po wgraniu nie zawiera popytu"
+            return False
+        return True
+
+    def run(self, rounds: int = 1) -> 'SimulatedSession':
+        """Ścieżka sesji; przerywana po pierwszym błędzie (dalsze strony nie miałyby danych)."""
+        forecast_file, stock_file = self.files
+        if not (self._run('Start.py') and self._upload(_page(1), forecast_file) and self._check_demand()
+                and self._upload(_page(2), stock_file)):
+            return self
+        # Kolejne rundy to ponowne przebiegi po interakcji - dane pochodzą z magazynu współdzielonego
+        for _ in range(rounds):
+            for prefix in (3, 4):
+                self.app.switch_page(_page(prefix))
+                if not self._run(_page(prefix)):
+                    return self
+        return self
+
+    def state_bytes(self) -> int:
+        """Łączny rozmiar obiektów ``session_state`` sesji w bajtach."""
+        return sum(estimate_size(value) for _, value in self.app.session_state.items())
+
+def _session_worker(index: int, files, rounds: int, timeout: float, start_at: float) -> dict:
+    """Ścieżka jednej sesji w procesie roboczym; zwraca czasy i pamięć sesji."""
+    # Ostrzeżenia Streamlit z każdego przebiegu zasłaniałyby raport
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    time.sleep(max(start_at - time.time(), 0))
+    files = [NamedBytes(data, name) for name, data in files]
+    session = SimulatedSession(index, files, timeout).run(rounds)
+    return {
+        'timings': session.timings,
+        'memory': {'Sesja': index, 'session_state [MB]': session.state_bytes() / 1024 ** 2,
+                   'RSS procesu [MB]': (_rss_bytes() or np.nan) / 1024 ** 2}
+    }
+
+def latency_report(timings: pd.DataFrame) -> pd.DataFrame:
+    """Percentyle czasu przebiegu per strona."""
+    grouped = timings.groupby('Strona', sort=False)['Czas [s]']
+    report = grouped.agg(['count', 'mean', 'max']).rename(columns={'count': 'Przebiegów', 'mean': 'Średnia [s]', 'max': 'Maks. [s]'})
+    for p in PERCENTILES:
+        report[f'p{p} [s]'] = grouped.quantile(p / 100)
+    report['Błędów'] = timings['Błąd'].notna().groupby(timings['Strona'], sort=False).sum()
+    return report.reset_index()
+
+def run_load_test(n_sessions: int = 8, n_materials: int = 500, rounds: int = 2, distinct_files: int = 1,
+                  ramp: float = 0.0, timeout: float = 300) -> dict:
+    """Uruchamia ``n_sessions`` równoległych sesji i zwraca czasy, percentyle, przepustowość i pamięć.
+
+    ``distinct_files`` - liczba różnych par plików między sesjami. ``ramp`` - odstęp
+    startu kolejnych sesji w sekundach. Każda sesja ma własny proces, a więc własny
+    magazyn współdzielony - test mierzy opóźnienia i pamięć sesji pod obciążeniem
+    procesora, ale nie deduplikację danych między sesjami jednego serwera
+    (tę pokazują statystyki magazynu w aplikacji).
+    """
+    files = [
+        [(file.name, file.getvalue()) for file in make_synthetic_files(n_materials, seed=seed)]
+        for seed in range(max(distinct_files, 1))
+    ]
+
+    # 'spawn' - czysty interpreter w każdym procesie, niezależnie od stanu procesu nadrzędnego
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=n_sessions, mp_context=context) as pool:
+        # Procesy startują przed pomiarem, żeby czas importów nie zawyżał pierwszych przebiegów
+        list(pool.map(time.sleep, [0] * n_sessions))
+        started = time.time()
+        futures = [
+            pool.submit(_session_worker, index, files[index % len(files)], rounds, timeout, started + index * ramp)
+            for index in range(n_sessions)
+        ]
+        results = [future.result() for future in futures]
+    wall = time.time() - started
+
+    timings = pd.DataFrame([timing for result in results for timing in result['timings']])
+    timings['Koniec'] -= started
+    memory = pd.DataFrame([result['memory'] for result in results])
+    return {
+        'timings': timings,
+        'latency': latency_report(timings),
+        'memory': memory,
+        'summary': {
+            'Sesji': n_sessions,
+            'Materiałów': n_materials,
+            'Czas całkowity [s]': wall,
+            'Przebiegów stron / s': len(timings) / wall if wall else np.nan,
+            'Ścieżek sesji / min': n_sessions * 60 / wall if wall else np.nan,
+            'Błędów': int(timings['Błąd'].notna().sum()),
+            'session_state sesji (śr.) [MB]': memory['session_state [MB]'].mean(),
+            'RSS procesu sesji (śr.) [MB]': memory['RSS procesu [MB]'].mean()
+        }
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Test obciążeniowy: równoległe sesje na syntetycznych plikach.")
+    parser.add_argument('--sessions', type=int, default=8, help="Liczba równoległych sesji.")
+    parser.add_argument('--materials', type=int, default=500, help="Liczba materiałów w syntetycznym portfelu.")
+    parser.add_argument('--rounds', type=int, default=2, help="Liczba przebiegów dashboard -> analiza na sesję.")
+    parser.add_argument('--distinct-files', type=int, default=1, help="Liczba różnych par plików między sesjami.")
+    parser.add_argument('--ramp', type=float, default=0.0, help="Odstęp startu kolejnych sesji [s].")
+    parser.add_argument('--timeout', type=float, default=300, help="Limit czasu jednego przebiegu strony [s].")
+    parser.add_argument('--output', default=None, help="Plik CSV z czasami wszystkich przebiegów.")
+    args = parser.parse_args(argv)
+
+    result = run_load_test(args.sessions, args.materials, args.rounds, args.distinct_files, args.ramp, args.timeout)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', 20, 'display.float_format', '{:,.3f}'.format):
+        print("⏱️ Czas przebiegu per strona:")
+        print(result['latency'].to_string(index=False))
+        print("\n🧠 Pamięć per sesja:")
+        print(result['memory'].describe().loc[['mean', 'min', 'max']].drop(columns='Sesja').to_string())
+        print("\n📊 Podsumowanie:")
+        for name, value in result['summary'].items():
+            print(f"  {name}: {value:,.2f}" if isinstance(value, float) else f"  {name}: {value}")
+
+    errors = result['timings'].dropna(subset=['Błąd'])
+    if not errors.empty:
+        print("\n❌ Błędy:")
+        print(errors[['Sesja', 'Strona', 'Błąd']].drop_duplicates(['Strona', 'Błąd']).to_string(index=False))
+    if args.output:
+        result['timings'].to_csv(args.output, sep=';', decimal=',', index=False)
+        print(f"\n💾 Zapisano: {args.output}")
+    return 0 if errors.empty else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
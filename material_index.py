@@ -0,0 +1,80 @@
+# material_index.py
+
+import numpy as np
+import pandas as pd
+
+class MaterialIndex:
+    """Posortowany indeks materiałów z wyszukiwaniem binarnym i stronicowaniem.
+
+    Przechowuje numery materiałów jako posortowaną tablicę liczb oraz
+    posortowaną leksykograficznie tablicę ich zapisów tekstowych, dzięki czemu
+    pozycja materiału i wyszukiwanie po prefiksie kosztują O(log n).
+    """
+
+    def __init__(self, materials):
+        self.materials = np.unique(np.asarray(materials, dtype=np.int64))
+        text = self.materials.astype(str)
+        self._text_order = np.argsort(text, kind='stable')
+        self._text_sorted = text[self._text_order]
+
+    @classmethod
+    def from_data(cls, forecast_df: pd.DataFrame, stock_df: pd.DataFrame) -> 'MaterialIndex':
+        """Buduje indeks materiałów wspólnych dla prognozy i stanu magazynowego."""
+        common = np.intersect1d(
+            forecast_df.index.to_numpy(dtype=np.int64),
+            stock_df['numer indeksu'].to_numpy(dtype=np.int64)
+        )
+        return cls(common)
+
+    def __len__(self) -> int:
+        return len(self.materials)
+
+    def __contains__(self, material) -> bool:
+        return self.position(material) is not None
+
+    def position(self, material):
+        """Zwraca pozycję materiału w indeksie lub None, jeśli go nie ma."""
+        if material is None:
+            return None
+        pos = int(np.searchsorted(self.materials, material))
+        if pos < len(self.materials) and self.materials[pos] == material:
+            return pos
+        return None
+
+    def neighbor(self, material, step: int):
+        """Zwraca materiał oddalony o ``step`` pozycji (z obcięciem do granic indeksu)."""
+        if not len(self.materials):
+            return None
+        pos = self.position(material)
+        if pos is None:
+            # Materiał spoza indeksu - zaczynamy od najbliższego miejsca wstawienia
+            pos = int(np.searchsorted(self.materials, material)) - (1 if step > 0 else 0)
+        pos = min(max(pos + step, 0), len(self.materials) - 1)
+        return int(self.materials[pos])
+
+    def subset(self, materials) -> 'MaterialIndex':
+        """Zwraca indeks ograniczony do podanych materiałów."""
+        materials = np.asarray(materials, dtype=np.int64)
+        return MaterialIndex(self.materials[np.isin(self.materials, materials)])
+
+    def search(self, query: str = "", mode: str = "prefix") -> np.ndarray:
+        """Zwraca posortowane numerycznie materiały pasujące do zapytania.
+
+        ``mode='prefix'`` korzysta z wyszukiwania binarnego po zapisie tekstowym,
+        ``mode='substring'`` przeszukuje wektorowo wszystkie numery.
+        """
+        query = str(query).strip()
+        if not query:
+            return self.materials
+        if mode == 'prefix':
+            start = np.searchsorted(self._text_sorted, query, side='left')
+            end = np.searchsorted(self._text_sorted, query + '\U0010ffff', side='left')
+            return np.sort(self.materials[self._text_order[start:end]])
+        mask = np.char.find(self._text_sorted, query) >= 0
+        return np.sort(self.materials[self._text_order[mask]])
+
+    @staticmethod
+    def page(matches: np.ndarray, page: int, page_size: int) -> list:
+        """Zwraca jedną stronę wyników jako listę numerów materiałów."""
+        start = max(page - 1, 0) * page_size
+        return [int(m) for m in matches[start:start + page_size]]
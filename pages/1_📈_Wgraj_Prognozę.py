@@ -2,6 +2,7 @@
 
 import streamlit as st
 from utils import process_forecast_file
+from shared_store import get_shared_store, content_hash
 
 st.set_page_config(page_title="Wgrywanie Prognozy", page_icon="📈", layout="wide")
 
@@ -11,6 +12,7 @@ st.title("📈 Krok 1: Wgraj Plik z Prognozą")
 if 'forecast_data' not in st.session_state:
     st.session_state.forecast_data = None
     st.session_state.forecast_filename = None
+    st.session_state.forecast_key = None
 
 st.markdown("""
 ### Instrukcje:
@@ -28,7 +30,12 @@ forecast_file = st.file_uploader(
 if forecast_file:
     try:
         with st.spinner("🔄 Przetwarzanie pliku prognozy..."):
-            st.session_state.forecast_data = process_forecast_file(forecast_file)
+            # Identyczne pliki z różnych sesji są parsowane raz i współdzielone
+            forecast_key = ('forecast', content_hash(forecast_file.getvalue()))
+            st.session_state.forecast_data = get_shared_store().acquire(
+                forecast_key, lambda: process_forecast_file(forecast_file), slot='forecast'
+            )
+            st.session_state.forecast_key = forecast_key
             st.session_state.forecast_filename = forecast_file.name
         
         st.success(f"✅ Pomyślnie załadowano: **{st.session_state.forecast_filename}**")
@@ -57,6 +64,8 @@ if forecast_file:
         st.error(f"❌ Błąd podczas przetwarzania pliku: {e}")
         st.session_state.forecast_data = None
         st.session_state.forecast_filename = None
+        st.session_state.forecast_key = None
+        get_shared_store().release('forecast')
 
 # Sidebar
 if st.session_state.forecast_filename:
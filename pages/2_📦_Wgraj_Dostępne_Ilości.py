@@ -1,7 +1,9 @@
 # pages/2_📦_Wgraj_Dostępne_Ilości.py
 
 import streamlit as st
-from utils import process_stock_file
+from utils import process_stock_file, WAREHOUSE_COLUMN
+from shared_store import get_shared_store, content_hash
+from validation import get_validated_inputs, render_quality_report
 
 st.set_page_config(page_title="Wgrywanie Dostępnych Ilości", page_icon="📦", layout="wide")
 
@@ -11,6 +13,7 @@ st.title("📦 Krok 2: Wgraj Plik Dostępnych Ilości")
 if 'stock_data' not in st.session_state:
     st.session_state.stock_data = None
     st.session_state.stock_filename = None
+    st.session_state.stock_key = None
 
 # Sprawdź czy jest prognoza
 if st.session_state.get('forecast_data') is None:
@@ -27,6 +30,7 @@ st.markdown("""
 - **Zamówione** - ilość zamówiona
 - **Potwierdzone** - ilość potwierdzona
 - **w magazynie** - aktualny stan magazynowy
+- **magazyn** *(opcjonalnie)* - magazyn / lokalizacja dokumentu; stan magazynowy podawany osobno dla każdego magazynu
 
 ### Obsługiwane dokumenty:
 - **ZP** - Zamówienia Produkcyjne (przychód)
@@ -42,7 +46,12 @@ stock_file = st.file_uploader(
 if stock_file:
     try:
         with st.spinner("🔄 Przetwarzanie pliku..."):
-            st.session_state.stock_data = process_stock_file(stock_file, stock_file.name)
+            # Identyczne pliki z różnych sesji są parsowane raz i współdzielone
+            stock_key = ('stock', content_hash(stock_file.getvalue()))
+            st.session_state.stock_data = get_shared_store().acquire(
+                stock_key, lambda: process_stock_file(stock_file, stock_file.name), slot='stock'
+            )
+            st.session_state.stock_key = stock_key
             st.session_state.stock_filename = stock_file.name
         
         st.success(f"✅ Pomyślnie załadowano: **{st.session_state.stock_filename}**")
@@ -66,6 +75,10 @@ if stock_file:
             zs_count = st.session_state.stock_data['DocNum'].astype(str).str.contains('ZS', na=False).sum()
             st.metric("📤 Dokumentów ZS", zs_count)
         
+        warehouses = st.session_state.stock_data[WAREHOUSE_COLUMN].unique()
+        if len(warehouses) > 1:
+            st.info(f"🏭 Dokumenty z **{len(warehouses)}** magazynów: {', '.join(sorted(map(str, warehouses)))}")
+        
         # Sprawdź zgodność z prognozą
         st.subheader("🔍 Analiza zgodności z prognozą")
         
@@ -97,6 +110,11 @@ if stock_file:
             else:
                 st.metric("✅ Tylko w stanie", 0)
         
+        # Walidacja obu plików - jeden przebieg, wynik współdzielony z Dashboardem i Analizą
+        st.subheader("🧪 Raport jakości danych")
+        _, _, quality_report = get_validated_inputs()
+        render_quality_report(quality_report)
+        
         # Podgląd danych
         st.subheader("👁️ Podgląd danych (pierwsze 20 wierszy)")
         display_cols = ['numer indeksu', 'DocNum', 'Data dostawy', 'Zamówione', 'Potwierdzone', 'w magazynie']
@@ -116,6 +134,9 @@ if stock_file:
         st.exception(e)
         st.session_state.stock_data = None
         st.session_state.stock_filename = None
+        st.session_state.stock_key = None
+        get_shared_store().release('stock')
+        get_shared_store().release('quality')
 
 # Sidebar
 if st.session_state.stock_filename:
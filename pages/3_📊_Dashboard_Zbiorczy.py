@@ -2,24 +2,181 @@
 
 import streamlit as st
 import pandas as pd
-from utils import analyze_all_materials
+from utils import (
+    analyze_all_materials_batch,
+    simulate_portfolio,
+    aggregate_portfolio_projection,
+    create_portfolio_chart,
+    create_overlay_chart,
+    read_data_file,
+    BUCKET_LABELS,
+    WAREHOUSE_COLUMN
+)
+from watch_folder import sync_session_from_watcher
+from shared_store import get_shared_store, render_store_stats, content_hash
+from bulk_export import BulkExportJob
+from validation import get_validated_inputs, render_quality_report
+from warehouses import analyze_warehouses, warehouse_overview, CONSOLIDATED
+from scheduling import production_demands, read_line_assignments, read_line_capacities, schedule_production
+from triage import TriageJob, shared_portfolio_arrays, RISK_LABELS, RISK_CERTAIN, RISK_SAFE
+from profiling import profile_page
+from bom import read_bom, analyze_components, DEMAND_SOURCES
 
 st.set_page_config(page_title="Dashboard Zbiorczy", page_icon="📊", layout="wide")
 
+# Profilowanie przebiegu strony na żądanie (przełącznik w sidebarze)
+profile_page(__file__)
+
 st.title("📊 Dashboard Zbiorczy - Wszystkie Materiały")
 
+# Najnowsze pliki z folderu obserwowanego (jeśli sesja go śledzi)
+sync_session_from_watcher()
+
 # Sprawdzenie danych
 if st.session_state.get('forecast_data') is None or st.session_state.get('stock_data') is None:
     st.error("❌ Brak kompletnych danych. Proszę wgrać plik prognozy i stanu magazynowego.")
     st.stop()
 
+# Walidacja danych - materiały z błędami są wykluczane przed symulacją
+forecast_df, stock_df, quality_report = get_validated_inputs()
+if quality_report.issues:
+    excluded_count = len(quality_report.excluded_materials)
+    with st.expander(f"🧪 Raport jakości danych ({len(quality_report.issues)} typów problemów, wykluczonych materiałów: {excluded_count})"):
+        render_quality_report(quality_report)
+
+@st.fragment(run_every=1)
+def show_bulk_export_progress(job):
+    """Odświeża pasek postępu eksportu zbiorczego bez przeładowania całej strony."""
+    if job.running:
+        st.progress(job.progress, text=f"🔄 Eksport w toku: {job.done} z {job.total} materiałów")
+    else:
+        st.rerun(scope="app")
+
+def show_triage_table(job, top_n: int):
+    """Ranking ryzyka z wynikami pełnej symulacji dla już przeliczonych materiałów."""
+    triage_df = job.snapshot().head(top_n)
+    
+    def style_risk(row):
+        if row['Ryzyko'] == RISK_LABELS[RISK_CERTAIN]:
+            return ['background-color: #ffcdd2'] * len(row)
+        elif row['Ryzyko'] == RISK_LABELS[RISK_SAFE]:
+            return ['background-color: #c8e6c9'] * len(row)
+        else:
+            return ['background-color: #fff9c4'] * len(row)
+    
+    st.dataframe(
+        triage_df.style.format({
+            'Maks. niedobór': '{:,.0f}',
+            'Stan magazynowy': '{:,.0f}',
+            'Pokrycie [tyg.]': '{:.1f}',
+            'Produkcja TO-BE': '{:,.0f}',
+            'Min. zapas TO-BE': '{:,.0f}'
+        }, na_rep="…").apply(style_risk, axis=1),
+        use_container_width=True,
+        height=600
+    )
+
+@st.fragment(run_every=1)
+def show_triage_progress(job, top_n: int):
+    """Odświeża ranking w miarę postępu pełnej symulacji w tle."""
+    if job.running:
+        st.progress(job.progress, text=f"🔄 Pełna symulacja wg priorytetu: {job.done} z {job.total} materiałów")
+        show_triage_table(job, top_n)
+    else:
+        st.rerun(scope="app")
+
+# Tryb triage - szybki ranking ryzyka zamiast pełnej analizy na starcie
+triage_mode = st.toggle(
+    "⚡ Tryb triage (najpierw ranking ryzyka braków, pełna symulacja w tle)",
+    key='triage_mode'
+)
+
+if triage_mode:
+    triage_key = (
+        st.session_state.get('forecast_key') or id(forecast_df),
+        st.session_state.get('stock_key') or id(stock_df)
+    )
+    triage_job = st.session_state.get('triage_job')
+    if triage_job is None or triage_job.data_key != triage_key:
+        if triage_job is not None:
+            triage_job.cancel()
+        triage_arrays = shared_portfolio_arrays(
+            forecast_df,
+            stock_df,
+            st.session_state.get('forecast_key'),
+            st.session_state.get('stock_key')
+        )
+        triage_job = TriageJob(triage_arrays, triage_key).start()
+        st.session_state.triage_job = triage_job
+    
+    st.subheader("⚡ Ranking Ryzyka Braków")
+    st.caption(
+        f"Ranking z granic zapasu (bez ZP / wg planu / wszystkie ZP od razu) "
+        f"policzony w {triage_job.ranking_seconds * 1000:,.0f} ms dla {triage_job.total} materiałów."
+    )
+    
+    risk_counts = triage_job.ranking['Ryzyko'].value_counts()
+    for col, label in zip(st.columns(len(RISK_LABELS)), RISK_LABELS.values()):
+        with col:
+            st.metric(label, int(risk_counts.get(label, 0)))
+    
+    with st.expander("📖 Kategorie ryzyka"):
+        st.markdown("""
+        - **🔴 Brak pewny**: zapas nie wystarczy nawet, gdyby wszystkie znane dostawy ZP dotarły od razu
+        - **🟠 Brak wg planu**: brak przy obecnym terminarzu dostaw ZP
+        - **🟡 Zależny od ZP**: brak pojawi się, jeśli dostawy ZP się opóźnią
+        - **✅ Bezpieczny**: zapas pokrywa popyt nawet bez dostaw ZP
+        
+        W ramach kategorii kolejność wyznacza tydzień pierwszego braku, a następnie pokrycie zapasu.
+        Kolumny TO-BE i **Status** uzupełniają się w miarę postępu pełnej symulacji.
+        """)
+    
+    if triage_job.total > 50:
+        top_n = st.slider("Liczba pozycji rankingu:", 50, triage_job.total, min(500, triage_job.total), step=50)
+    else:
+        top_n = triage_job.total
+    
+    if triage_job.running:
+        show_triage_progress(triage_job, top_n)
+    else:
+        if triage_job.error is not None:
+            st.error(f"❌ Symulacja w tle nie powiodła się: {triage_job.error}")
+        else:
+            st.success(f"✅ Pełna symulacja zakończona dla {triage_job.total} materiałów.")
+        show_triage_table(triage_job, top_n)
+    
+    st.info("💡 Wyłącz tryb triage, aby zobaczyć pełny dashboard z filtrami, projekcją i eksportem.")
+    render_store_stats()
+    st.stop()
+
 # Główna analiza
 try:
     with st.spinner("🔄 Analizuję wszystkie materiały..."):
-        summary_df = analyze_all_materials(
-            st.session_state.forecast_data,
-            st.session_state.stock_data
-        )
+        # Wynik analizy jest współdzielony przez sesje z tymi samymi plikami
+        forecast_key = st.session_state.get('forecast_key')
+        stock_key = st.session_state.get('stock_key')
+        if forecast_key and stock_key:
+            portfolio = get_shared_store().acquire(
+                ('portfolio', forecast_key, stock_key),
+                lambda: simulate_portfolio(forecast_df, stock_df),
+                slot='portfolio'
+            )
+            summary_df = get_shared_store().acquire(
+                ('analysis', forecast_key, stock_key),
+                lambda: analyze_all_materials_batch(
+                    forecast_df,
+                    stock_df,
+                    portfolio
+                ),
+                slot='analysis'
+            )
+        else:
+            portfolio = simulate_portfolio(forecast_df, stock_df)
+            summary_df = analyze_all_materials_batch(
+                forecast_df,
+                stock_df,
+                portfolio
+            )
     
     # KPI na górze
     st.subheader("📈 Kluczowe Wskaźniki")
@@ -134,6 +291,264 @@ try:
         with col4:
             st.metric("Śr. partia", f"{filtered_df['Partia std.'].mean():,.0f}")
     
+    # Projekcja zapasów całego portfela (z macierzy symulacji wsadowej)
+    st.divider()
+    st.subheader("📈 Projekcja Zapasów Portfela")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        projection_scope = st.radio(
+            "Zakres:",
+            ['Przefiltrowane materiały', 'Wszystkie materiały'],
+            horizontal=True
+        )
+    with col2:
+        bucket = st.radio(
+            "Granulacja:",
+            list(BUCKET_LABELS),
+            index=list(BUCKET_LABELS).index('week'),
+            format_func=BUCKET_LABELS.get,
+            horizontal=True,
+            help="Dzień - krótki horyzont (prognoza tygodnia rozłożona na dni robocze, ZP/ZS wg daty dostawy); "
+                 "Miesiąc - długi horyzont. Reguły bufora i przesunięć ZP dotyczą wybranych okresów."
+        )
+    
+    # Symulacja w innej granulacji - osobny wpis w magazynie współdzielonym
+    projection_portfolio = portfolio
+    if bucket != 'week':
+        with st.spinner(f"🔄 Symulacja w granulacji: {BUCKET_LABELS[bucket].lower()}..."):
+            if forecast_key and stock_key:
+                projection_portfolio = get_shared_store().acquire(
+                    ('portfolio', forecast_key, stock_key, bucket),
+                    lambda: simulate_portfolio(forecast_df, stock_df, bucket),
+                    slot='portfolio_bucket'
+                )
+            else:
+                projection_portfolio = simulate_portfolio(forecast_df, stock_df, bucket)
+    
+    scope_materials = filtered_df['Materiał'] if projection_scope == 'Przefiltrowane materiały' else None
+    projection = aggregate_portfolio_projection(projection_portfolio, scope_materials)
+    
+    st.plotly_chart(create_portfolio_chart(projection), use_container_width=True)
+    
+    with st.expander("📋 Projekcja okres po okresie"):
+        st.dataframe(
+            projection.style.format({
+                'Zapas koniec AS-IS': '{:,.0f}',
+                'Zapas koniec TO-BE': '{:,.0f}'
+            }),
+            use_container_width=True
+        )
+    
+    with st.expander("🧵 Przebiegi zapasu poszczególnych materiałów"):
+        col1, col2 = st.columns(2)
+        with col1:
+            overlay_count = st.slider("Liczba materiałów (wg bieżącego sortowania):", 10, 1000, 200, step=10)
+        with col2:
+            overlay_scenario = st.radio(
+                "Scenariusz:",
+                ['as_is', 'to_be'],
+                format_func=lambda s: 'AS-IS' if s == 'as_is' else 'TO-BE',
+                horizontal=True
+            )
+        overlay_materials = filtered_df['Materiał'].head(overlay_count)
+        st.plotly_chart(
+            create_overlay_chart(projection_portfolio, overlay_materials, overlay_scenario),
+            use_container_width=True
+        )
+    
+    # Analiza per magazyn (tylko gdy plik stanu zawiera kilka lokalizacji)
+    if WAREHOUSE_COLUMN in stock_df.columns and stock_df[WAREHOUSE_COLUMN].nunique() > 1:
+        st.divider()
+        st.subheader("🏭 Analiza per Magazyn")
+        
+        if forecast_key and stock_key:
+            warehouse_analysis = get_shared_store().acquire(
+                ('warehouses', forecast_key, stock_key),
+                lambda: analyze_warehouses(forecast_df, stock_df, portfolio),
+                slot='warehouses'
+            )
+        else:
+            warehouse_analysis = analyze_warehouses(forecast_df, stock_df, portfolio)
+        warehouse_summary = warehouse_analysis['summary']
+        
+        st.caption(
+            "Popyt z prognozy dzielony jest między magazyny wg udziału w potwierdzonych rozchodach ZS "
+            "(bez ZS - wg stanu magazynowego). Widok skonsolidowany sumuje stany wszystkich magazynów."
+        )
+        st.dataframe(
+            warehouse_overview(warehouse_summary).style.format({
+                'Stan magazynowy': '{:,.0f}',
+                'Produkcja TO-BE': '{:,.0f}'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        sites = list(warehouse_summary['Magazyn'].unique())
+        selected_site = st.selectbox("Magazyn:", options=sites, index=sites.index(CONSOLIDATED))
+        site_df = warehouse_summary[
+            (warehouse_summary['Magazyn'] == selected_site) &
+            (warehouse_summary['Materiał'].isin(filtered_df['Materiał']))
+        ]
+        st.dataframe(
+            site_df.style.format({
+                'Udział popytu': '{:.0%}',
+                'Stan magazynowy': '{:,.0f}',
+                'Popyt całkowity': '{:,.0f}',
+                'Produkcja TO-BE': '{:,.0f}'
+            }).apply(style_status, axis=1),
+            use_container_width=True,
+            height=400
+        )
+    
+    # Harmonogram produkcji przy ograniczonych zdolnościach linii
+    st.divider()
+    st.subheader("⚙️ Harmonogram Produkcji (zdolności linii)")
+    st.markdown("""
+    Akcje **PRODUKCJA** z planu TO-BE są rozdzielane na linie produkcyjne z uwzględnieniem ich tygodniowych zdolności.
+    Produkcja może zostać przesunięta na wcześniejszy tydzień; to, czego nie da się wyprodukować na czas, jest raportowane jako brak.
+    - **Przypisanie linii**: kolumny *Materiał*, *Linia*
+    - **Zdolności linii**: kolumny *Linia*, *Zdolność* (tygodniowo) i opcjonalnie kolumny tygodni jak w prognozie (np. *KW 12/25*)
+    """)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        assignments_file = st.file_uploader("Przypisanie materiałów do linii", type=["csv", "xlsx"], key='line_assignments_file')
+    with col2:
+        capacities_file = st.file_uploader("Zdolności linii", type=["csv", "xlsx"], key='line_capacities_file')
+    
+    if assignments_file and capacities_file:
+        try:
+            assignments = read_line_assignments(read_data_file(assignments_file, assignments_file.name))
+            capacity = read_line_capacities(read_data_file(capacities_file, capacities_file.name), portfolio['weeks'])
+            demands = production_demands(portfolio)
+            demands = demands[demands['Materiał'].isin(filtered_df['Materiał'])]
+            schedule = schedule_production(demands, assignments, capacity, portfolio['weeks'])
+            
+            total_demand = demands['Ilość'].sum()
+            uncovered_df = schedule['uncovered']
+            uncovered_total = uncovered_df['Niepokryte'].sum()
+            
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("🏭 Zapotrzebowanie produkcji", f"{total_demand:,.0f}")
+            with col2:
+                st.metric("✅ Zaplanowane", f"{schedule['allocations']['Ilość'].sum():,.0f}")
+            with col3:
+                st.metric("🔴 Niepokryte", f"{uncovered_total:,.0f}", delta=f"{uncovered_df['Materiał'].nunique()} materiałów", delta_color="inverse")
+            with col4:
+                st.metric("⚠️ Bez linii", f"{schedule['unassigned']['Ilość'].sum():,.0f}", delta=f"{schedule['unassigned']['Materiał'].nunique()} materiałów", delta_color="off")
+            
+            load = schedule['utilization'].pivot(index='Linia', columns='Tydzień', values='Obciążenie [%]')
+            load = load[[str(col).strip() for col in portfolio['weeks'] if str(col).strip() in load.columns]]
+            st.markdown("**Obciążenie linii [%]**")
+            def style_load(value):
+                if value >= 95:
+                    return 'background-color: #ffcdd2'
+                elif value >= 75:
+                    return 'background-color: #fff9c4'
+                return 'background-color: #c8e6c9'
+            
+            st.dataframe(load.style.format('{:.0f}').map(style_load), use_container_width=True)
+            
+            if len(uncovered_df):
+                st.markdown("**🔴 Braki, których nie da się pokryć produkcją na czas**")
+                st.dataframe(
+                    uncovered_df.style.format({'Zapotrzebowanie': '{:,.0f}', 'Niepokryte': '{:,.0f}'}),
+                    use_container_width=True,
+                    hide_index=True
+                )
+            else:
+                st.success("✅ Wszystkie akcje produkcji mieszczą się w zdolnościach linii.")
+            
+            st.download_button(
+                label="💾 Pobierz harmonogram (CSV)",
+                data=schedule['allocations'].to_csv(index=False, sep=';', decimal=',').encode('utf-8-sig'),
+                file_name="harmonogram_produkcji.csv",
+                mime="text/csv"
+            )
+        except Exception as e:
+            st.error(f"❌ Nie udało się zaplanować produkcji: {e}")
+    
+    # Popyt komponentów z rozwinięcia struktury BOM
+    st.divider()
+    st.subheader("🧩 Zapotrzebowanie Komponentów (BOM)")
+    st.markdown("""
+    Prognoza wyrobów lub akcje **PRODUKCJA** z planu TO-BE są rozwijane przez wszystkie poziomy struktury BOM
+    na tygodniowy popyt komponentów, który przechodzi przez tę samą analizę AS-IS (stan, ZP i ZS z pliku stanu).
+    - **Plik BOM**: kolumny *Rodzic*, *Komponent*, *Ilość* (na sztukę rodzica)
+    """)
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        bom_file = st.file_uploader("Struktura BOM", type=["csv", "xlsx"], key='bom_file')
+    with col2:
+        bom_source = st.radio(
+            "Źródło popytu wyrobów:",
+            list(DEMAND_SOURCES),
+            format_func=DEMAND_SOURCES.get,
+            key='bom_source'
+        )
+    
+    if bom_file:
+        try:
+            # Rozwinięcie BOM współdzielone przez sesje z tymi samymi plikami i źródłem popytu
+            def build_components():
+                bom = read_bom(read_data_file(bom_file, bom_file.name))
+                return analyze_components(forecast_df, stock_df, bom, portfolio, bom_source)
+            
+            if forecast_key and stock_key:
+                components = get_shared_store().acquire(
+                    ('bom', content_hash(bom_file.getvalue()), forecast_key, stock_key, bom_source),
+                    build_components,
+                    slot='bom'
+                )
+            else:
+                components = build_components()
+            component_df = components['summary']
+            
+            dropped_rows = components['dropped_rows']
+            if len(dropped_rows):
+                st.warning(
+                    f"⚠️ Pominięto {len(dropped_rows)} wierszy BOM z nieczytelnym numerem materiału "
+                    "(np. alfanumerycznym) lub ilością <= 0."
+                )
+                with st.expander("📋 Pominięte wiersze BOM"):
+                    st.dataframe(dropped_rows, use_container_width=True)
+            
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("🧩 Komponentów", len(component_df))
+            with col2:
+                st.metric("📚 Poziomów BOM", components['depth'])
+            with col3:
+                st.metric("🔴 Z brakami", int(component_df['Braki'].sum()))
+            with col4:
+                st.metric("⚠️ Bez danych stanu", int(component_df['Status'].str.startswith('❌').sum()))
+            
+            st.dataframe(
+                component_df.sort_values(['Braki', 'Popyt zależny'], ascending=False).style.apply(style_status, axis=1).format({
+                    'Stan magazynowy': '{:,.0f}',
+                    'Popyt całkowity': '{:,.0f}',
+                    'Popyt zależny': '{:,.0f}',
+                    'Śr. popyt tyg.': '{:,.1f}',
+                    'Pokrycie [tyg.]': '{:.1f}',
+                    'Partia std.': '{:,.0f}'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+            
+            st.download_button(
+                label="💾 Pobierz popyt komponentów (CSV)",
+                data=components['demand'].to_csv(sep=';', decimal=',').encode('utf-8-sig'),
+                file_name="popyt_komponentow.csv",
+                mime="text/csv"
+            )
+        except Exception as e:
+            st.error(f"❌ Nie udało się rozwinąć struktury BOM: {e}")
+    
     # Eksport
     st.divider()
     
@@ -145,10 +560,92 @@ try:
         mime="text/csv"
     )
     
+    # Eksport zbiorczy planów AS-IS i TO-BE
+    st.divider()
+    st.subheader("📦 Eksport zbiorczy planów AS-IS i TO-BE")
+    
+    export_job = st.session_state.get('bulk_export_job')
+    data_key = (st.session_state.get('forecast_key'), st.session_state.get('stock_key'))
+    if export_job is not None and export_job.data_key != data_key:
+        # Dane wejściowe zostały podmienione - plik eksportu jest nieaktualny
+        export_job.cleanup()
+        export_job = None
+        del st.session_state.bulk_export_job
+    
+    col1, col2 = st.columns([3, 1])
+    
+    with col1:
+        export_format = st.radio(
+            "Format:",
+            options=['xlsx', 'zip'],
+            format_func=lambda f: "Excel (arkusze AS-IS i TO-BE)" if f == 'xlsx' else "ZIP z plikami CSV dla każdego materiału",
+            horizontal=True
+        )
+    
+    with col2:
+        st.write("")
+        if st.button("⚙️ Generuj eksport", disabled=export_job is not None and export_job.running, use_container_width=True):
+            if export_job is not None:
+                export_job.cleanup()
+            export_job = BulkExportJob(
+                forecast_df,
+                stock_df,
+                export_format,
+                portfolio=portfolio,
+                data_key=data_key
+            ).start()
+            st.session_state.bulk_export_job = export_job
+            # Plik tymczasowy jest usuwany także wtedy, gdy sesja się zakończy
+            get_shared_store().on_session_end(export_job.cleanup)
+    
+    if export_job is not None:
+        if export_job.running:
+            show_bulk_export_progress(export_job)
+        elif export_job.error is not None:
+            st.error(f"❌ Eksport nie powiódł się: {export_job.error}")
+        elif export_job.path:
+            if export_job.failed:
+                st.warning(f"⚠️ {export_job.failed} materiałów nie udało się wyeksportować - szczegóły w arkuszu/pliku błędów.")
+            with open(export_job.path, 'rb') as export_file:
+                st.download_button(
+                    label=f"💾 Pobierz {export_job.file_name} ({export_job.total} materiałów)",
+                    data=export_file,
+                    file_name=export_job.file_name,
+                    mime=export_job.mime
+                )
+    
     # Przycisk do szczegółowej analizy
     st.divider()
-    st.info("💡 **Wskazówka:** Aby zobaczyć szczegółową analizę konkretnego materiału, przejdź do strony '🔍 Analiza Szczegółowa'")
+    problem_df = filtered_df[filtered_df['Status'].isin(['🔴 BRAKI', '🟡 NADMIAR'])]
+    
+    if len(problem_df) > 0:
+        st.subheader("🎯 Przejdź do materiału problemowego")
+        
+        # Do listy trafia tylko początek posortowanej tabeli - pełna lista jest na stronie szczegółów
+        jump_df = problem_df.head(500)
+        status_by_material = dict(zip(jump_df['Materiał'], jump_df['Status']))
+        
+        col1, col2 = st.columns([3, 1])
+        
+        with col1:
+            jump_material = st.selectbox(
+                f"Materiał ({len(jump_df)} z {len(problem_df)} problemowych, wg bieżącego sortowania):",
+                options=list(status_by_material),
+                format_func=lambda m: f"{m} – {status_by_material[m]}"
+            )
+        
+        with col2:
+            st.write("")
+            if st.button("🔍 Analizuj materiał", use_container_width=True):
+                st.session_state.selected_material = int(jump_material)
+                st.session_state.material_filter = status_by_material[jump_material]
+                st.session_state.material_query = ""
+                st.switch_page("pages/4_🔍_Analiza_Szczegółowa.py")
+    else:
+        st.info("💡 **Wskazówka:** Aby zobaczyć szczegółową analizę konkretnego materiału, przejdź do strony '🔍 Analiza Szczegółowa'")
 
 except Exception as e:
     st.error(f"❌ Wystąpił błąd podczas analizy: {e}")
     st.exception(e)
+
+render_store_stats()
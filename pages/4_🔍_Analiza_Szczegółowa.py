@@ -2,40 +2,122 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 from utils import (
     extract_material_data,
     run_as_is_simulation,
     run_optimized_simulation,
-    get_year_week_from_col,
+    as_is_frame,
+    to_be_frame,
+    align_material_flows,
     create_comparison_chart,
-    calculate_coverage
+    calculate_coverage,
+    analyze_all_materials_batch,
+    STATUS_OK,
+    STATUS_SHORTAGE,
+    STATUS_EXCESS,
+    ACTION_PRODUCTION,
+    ACTION_POSTPONE,
+    ACTION_RECEIVE
 )
+from material_index import MaterialIndex
+from watch_folder import sync_session_from_watcher
+from shared_store import get_shared_store
+from validation import get_validated_inputs
+from profiling import profile_page
 
 st.set_page_config(page_title="Analiza Szczegółowa", page_icon="🔍", layout="wide")
 
+# Profilowanie przebiegu strony na żądanie (przełącznik w sidebarze)
+profile_page(__file__)
+
 st.title("🔍 Analiza Szczegółowa Materiału")
 
+# Najnowsze pliki z folderu obserwowanego (jeśli sesja go śledzi)
+sync_session_from_watcher()
+
 # Sprawdzenie danych
 if st.session_state.get('forecast_data') is None or st.session_state.get('stock_data') is None:
     st.error("❌ Brak kompletnych danych. Proszę wgrać plik prognozy i stanu magazynowego.")
     st.stop()
 
-# Wybór materiału
-forecast_df = st.session_state.forecast_data
-stock_df = st.session_state.stock_data
+# Wybór materiału (dane po walidacji - bez materiałów wykluczonych z analizy)
+forecast_df, stock_df, quality_report = get_validated_inputs()
 
-# Lista dostępnych materiałów (wspólne w obu plikach)
-available_materials = sorted(list(set(forecast_df.index) & set(stock_df['numer indeksu'].unique())))
+# Indeks dostępnych materiałów (wspólne w obu plikach) - budowany raz dla pary plików
+forecast_key = st.session_state.get('forecast_key')
+stock_key = st.session_state.get('stock_key')
+if forecast_key and stock_key:
+    material_index = get_shared_store().acquire(
+        ('material_index', forecast_key, stock_key),
+        lambda: MaterialIndex.from_data(forecast_df, stock_df),
+        slot='material_index'
+    )
+else:
+    material_index = MaterialIndex.from_data(forecast_df, stock_df)
 
-if not available_materials:
+if not len(material_index):
     st.error("❌ Nie znaleziono wspólnych materiałów w prognozie i stanie magazynowym!")
     st.stop()
 
+PAGE_SIZE = 200
+
 st.sidebar.subheader("🎯 Wybierz Materiał")
+
+# Zawężenie do materiałów problemowych (np. po przejściu z Dashboardu)
+problem_filter = st.sidebar.selectbox(
+    "Pokaż materiały:",
+    options=['Wszystkie', '🔴 BRAKI', '🟡 NADMIAR'],
+    key='material_filter'
+)
+if problem_filter != 'Wszystkie':
+    if forecast_key and stock_key:
+        summary_df = get_shared_store().acquire(
+            ('analysis', forecast_key, stock_key),
+            lambda: analyze_all_materials_batch(forecast_df, stock_df),
+            slot='analysis'
+        )
+    else:
+        summary_df = analyze_all_materials_batch(forecast_df, stock_df)
+    problem_materials = summary_df.loc[summary_df['Status'] == problem_filter, 'Materiał']
+    material_index = material_index.subset(problem_materials)
+    if not len(material_index):
+        st.sidebar.success(f"Brak materiałów o statusie {problem_filter}")
+        st.stop()
+
+search_col, mode_col = st.sidebar.columns([3, 2])
+with search_col:
+    query = st.text_input("Szukaj numeru:", key='material_query')
+with mode_col:
+    search_mode = st.radio("Dopasowanie:", ['Początek', 'Fragment'], key='material_search_mode')
+matches = material_index.search(query, mode='prefix' if search_mode == 'Początek' else 'substring')
+
+if not len(matches):
+    st.sidebar.warning("Brak materiałów pasujących do wyszukiwania.")
+    matches = material_index.materials
+
+page_count = (len(matches) - 1) // PAGE_SIZE + 1
+current = st.session_state.get('selected_material')
+current_pos = int(np.searchsorted(matches, current)) if current is not None else 0
+default_page = min(current_pos // PAGE_SIZE + 1, page_count)
+
+if page_count > 1:
+    page = st.sidebar.number_input(
+        f"Strona wyników (z {page_count}):",
+        min_value=1,
+        max_value=page_count,
+        value=default_page
+    )
+else:
+    page = 1
+
+# Do widgetu trafia tylko bieżąca strona wyników
+options = material_index.page(matches, page, PAGE_SIZE)
+selected_index = options.index(current) if current in options else 0
 selected_material = st.sidebar.selectbox(
-    "Numer materiału:",
-    options=available_materials,
-    index=0,
+    f"Numer materiału ({len(matches)} pasujących):",
+    options=options,
+    index=selected_index,
     format_func=lambda x: f"{x}"
 )
 
@@ -79,24 +161,15 @@ try:
     st.divider()
     
     # Przygotowanie danych do symulacji
-    aligned_income = pd.Series(0.0, index=forecast_series.index)
-    aligned_consumption = pd.Series(0.0, index=forecast_series.index)
-    
-    for col in forecast_series.index:
-        parsed = get_year_week_from_col(col)
-        if parsed:
-            year, week = parsed
-            if (year, week) in weekly_zp.index:
-                aligned_income[col] = weekly_zp[(year, week)]
-            if (year, week) in weekly_zs.index:
-                aligned_consumption[col] = weekly_zs[(year, week)]
+    aligned_income, aligned_consumption = align_material_flows(forecast_series, weekly_zp, weekly_zs)
     
     # Symulacje
-    as_is_data = run_as_is_simulation(current_stock, forecast_series, aligned_income, aligned_consumption)
-    df_as_is = pd.DataFrame(as_is_data)
+    as_is = run_as_is_simulation(current_stock, forecast_series, aligned_income, aligned_consumption)
+    optimized = run_optimized_simulation(current_stock, forecast_series, aligned_income, aligned_consumption, batch_size)
     
-    optimized_data = run_optimized_simulation(current_stock, forecast_series, aligned_income, aligned_consumption, batch_size)
-    df_optimized = pd.DataFrame(optimized_data)
+    # Etykiety i opisy akcji renderowane dopiero do wyświetlenia
+    df_as_is = as_is_frame(as_is, forecast_series, aligned_income, aligned_consumption)
+    df_optimized = to_be_frame(optimized, forecast_series, aligned_consumption)
     
     # Wykres porównawczy
     st.subheader("📈 Wizualizacja Porównawcza", divider="green")
@@ -119,22 +192,23 @@ try:
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            shortage_count = sum('BRAK' in status for status in df_as_is['Status'])
+            shortage_count = int((as_is['status'] == STATUS_SHORTAGE).sum())
             st.metric("🔴 Tygodni z brakami", shortage_count)
         
         with col2:
-            excess_count = sum('NADMIAR' in status for status in df_as_is['Status'])
+            excess_count = int((as_is['status'] == STATUS_EXCESS).sum())
             st.metric("🟡 Tygodni z nadmiarem", excess_count)
         
         with col3:
-            ok_count = sum('OK' in status for status in df_as_is['Status'])
+            ok_count = int((as_is['status'] == STATUS_OK).sum())
             st.metric("✅ Tygodni OK", ok_count)
         
         # Tabela AS-IS
         def style_as_is(row):
-            if 'BRAK' in row['Status']:
+            status = as_is['status'][row.name]
+            if status == STATUS_SHORTAGE:
                 return ['background-color: #ffcdd2'] * len(row)
-            elif 'NADMIAR' in row['Status']:
+            elif status == STATUS_EXCESS:
                 return ['background-color: #fff9c4'] * len(row)
             else:
                 return ['background-color: #c8e6c9'] * len(row)
@@ -176,11 +250,11 @@ try:
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            production_count = sum('PRODUKCJA' in str(action) for action in df_optimized['Akcja'])
+            production_count = int(((optimized['action'] & ACTION_PRODUCTION) > 0).sum())
             st.metric("🔴 Akcji produkcji", production_count)
         
         with col2:
-            postpone_count = sum('PRZESUNIĘTO' in str(action) for action in df_optimized['Akcja'])
+            postpone_count = int(((optimized['action'] & ACTION_POSTPONE) > 0).sum())
             st.metric("🟡 Przesunięć", postpone_count)
         
         with col3:
@@ -189,10 +263,10 @@ try:
         
         # Tabela TO-BE
         def style_to_be(row):
-            action = str(row['Akcja'])
-            if 'PRODUKCJA' in action:
+            action = optimized['action'][row.name]
+            if action & ACTION_PRODUCTION:
                 return ['background-color: #c8e6c9'] * len(row)
-            elif 'PRZESUNIĘTO' in action or 'PRZYJĘTO' in action:
+            elif action & (ACTION_POSTPONE | ACTION_RECEIVE):
                 return ['background-color: #fff9c4'] * len(row)
             else:
                 return [''] * len(row)
@@ -255,15 +329,11 @@ except Exception as e:
 st.sidebar.divider()
 st.sidebar.subheader("🔄 Szybka nawigacja")
 if st.sidebar.button("◀️ Poprzedni materiał"):
-    current_idx = available_materials.index(selected_material)
-    if current_idx > 0:
-        st.session_state.selected_material = available_materials[current_idx - 1]
-        st.rerun()
+    st.session_state.selected_material = material_index.neighbor(selected_material, -1)
+    st.rerun()
 
 if st.sidebar.button("Następny materiał ▶️"):
-    current_idx = available_materials.index(selected_material)
-    if current_idx < len(available_materials) - 1:
-        st.session_state.selected_material = available_materials[current_idx + 1]
-        st.rerun()
+    st.session_state.selected_material = material_index.neighbor(selected_material, 1)
+    st.rerun()
 
-st.sidebar.info(f"Materiał {available_materials.index(selected_material) + 1} z {len(available_materials)}")
+st.sidebar.info(f"Materiał {material_index.position(selected_material) + 1} z {len(material_index)}")
@@ -0,0 +1,204 @@
+# profiling.py
+
+import cProfile
+import marshal
+import os
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+
+import pandas as pd
+import streamlit as st
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_MODES = {'deterministic': "Deterministyczny (cProfile)", 'sampling': "Próbkujący (co 5 ms)"}
+PROFILE_SCOPES = {'pages': "utils + kod stron", 'app': "Cały kod aplikacji", 'all': "Wszystko"}
+SAMPLE_INTERVAL = 0.005
+TABLE_COLUMNS = ['Funkcja', 'Plik', 'Linia', 'Wywołania', 'Czas własny [s]', 'Czas łączny [s]']
+
+# Flaga przebiegu strony wykonywanego pod profilerem (per wątek skryptu)
+_state = threading.local()
+
+class StackSampler:
+    """Profiler próbkujący: wątek w tle odczytuje stos wątku skryptu co ``interval`` sekund.
+
+    Narzut nie zależy od liczby wywołań funkcji (w przeciwieństwie do cProfile),
+    kosztem przybliżonych czasów i braku liczby wywołań.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def enable(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def disable(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def table(self) -> pd.DataFrame:
+        """Czas własny (funkcja na szczycie stosu) i łączny (funkcja gdziekolwiek na stosie)."""
+        total = sum(self.stacks.values())
+        weight = self.elapsed / total if total else 0.0
+        own, inclusive = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                inclusive[function] += count
+        return pd.DataFrame(
+            [(name, path, line, pd.NA, own[key] * weight, count * weight)
+             for key, count in inclusive.items() for path, line, name in [key]],
+            columns=TABLE_COLUMNS
+        )
+
+    def collapsed(self) -> bytes:
+        """Stosy w formacie 'collapsed' (flamegraph.pl, speedscope)."""
+        lines = (
+            ';'.join(f"{name} ({os.path.basename(path)}:{line})" for path, line, name in stack) + f" {count}"
+            for stack, count in self.stacks.items()
+        )
+        return '\n'.join(lines).encode('utf-8')
+
+def _relative_path(path: str) -> str:
+    """Ścieżka względem katalogu aplikacji (pliki spoza aplikacji i funkcje wbudowane bez zmian)."""
+    if not os.path.isabs(path):
+        return path
+    relative = os.path.relpath(path, APP_DIR)
+    return path if relative.startswith('..') else relative
+
+def _cprofile_table(profile: cProfile.Profile) -> pd.DataFrame:
+    return pd.DataFrame(
+        [(name, path, line, calls, own, total) for (path, line, name), (_, calls, own, total, _) in profile.stats.items()],
+        columns=TABLE_COLUMNS
+    )
+
+def scope_table(table: pd.DataFrame, scope: str) -> pd.DataFrame:
+    """Funkcje z wybranego zakresu: 'pages' (utils.py i strony), 'app' (cały kod aplikacji) lub 'all'."""
+    if scope == 'pages':
+        mask = (table['Plik'] == 'utils.py') | (table['Plik'] == 'Start.py') | table['Plik'].str.startswith('pages' + os.sep)
+    elif scope == 'app':
+        # Funkcje wbudowane mają w cProfile plik '~', kod generowany - '<...>'
+        mask = ~table['Plik'].map(os.path.isabs) & ~table['Plik'].str.match(r'[~<]')
+    else:
+        mask = slice(None)
+    return table[mask].sort_values('Czas łączny [s]', ascending=False, ignore_index=True)
+
+def run_profiled(page_file: str, mode: str) -> dict:
+    """Wykonuje stronę pod profilerem i zwraca wynik (także gdy strona kończy się ``st.stop()``)."""
+    profiler = cProfile.Profile() if mode == 'deterministic' else StackSampler(threading.get_ident())
+    result = {'page': os.path.basename(page_file), 'mode': mode, 'shown': False}
+    st.session_state.profile_result = result
+    _state.active = True
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        runpy.run_path(page_file, run_name='__main__')
+    finally:
+        profiler.disable()
+        _state.active = False
+        result['seconds'] = time.perf_counter() - start
+        if mode == 'deterministic':
+            profiler.create_stats()
+            table = _cprofile_table(profiler)
+            result.update(data=marshal.dumps(profiler.stats), file_name='profil.prof', mime='application/octet-stream')
+        else:
+            table = profiler.table()
+            result.update(data=profiler.collapsed(), file_name='profil.collapsed.txt', mime='text/plain')
+        table['Plik'] = table['Plik'].map(_relative_path)
+        result['table'] = table
+        result['finished'] = time.time()
+    return result
+
+@st.fragment(run_every=1)
+def _profile_pending():
+    """Odświeża aplikację, gdy wynik profilu jest gotowy (np. strona zakończyła się ``st.stop()``)."""
+    result = st.session_state.get('profile_result')
+    if result is None or 'table' not in result:
+        st.caption("⏳ Profilowanie bieżącego przebiegu...")
+    elif not result['shown']:
+        st.rerun(scope="app")
+
+def _render_controls():
+    with st.sidebar.expander("⏱️ Profiler", expanded=bool(st.session_state.get('profile_next_run'))):
+        st.radio("Profiler:", list(PROFILE_MODES), format_func=PROFILE_MODES.get, key='profile_mode')
+        st.toggle("Profiluj następny przebieg strony", key='profile_next_run',
+                  help="Włączenie przełącznika odświeża stronę - ten przebieg zostanie sprofilowany.")
+
+def render_profile_result(result: dict):
+    """Panel wyniku: czas przebiegu, tabela najdroższych funkcji i pobranie pełnego profilu."""
+    with st.expander(f"⏱️ Profil przebiegu strony: {result['seconds']:.2f} s ({PROFILE_MODES[result['mode']]})", expanded=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            scope = st.radio("Zakres funkcji:", list(PROFILE_SCOPES), format_func=PROFILE_SCOPES.get,
+                             horizontal=True, key='profile_scope')
+        with col2:
+            top = st.slider("Liczba funkcji:", 10, 200, 30, step=10, key='profile_top')
+        table = scope_table(result['table'], scope)
+        if result['mode'] == 'sampling':
+            table = table.drop(columns='Wywołania')
+        st.dataframe(
+            table.head(top).style.format({'Czas własny [s]': '{:.4f}', 'Czas łączny [s]': '{:.4f}'}),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.download_button(
+            label="📥 Pobierz profil",
+            data=result['data'],
+            file_name=result['file_name'],
+            mime=result['mime'],
+            help="cProfile: plik pstats (snakeviz, python -m pstats); próbkujący: stosy collapsed (speedscope).",
+            key='profile_download'
+        )
+        if st.button("🗑️ Zamknij profil", key='profile_clear'):
+            del st.session_state.profile_result
+            st.rerun()
+    result['shown'] = True
+
+def profile_page(page_file: str):
+    """Przełącznik profilera w sidebarze i profilowanie przebiegu bieżącej strony.
+
+    Wywoływane na początku strony, zaraz po ``st.set_page_config``. Po włączeniu
+    przełącznika strona jest wykonywana ponownie (``runpy``) pod profilerem,
+    a oryginalny przebieg kończy się ``st.stop()``. Profilowany jest tylko wątek
+    skryptu - zadania w tle (eksport, triage) nie trafiają do profilu.
+    """
+    if getattr(_state, 'active', False):
+        _render_controls()
+        with st.sidebar:
+            _profile_pending()
+        return
+
+    panel = st.container()
+    if st.session_state.get('profile_next_run'):
+        # Przełącznik jest jednorazowy - wyłączamy go przed wyrenderowaniem w profilowanym przebiegu
+        st.session_state.profile_next_run = False
+        result = run_profiled(page_file, st.session_state.get('profile_mode', 'deterministic'))
+        with panel:
+            render_profile_result(result)
+        st.stop()
+
+    _render_controls()
+    result = st.session_state.get('profile_result')
+    if result is not None and 'table' in result and result['page'] == os.path.basename(page_file):
+        with panel:
+            render_profile_result(result)
@@ -0,0 +1,182 @@
+# scheduling.py
+
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from utils import get_year_week_from_col
+
+UNASSIGNED_LINE = "Bez linii"
+
+def production_demands(portfolio: dict) -> pd.DataFrame:
+    """Akcje produkcji TO-BE jako lista zapotrzebowań (materiał, tydzień potrzeby, ilość)."""
+    production = portfolio['to_be']['production']
+    rows, weeks = np.nonzero(production > 0)
+    return pd.DataFrame({
+        'Materiał': portfolio['materials'][rows],
+        'Tydzień': weeks,
+        'Ilość': production[rows, weeks]
+    })
+
+def line_ids(values: pd.Series) -> pd.Series:
+    """Identyfikatory linii jako tekst, jednakowo dla obu plików.
+
+    Liczby całkowite zapisane jako float (kolumna z pustą komórką) dają ten sam
+    tekst co liczby całkowite: 1.0 -> '1'.
+    """
+    numeric = pd.to_numeric(values, errors='coerce')
+    integral = (numeric.abs() < 2 ** 53) & (numeric % 1 == 0)
+    text = values.astype(str).str.strip()
+    text[integral] = numeric[integral].astype(np.int64).astype(str)
+    return text
+
+def read_line_assignments(df: pd.DataFrame) -> pd.Series:
+    """Przypisanie materiał -> linia z tabeli z kolumnami 'Materiał' i 'Linia'.
+
+    Powtórzone wiersze z tą samą linią są łączone; materiał przypisany do kilku
+    różnych linii to błąd (harmonogram obsługuje jedną linię na materiał).
+    """
+    for col in ('Materiał', 'Linia'):
+        if col not in df.columns:
+            raise ValueError(f"Brak kolumny '{col}' w pliku przypisań linii.")
+    df = df.dropna(subset=['Materiał', 'Linia'])
+    materials = pd.to_numeric(df['Materiał'], errors='coerce')
+    valid = materials.notna()
+    pairs = pd.DataFrame({
+        'Materiał': materials[valid].astype(np.int64).to_numpy(),
+        'Linia': line_ids(df.loc[valid, 'Linia']).to_numpy()
+    }).drop_duplicates()
+    conflicts = pairs.loc[pairs['Materiał'].duplicated(), 'Materiał'].unique()
+    if len(conflicts):
+        listed = ', '.join(map(str, conflicts[:10])) + (" ..." if len(conflicts) > 10 else "")
+        raise ValueError(
+            f"Materiały przypisane do kilku linii ({len(conflicts)}): {listed}. "
+            "Każdy materiał może mieć jedną linię."
+        )
+    return pd.Series(pairs['Linia'].to_numpy(), index=pairs['Materiał'].to_numpy())
+
+def read_line_capacities(df: pd.DataFrame, weeks) -> pd.DataFrame:
+    """Tygodniowe zdolności linii (linie × tygodnie horyzontu).
+
+    Kolumna 'Zdolność' to stała zdolność tygodniowa; kolumny z nazwą tygodnia
+    (jak w prognozie, np. 'KW 12/25') nadpisują ją dla danego tygodnia.
+    """
+    if 'Linia' not in df.columns:
+        raise ValueError("Brak kolumny 'Linia' w pliku zdolności.")
+    df = df.dropna(subset=['Linia']).copy()
+    df['Linia'] = line_ids(df['Linia'])
+    line_index = pd.Index(df['Linia'].unique(), name='Linia')
+    constant = np.full(len(line_index), np.nan)
+    if 'Zdolność' in df.columns:
+        values = pd.to_numeric(df['Zdolność'].astype(str).str.replace(',', '.', regex=False), errors='coerce')
+        constant = values.groupby(df['Linia']).max().reindex(line_index).to_numpy(dtype=float)
+    capacity = pd.DataFrame(np.repeat(constant[:, None], len(weeks), axis=1), index=line_index)
+
+    positions = {get_year_week_from_col(col): pos for pos, col in enumerate(weeks)}
+    for col in df.columns:
+        parsed = get_year_week_from_col(col)
+        if parsed in positions:
+            values = pd.to_numeric(df[col].astype(str).str.replace(',', '.', regex=False), errors='coerce')
+            override = values.groupby(df['Linia']).max().reindex(line_index).to_numpy(dtype=float)
+            pos = positions[parsed]
+            capacity[pos] = np.where(np.isnan(override), capacity[pos], override)
+
+    if capacity.isna().all(axis=None):
+        raise ValueError("Nie znaleziono zdolności linii (kolumna 'Zdolność' lub kolumny tygodni).")
+    return capacity.fillna(0).clip(lower=0)
+
+def _schedule_line(due: np.ndarray, quantity: np.ndarray, priority: np.ndarray, capacity: np.ndarray):
+    """Harmonogram jednej linii - przebieg wsteczny od końca horyzontu.
+
+    Zapotrzebowanie z tygodniem potrzeby ``d`` można wyprodukować w dowolnym
+    tygodniu ``t <= d``. Idąc od ostatniego tygodnia, zdolność tygodnia ``t``
+    trafia do zapotrzebowań dostępnych w tym tygodniu wg priorytetu (kopiec);
+    wszystkie mają wtedy te same wcześniejsze tygodnie do dyspozycji, więc
+    wybór nie zmniejsza łącznej pokrytej ilości, a produkcja jest możliwie
+    najpóźniejsza (najmniejszy zapas). Zwraca (alokacje, pozostałe ilości, zużycie).
+    """
+    remaining = quantity.astype(float).copy()
+    used = np.zeros(len(capacity))
+    allocations = []
+    order = np.argsort(-due, kind='stable')
+    heap = []
+    cursor = 0
+
+    for week in range(len(capacity) - 1, -1, -1):
+        while cursor < len(order) and due[order[cursor]] >= week:
+            idx = order[cursor]
+            heapq.heappush(heap, (-priority[idx], due[idx], idx))
+            cursor += 1
+        free = capacity[week]
+        while heap and free > 0:
+            _, _, idx = heap[0]
+            amount = min(free, remaining[idx])
+            allocations.append((idx, week, amount))
+            remaining[idx] -= amount
+            free -= amount
+            if remaining[idx] <= 0:
+                heapq.heappop(heap)
+        used[week] = capacity[week] - free
+
+    return allocations, remaining, used
+
+def schedule_production(demands: pd.DataFrame, assignments: pd.Series, capacity: pd.DataFrame, weeks,
+                        priority: pd.Series = None) -> dict:
+    """Rozdziela zapotrzebowania produkcyjne TO-BE na linie o ograniczonej zdolności.
+
+    ``demands`` - wynik ``production_demands``; ``assignments`` - materiał -> linia;
+    ``capacity`` - wynik ``read_line_capacities``; ``priority`` - opcjonalna
+    waga materiału (wyższa = ważniejszy przy braku zdolności, domyślnie
+    wcześniejszy tydzień potrzeby). Zapotrzebowania są podzielne - jedna akcja
+    może zostać rozłożona na kilka tygodni. Materiały bez linii lub z linią
+    spoza pliku zdolności trafiają do ``UNASSIGNED_LINE`` i nie są ograniczane.
+
+    Zwraca słownik z tabelami: 'allocations', 'uncovered', 'utilization', 'unassigned'.
+    """
+    week_names = [str(col).strip() for col in weeks]
+    lines = demands['Materiał'].map(assignments).fillna(UNASSIGNED_LINE).astype(str).to_numpy()
+    lines = np.where(np.isin(lines, capacity.index), lines, UNASSIGNED_LINE)
+    weights = (
+        demands['Materiał'].map(priority).fillna(0).to_numpy(dtype=float)
+        if priority is not None else np.zeros(len(demands))
+    )
+
+    due = demands['Tydzień'].to_numpy(dtype=np.int64)
+    quantity = demands['Ilość'].to_numpy(dtype=float)
+    materials = demands['Materiał'].to_numpy()
+    allocations, uncovered, utilization = [], [], []
+
+    for line in capacity.index:
+        idx = np.flatnonzero(lines == line)
+        line_capacity = capacity.loc[line].to_numpy(dtype=float)[:len(week_names)]
+        line_allocations, remaining, used = _schedule_line(due[idx], quantity[idx], weights[idx], line_capacity)
+        for local, week, amount in line_allocations:
+            allocations.append((line, materials[idx[local]], week_names[due[idx[local]]], week_names[week], amount))
+        short = np.flatnonzero(remaining > 1e-9)
+        uncovered.extend(
+            (line, materials[idx[s]], week_names[due[idx[s]]], quantity[idx[s]], remaining[s]) for s in short
+        )
+        utilization.append(pd.DataFrame({
+            'Linia': line,
+            'Tydzień': week_names[:len(line_capacity)],
+            'Zdolność': line_capacity,
+            'Zużycie': used,
+            'Obciążenie [%]': np.divide(used * 100, line_capacity, out=np.zeros(len(used)), where=line_capacity > 0)
+        }))
+
+    free = lines == UNASSIGNED_LINE
+    return {
+        'allocations': pd.DataFrame(
+            allocations, columns=['Linia', 'Materiał', 'Tydzień potrzeby', 'Tydzień produkcji', 'Ilość']
+        ),
+        'uncovered': pd.DataFrame(
+            uncovered, columns=['Linia', 'Materiał', 'Tydzień potrzeby', 'Zapotrzebowanie', 'Niepokryte']
+        ),
+        'utilization': pd.concat(utilization, ignore_index=True) if utilization else pd.DataFrame(),
+        'unassigned': pd.DataFrame({
+            'Materiał': materials[free],
+            'Tydzień potrzeby': [week_names[d] for d in due[free]],
+            'Ilość': quantity[free]
+        })
+    }
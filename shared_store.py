@@ -0,0 +1,213 @@
+# shared_store.py
+
+import hashlib
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+def content_hash(data: bytes) -> str:
+    """Zwraca skrót SHA-256 zawartości wgranego pliku."""
+    return hashlib.sha256(data).hexdigest()
+
+def estimate_size(value) -> int:
+    """Szacuje zajętość pamięci obiektu w bajtach."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value.values())
+    return sys.getsizeof(value)
+
+def current_session_id() -> str:
+    """Zwraca identyfikator bieżącej sesji Streamlit."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+def _session_connected(session_id: str) -> bool:
+    """True, jeśli sesja ma aktywne połączenie z serwerem Streamlit."""
+    from streamlit import runtime
+    return runtime.exists() and runtime.get_instance().is_active_session(session_id)
+
+class SharedDataStore:
+    """Współdzielony między sesjami magazyn danych z licznikiem referencji.
+
+    Wpisy są identyfikowane kluczem opartym o skrót zawartości pliku, więc
+    kilka sesji wgrywających ten sam plik korzysta z jednej kopii danych.
+    Każda sesja trzyma co najwyżej jeden wpis w danym slocie ('forecast',
+    'stock', 'analysis'); podmiana wpisu w slocie zwalnia poprzedni.
+    Wpisy bez referencji są usuwane po ``idle_ttl`` sekundach bezczynności.
+    Sesja połączona z serwerem Streamlit trzyma referencje, dopóki trwa (jej
+    ``session_state`` wciąż wskazuje na dane); sesja rozłączona lub działająca
+    w tle (bez ``keep_alive``) traci je po ``session_ttl`` sekundach - domyślnie
+    tyle, ile serwer przechowuje stan rozłączonej sesji.
+    """
+
+    def __init__(self, idle_ttl: float = 900, session_ttl: float = 120):
+        self.idle_ttl = idle_ttl
+        self.session_ttl = session_ttl
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self._entries = {}
+        self._sessions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, key, factory, slot: str, session_id: str = None):
+        """Zwraca wartość dla klucza (tworząc ją w razie potrzeby) i przypisuje ją do slotu sesji."""
+        session_id = session_id or current_session_id()
+        self.evict_idle()
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Tworzenie poza główną blokadą - równoległe sesje z innymi plikami nie czekają.
+        # Odczyt wpisu i przypisanie referencji w jednej sekcji krytycznej, aby
+        # evict_idle nie usunął wpisu między nimi.
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return self._take(entry, key, slot, session_id)
+            value = factory()
+            with self._lock:
+                # Blokada klucza mogła zostać usunięta przez evict_idle - wpis mógł już powstać w innym wątku
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                    entry = {
+                        'value': value,
+                        'size': estimate_size(value),
+                        'refs': set(),
+                        'sessions': set(),
+                        'last_access': time.time()
+                    }
+                    self._entries[key] = entry
+                return self._take(entry, key, slot, session_id)
+
+    def _take(self, entry: dict, key, slot: str, session_id: str):
+        # Trafienie = wpis utworzony przez inną sesję, a nie ponowny przebieg tej samej
+        if entry['sessions'] and session_id not in entry['sessions']:
+            self.hits += 1
+        entry['sessions'].add(session_id)
+        self._assign(session_id, slot, key)
+        entry['last_access'] = time.time()
+        return entry['value']
+
+    def get(self, key, session_id: str = None):
+        """Zwraca wartość dla klucza lub None, jeśli nie ma jej w magazynie."""
+        with self._lock:
+            self._touch_session(session_id or current_session_id())
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry['last_access'] = time.time()
+            return entry['value']
+
+    def release(self, slot: str, session_id: str = None):
+        """Zwalnia wpis trzymany przez sesję w danym slocie."""
+        with self._lock:
+            self._assign(session_id or current_session_id(), slot, None)
+
+    def keep_alive(self, session_id: str = None):
+        """Odnawia aktywność sesji (np. procesu działającego w tle), aby nie straciła referencji."""
+        with self._lock:
+            self._touch_session(session_id or current_session_id())
+
+    def on_session_end(self, callback, session_id: str = None):
+        """Rejestruje funkcję wywoływaną po wygaśnięciu sesji (np. usunięcie plików tymczasowych)."""
+        with self._lock:
+            self._touch_session(session_id or current_session_id())['on_end'].append(callback)
+
+    def _touch_session(self, session_id: str):
+        session = self._sessions.setdefault(session_id, {'slots': {}, 'last_seen': 0.0, 'on_end': []})
+        session['last_seen'] = time.time()
+        return session
+
+    def _assign(self, session_id: str, slot: str, key):
+        session = self._touch_session(session_id)
+        old_key = session['slots'].get(slot)
+        if old_key == key:
+            if key is not None:
+                self._entries[key]['refs'].add(session_id)
+            return
+        if old_key is not None and old_key in self._entries:
+            old_entry = self._entries[old_key]
+            old_entry['refs'].discard(session_id)
+            old_entry['last_access'] = time.time()
+        if key is None:
+            session['slots'].pop(slot, None)
+        else:
+            session['slots'][slot] = key
+            self._entries[key]['refs'].add(session_id)
+
+    def evict_idle(self) -> int:
+        """Usuwa nieaktywne sesje i nieużywane wpisy. Zwraca liczbę usuniętych wpisów."""
+        now = time.time()
+        ended = []
+        with self._lock:
+            for session_id, session in list(self._sessions.items()):
+                if _session_connected(session_id):
+                    session['last_seen'] = now
+                elif now - session['last_seen'] > self.session_ttl:
+                    for slot in list(session['slots']):
+                        self._assign(session_id, slot, None)
+                    ended.extend(session['on_end'])
+                    del self._sessions[session_id]
+
+            expired = [
+                key for key, entry in self._entries.items()
+                if not entry['refs'] and now - entry['last_access'] > self.idle_ttl
+            ]
+            for key in expired:
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+
+        for callback in ended:
+            try:
+                callback()
+            except Exception:
+                # Sprzątanie po jednej sesji nie może przerwać przebiegu innej
+                pass
+        return len(expired)
+
+    def stats(self) -> dict:
+        """Zwraca statystyki magazynu: liczbę wpisów, sesji, pamięć i współczynnik trafień.
+
+        Trafienie to pobranie wpisu utworzonego przez inną sesję (deduplikacja między
+        sesjami); ponowne przebiegi tej samej sesji nie są liczone.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'sessions': len(self._sessions),
+                'memory_bytes': sum(entry['size'] for entry in self._entries.values()),
+                'shared_refs': sum(len(entry['refs']) for entry in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+@st.cache_resource
+def get_shared_store() -> SharedDataStore:
+    """Zwraca jedną instancję magazynu dla całego procesu serwera."""
+    return SharedDataStore()
+
+def render_store_stats():
+    """Wyświetla w sidebarze zużycie pamięci i skuteczność współdzielonego magazynu."""
+    stats = get_shared_store().stats()
+    st.sidebar.caption(
+        f"🧠 Współdzielone dane: **{stats['memory_bytes'] / 1024 ** 2:,.1f} MB** "
+        f"({stats['entries']} wpisów, {stats['sessions']} sesji) · "
+        f"trafienia: **{stats['hit_rate'] * 100:.0f}%**"
+    )
@@ -0,0 +1,68 @@
+# tests/test_api.py
+
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from api import PlanningState, serve_in_background
+from equivalence import make_synthetic_files
+
+@pytest.fixture(scope='module')
+def base_url(tmp_path_factory):
+    """Serwer API na losowym wolnym porcie localhost z syntetycznymi plikami."""
+    directory = tmp_path_factory.mktemp('api')
+    forecast_file, stock_file = make_synthetic_files(50, seed=7)
+    forecast_path, stock_path = directory / forecast_file.name, directory / stock_file.name
+    forecast_path.write_bytes(forecast_file.getvalue())
+    stock_path.write_bytes(stock_file.getvalue())
+
+    server, thread = serve_in_background(PlanningState(str(forecast_path), str(stock_path)))
+    host, port = server.server_address[:2]
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+def get(base_url: str, path: str):
+    """Zwraca (kod HTTP, odpowiedź JSON) - także dla kodów błędów."""
+    try:
+        with urllib.request.urlopen(base_url + path, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_health(base_url):
+    status, body = get(base_url, '/health')
+    assert status == 200
+    assert body['status'] == 'ok'
+    assert body['materials'] > 0
+
+def test_summary(base_url):
+    status, body = get(base_url, '/summary?limit=5')
+    assert status == 200
+    assert body['total'] > 0
+    assert 0 < len(body['items']) <= 5
+
+def test_material_plan(base_url):
+    _, materials = get(base_url, '/materials?page_size=1')
+    material = materials['items'][0]
+    status, body = get(base_url, f'/materials/{material}')
+    assert status == 200
+    assert body['material'] == material
+    assert len(body['as_is']) == len(body['to_be']) > 0
+
+def test_bad_material_id(base_url):
+    status, body = get(base_url, '/materials/abc')
+    assert status == 400
+    assert 'error' in body
+
+def test_metrics_fold_unknown_routes(base_url):
+    for path in ('/nieznany-1', '/nieznany-2', '/a/b/c'):
+        assert get(base_url, path)[0] == 404
+    status, body = get(base_url, '/metrics')
+    assert status == 200
+    assert 'GET /health' in body
+    assert body['GET /other']['count'] >= 3
+    assert not any('nieznany' in route for route in body)
@@ -0,0 +1,51 @@
+# tests/test_bom.py
+
+import numpy as np
+import pandas as pd
+
+from bom import component_demand, read_bom
+
+WEEKS = ['2024-W01', '2024-W02']
+PARENTS = 256
+
+def wide_bom() -> pd.DataFrame:
+    """256 wyrobów (1..256) z komponentem 1000, który zużywa 2 szt. komponentu 2000."""
+    rows = [{'Rodzic': parent, 'Komponent': 1000, 'Ilość': 1} for parent in range(1, PARENTS + 1)]
+    rows.append({'Rodzic': 1000, 'Komponent': 2000, 'Ilość': 2})
+    return read_bom(pd.DataFrame(rows))
+
+def forecast(component_own: float = 0.0) -> pd.DataFrame:
+    materials = [*range(1, PARENTS + 1), 1000]
+    values = np.ones((len(materials), len(WEEKS)))
+    values[-1] = component_own
+    return pd.DataFrame(values, index=pd.Index(materials, name='Materiał'), columns=WEEKS)
+
+def test_many_parents_reach_all_levels():
+    demand = component_demand(forecast(), wide_bom())
+    assert demand.attrs['bom_depth'] == 2
+    assert demand.attrs['level_code'].to_dict() == {1000: 1, 2000: 2}
+    assert demand.loc[1000].tolist() == [PARENTS] * len(WEEKS)
+    assert demand.loc[2000].tolist() == [2 * PARENTS] * len(WEEKS)
+
+def test_component_forecast_exploded_once():
+    demand = component_demand(forecast(component_own=5), wide_bom())
+    assert demand.loc[1000].tolist() == [PARENTS + 5] * len(WEEKS)
+    assert demand.loc[2000].tolist() == [2 * (PARENTS + 5)] * len(WEEKS)
+
+def test_production_source_explodes_component_forecast():
+    production = np.zeros((PARENTS, len(WEEKS)))
+    production[:, 0] = 3
+    portfolio = {'materials': np.arange(1, PARENTS + 1), 'to_be': {'production': production}}
+    demand = component_demand(forecast(component_own=5), wide_bom(), portfolio, source='production')
+    assert demand.loc[1000].tolist() == [3 * PARENTS + 5, 5]
+    assert demand.loc[2000].tolist() == [2 * (3 * PARENTS + 5), 10]
+
+def test_read_bom_reports_dropped_rows():
+    raw = pd.DataFrame({
+        'Rodzic': ['1', 'A-100', '2', '3'],
+        'Komponent': ['10', '10', 'X7', '10'],
+        'Ilość': ['1,5', '1', '1', '0']
+    })
+    bom = read_bom(raw)
+    assert bom.to_dict('records') == [{'Rodzic': 1, 'Komponent': 10, 'Ilość': 1.5}]
+    assert bom.attrs['dropped_rows']['Rodzic'].tolist() == ['A-100', '2', '3']
@@ -0,0 +1,66 @@
+# tests/test_scheduling.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scheduling import UNASSIGNED_LINE, read_line_assignments, read_line_capacities, schedule_production
+
+WEEKS = ['KW 10/25', 'KW 11/25', 'KW 12/25']
+
+def demands(rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=['Materiał', 'Tydzień', 'Ilość'])
+
+def test_duplicate_assignment_rows_merged():
+    assignments = read_line_assignments(pd.DataFrame({'Materiał': [1, 1, 2], 'Linia': ['L1', 'L1 ', 'L2']}))
+    assert assignments.to_dict() == {1: 'L1', 2: 'L2'}
+
+def test_material_on_two_lines_rejected():
+    with pytest.raises(ValueError, match=r"kilku linii \(1\): 1\."):
+        read_line_assignments(pd.DataFrame({'Materiał': [1, 1, 2], 'Linia': ['L1', 'L2', 'L1']}))
+
+def test_numeric_line_ids_match_between_files():
+    # Pusta komórka 'Linia' w pliku zdolności daje kolumnę float (1.0, 2.0)
+    assignments = read_line_assignments(pd.DataFrame({'Materiał': [1, 2], 'Linia': [1, 2]}))
+    capacity = read_line_capacities(pd.DataFrame({'Linia': [1.0, np.nan, 2.0], 'Zdolność': [10, 5, 10]}), WEEKS)
+    assert list(capacity.index) == ['1', '2']
+    schedule = schedule_production(demands([(1, 0, 5), (2, 0, 5)]), assignments, capacity, WEEKS)
+    assert schedule['unassigned'].empty
+    assert schedule['allocations']['Ilość'].sum() == 10
+
+def test_allocation_latest_week_and_uncovered_shortage():
+    capacity = read_line_capacities(pd.DataFrame({'Linia': ['L1'], 'Zdolność': [10]}), WEEKS)
+    assignments = pd.Series({1: 'L1', 2: 'L1', 3: 'L9'})
+    schedule = schedule_production(demands([(1, 1, 25), (2, 2, 5), (3, 0, 7)]), assignments, capacity, WEEKS)
+
+    allocations = schedule['allocations'].groupby(['Materiał', 'Tydzień produkcji'])['Ilość'].sum().to_dict()
+    # Materiał 2 zajmuje połowę ostatniego tygodnia, materiał 1 - resztę i tygodnie wcześniej
+    assert allocations == {(1, 'KW 10/25'): 10, (1, 'KW 11/25'): 10, (2, 'KW 12/25'): 5}
+    uncovered = schedule['uncovered']
+    assert uncovered[['Materiał', 'Tydzień potrzeby', 'Niepokryte']].values.tolist() == [[1, 'KW 11/25', 5.0]]
+    # Linia spoza pliku zdolności nie jest ograniczana
+    assert schedule['unassigned'].values.tolist() == [[3, 'KW 10/25', 7.0]]
+    assert schedule['utilization']['Zużycie'].tolist() == [10, 10, 5]
+
+def test_large_portfolio_conserves_quantity():
+    rng = np.random.default_rng(0)
+    n_materials, n_weeks = 30_000, 26
+    weeks = [f"KW {week}/25" for week in range(1, n_weeks + 1)]
+    rows = rng.integers(0, n_materials, 60_000)
+    demand = demands({'Materiał': rows, 'Tydzień': rng.integers(0, n_weeks, len(rows)), 'Ilość': rng.integers(1, 100, len(rows))})
+    lines = [f"L{line}" for line in range(20)]
+    assignments = pd.Series(rng.choice(lines, n_materials), index=np.arange(n_materials))
+    capacity = read_line_capacities(pd.DataFrame({'Linia': lines, 'Zdolność': rng.integers(5_000, 12_000, len(lines))}), weeks)
+
+    schedule = schedule_production(demand, assignments, capacity, weeks)
+
+    allocated = schedule['allocations']['Ilość'].sum()
+    assert allocated + schedule['uncovered']['Niepokryte'].sum() == pytest.approx(demand['Ilość'].sum())
+    assert schedule['unassigned'].empty
+    utilization = schedule['utilization']
+    assert (utilization['Zużycie'] <= utilization['Zdolność'] + 1e-6).all()
+    # Produkcja nigdy po tygodniu potrzeby
+    positions = {week: pos for pos, week in enumerate(weeks)}
+    allocations = schedule['allocations']
+    assert (allocations['Tydzień produkcji'].map(positions) <= allocations['Tydzień potrzeby'].map(positions)).all()
+    assert UNASSIGNED_LINE not in set(utilization['Linia'])
@@ -0,0 +1,78 @@
+# tests/test_warehouses.py
+
+import io
+
+import numpy as np
+import pandas as pd
+
+from equivalence import NamedBytes, make_synthetic_files, make_synthetic_inputs
+from utils import extract_material_data, process_stock_file, simulate_portfolio, site_stock_levels
+from validation import validate_inputs
+from warehouses import CONSOLIDATED, analyze_warehouses
+
+STOCK_COLUMNS = ['numer indeksu', 'Magazyn', 'DocNum', 'Data dostawy', 'Zamówione', 'Potwierdzone', 'w magazynie']
+
+def stock_frame(rows) -> pd.DataFrame:
+    """Plik stanu z kolumną magazynu przepuszczony przez parser z ``utils``."""
+    data = pd.DataFrame(rows, columns=STOCK_COLUMNS).to_csv(sep=';', index=False, decimal=',').encode('utf-8')
+    return process_stock_file(NamedBytes(data, 'stan.csv'), 'stan.csv')
+
+def blank_row_stock(blank_stock: float) -> pd.DataFrame:
+    """Materiał 100000 w magazynach M1 (10) i M2 (5) oraz w wierszu bez kodu magazynu."""
+    return stock_frame([
+        (100000, 'M1', 'ZS/1/25', '05-03-2025', 0, 4, 10),
+        (100000, 'M2', 'ZP/2/25', '12-03-2025', 20, 0, 5),
+        (100000, '', 'ZS/3/25', '19-03-2025', 0, 6, blank_stock)
+    ])
+
+def multi_site_inputs(n_materials: int = 200, sites: int = 3, seed: int = 1):
+    forecast_df, _ = make_synthetic_inputs(n_materials, seed=seed)
+    _, stock_file = make_synthetic_files(n_materials, seed=seed)
+    raw = pd.read_csv(io.BytesIO(stock_file.getvalue()), sep=';')
+    raw['Magazyn'] = np.random.default_rng(seed).choice([f"M{i}" for i in range(sites)], len(raw))
+    return forecast_df, stock_frame(raw[STOCK_COLUMNS].to_numpy().tolist())
+
+def test_single_site_matches_portfolio():
+    forecast_df, stock_df = make_synthetic_inputs(150, seed=2)
+    portfolio = simulate_portfolio(forecast_df, stock_df)
+    result = analyze_warehouses(forecast_df, stock_df)
+    [site] = result['sites'].values()
+    assert np.array_equal(site['materials'], portfolio['materials'])
+    assert np.allclose(site['share'], 1)
+    for key in portfolio['as_is']:
+        assert np.array_equal(site['as_is'][key], portfolio['as_is'][key])
+    for key in portfolio['to_be']:
+        assert np.array_equal(site['to_be'][key], portfolio['to_be'][key])
+
+def test_multi_site_stock_and_shares():
+    forecast_df, stock_df = multi_site_inputs()
+    result = analyze_warehouses(forecast_df, stock_df)
+    summary = result['summary']
+    sites = summary[summary['Magazyn'] != CONSOLIDATED]
+    assert set(sites['Magazyn']) == {'M0', 'M1', 'M2'}
+    assert np.allclose(sites.groupby('Materiał')['Udział popytu'].sum(), 1)
+
+    consolidated = summary[summary['Magazyn'] == CONSOLIDATED].set_index('Materiał')['Stan magazynowy']
+    site_total = sites.groupby('Materiał')['Stan magazynowy'].sum()
+    assert np.allclose(consolidated.reindex(site_total.index), site_total)
+    material = int(site_total.index[0])
+    assert extract_material_data(stock_df, material)[0] == site_total.loc[material]
+
+def test_blank_row_equal_to_sites_is_erp_total():
+    stock_df = blank_row_stock(15)
+    assert site_stock_levels(stock_df).to_dict() == {(100000, 'M1'): 10, (100000, 'M2'): 5, (100000, 'Magazyn główny'): 0}
+    assert extract_material_data(stock_df, 100000)[0] == 15
+    forecast_df, _ = make_synthetic_inputs(1)
+    report = validate_inputs(forecast_df, stock_df)
+    assert 'site_total_row' in report.issues
+    assert 'unassigned_site_stock' not in report.issues
+
+def test_blank_row_with_other_stock_is_kept_and_reported():
+    stock_df = blank_row_stock(7)
+    assert site_stock_levels(stock_df).sum() == 22
+    assert extract_material_data(stock_df, 100000)[0] == 22
+    forecast_df, _ = make_synthetic_inputs(1)
+    report = validate_inputs(forecast_df, stock_df)
+    assert report.issues['unassigned_site_stock']['materials'].tolist() == [100000]
+    assert report.rows('unassigned_site_stock')['w magazynie'].tolist() == [7]
+    assert not report.has_errors
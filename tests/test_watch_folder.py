@@ -0,0 +1,75 @@
+# tests/test_watch_folder.py
+
+import os
+
+import numpy as np
+import pytest
+
+from equivalence import make_synthetic_inputs
+from shared_store import SharedDataStore
+from utils import simulate_portfolio
+from watch_folder import WatcherRegistry, resolve_watch_directory, update_portfolio
+
+def test_resolve_stays_inside_root(tmp_path):
+    (tmp_path / 'eksporty').mkdir()
+    assert resolve_watch_directory('eksporty', str(tmp_path)) == os.path.realpath(tmp_path / 'eksporty')
+    assert resolve_watch_directory('', str(tmp_path)) == os.path.realpath(tmp_path)
+    for outside in ('..', '../..', '/etc', 'eksporty/../../'):
+        with pytest.raises(ValueError):
+            resolve_watch_directory(outside, str(tmp_path))
+
+def test_resolve_rejects_symlink_out_of_root(tmp_path):
+    root, other = tmp_path / 'root', tmp_path / 'inny'
+    root.mkdir()
+    other.mkdir()
+    (root / 'link').symlink_to(other)
+    with pytest.raises(ValueError):
+        resolve_watch_directory('link', str(root))
+
+def test_resolve_requires_configured_root(monkeypatch):
+    monkeypatch.delenv('THIMM_WATCH_ROOT', raising=False)
+    with pytest.raises(ValueError):
+        resolve_watch_directory('')
+
+def test_one_watcher_per_session_stopped_with_last_session(tmp_path):
+    first, second = tmp_path / 'a', tmp_path / 'b'
+    first.mkdir()
+    second.mkdir()
+    store = SharedDataStore(session_ttl=0)
+    registry = WatcherRegistry(store, interval=0.05)
+
+    watcher = registry.attach(str(first), 's1')
+    assert registry.attach(str(first), 's2') is watcher
+    # Zmiana katalogu odłącza sesję od poprzedniego obserwatora
+    registry.attach(str(second), 's1')
+    assert registry.watcher('s1').directory == str(second)
+    assert watcher.running
+
+    registry.detach('s2')
+    watcher._thread.join(timeout=5)
+    assert not watcher.running
+
+    # Koniec sesji w magazynie zatrzymuje jej obserwator
+    remaining = registry.watcher('s1')
+    store.evict_idle()
+    remaining._thread.join(timeout=5)
+    assert not remaining.running
+    assert registry.watcher('s1') is None
+
+def test_incremental_update_matches_full_simulation():
+    # Kolumny ze spacją w nazwie nie przyjmują przesunięć - reguła musi być ta sama w obu ścieżkach
+    forecast_df, stock_df = make_synthetic_inputs(120, seed=4, padded_columns=True)
+    previous, _ = update_portfolio(None, forecast_df, stock_df)
+
+    forecast_df = forecast_df.drop(forecast_df.index[:5])
+    forecast_df.iloc[:10] = forecast_df.iloc[:10] * 2
+    stock_df = stock_df[stock_df['numer indeksu'] != stock_df['numer indeksu'].iloc[-1]].copy()
+    stock_df.loc[stock_df.index[:8], 'w magazynie'] += 500
+    portfolio, recomputed = update_portfolio(previous, forecast_df, stock_df)
+    expected = simulate_portfolio(forecast_df, stock_df)
+
+    assert 0 < recomputed < len(expected['materials'])
+    assert np.array_equal(portfolio['materials'], expected['materials'])
+    for scenario in ('as_is', 'to_be'):
+        for key in expected[scenario]:
+            assert np.array_equal(portfolio[scenario][key], expected[scenario][key]), (scenario, key)
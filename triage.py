@@ -0,0 +1,210 @@
+# triage.py
+
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from shared_store import get_shared_store
+from utils import (
+    build_portfolio_arrays,
+    run_as_is_batch,
+    run_optimized_batch,
+    receivable_weeks,
+    calculate_coverage,
+    STATUS_SHORTAGE,
+    STATUS_EXCESS
+)
+
+# Kategorie ryzyka braku (mniejsza wartość = wyższy priorytet)
+RISK_CERTAIN = 0
+RISK_PLANNED = 1
+RISK_ZP_DEPENDENT = 2
+RISK_SAFE = 3
+RISK_LABELS = {
+    RISK_CERTAIN: "🔴 Brak pewny",
+    RISK_PLANNED: "🟠 Brak wg planu",
+    RISK_ZP_DEPENDENT: "🟡 Zależny od ZP",
+    RISK_SAFE: "✅ Bezpieczny"
+}
+PENDING_STATUS = "⏳ W kolejce"
+
+def _dense(flows, steps: int) -> np.ndarray:
+    if sparse.issparse(flows):
+        return flows[:, :steps].toarray()
+    return np.asarray(flows, dtype=float)[:, :steps]
+
+def _first_shortage(trajectory: np.ndarray, need: np.ndarray) -> np.ndarray:
+    """Pozycja pierwszego tygodnia, w którym zapas nie pokrywa popytu następnego tygodnia (-1 = brak)."""
+    short = trajectory < need
+    return np.where(short.any(axis=1), short.argmax(axis=1), -1)
+
+def shortage_bounds(arrays: dict) -> dict:
+    """Trajektorie zapasu z sum skumulowanych - bez symulacji tydzień po tygodniu.
+
+    - ``lower``: żadna dostawa ZP nie dociera (np. wszystkie zostaną przesunięte),
+    - ``planned``: dostawy ZP zgodnie z planem (odpowiada zapasowi końcowemu AS-IS),
+    - ``upper``: wszystkie znane dostawy ZP z horyzontu docierają od razu.
+    Zwraca też pozycję pierwszego braku dla każdej z trajektorii.
+    """
+    forecast = arrays['forecast']
+    steps = max(forecast.shape[1] - 1, 0)
+    outflow = np.cumsum(forecast[:, :steps] + _dense(arrays['consumption'], steps), axis=1)
+    income = np.cumsum(_dense(arrays['income'], steps), axis=1)
+    need = forecast[:, 1:steps + 1]
+
+    lower = arrays['stock'][:, None] - outflow
+    planned = lower + income
+    upper = lower + (income[:, -1:] if steps else 0)
+    return {
+        'lower': lower,
+        'planned': planned,
+        'upper': upper,
+        'first_lower': _first_shortage(lower, need),
+        'first_planned': _first_shortage(planned, need),
+        'first_upper': _first_shortage(upper, need),
+        'max_deficit': np.clip(need - planned, 0, None).max(axis=1, initial=0.0)
+    }
+
+def rank_shortage_risk(arrays: dict) -> pd.DataFrame:
+    """Ranking materiałów wg ryzyka braku na podstawie ``shortage_bounds``.
+
+    Kolejność: kategoria ryzyka, tydzień pierwszego braku, pokrycie zapasu.
+    Kolumna ``Wiersz`` wskazuje wiersz materiału w macierzach portfela.
+    """
+    bounds = shortage_bounds(arrays)
+    forecast = arrays['forecast']
+    steps = max(forecast.shape[1] - 1, 0)
+    avg_demand = forecast.mean(axis=1) if forecast.shape[1] else np.full(len(forecast), np.nan)
+    coverage = calculate_coverage(arrays['stock'], avg_demand)
+
+    risk = np.select(
+        [bounds['first_upper'] >= 0, bounds['first_planned'] >= 0, bounds['first_lower'] >= 0],
+        [RISK_CERTAIN, RISK_PLANNED, RISK_ZP_DEPENDENT],
+        default=RISK_SAFE
+    )
+    first_week = np.select(
+        [risk == RISK_CERTAIN, risk == RISK_PLANNED, risk == RISK_ZP_DEPENDENT],
+        [bounds['first_upper'], bounds['first_planned'], bounds['first_lower']],
+        default=-1
+    )
+    order = np.lexsort((coverage, np.where(first_week >= 0, first_week, steps), risk))
+
+    week_names = np.array([str(col).strip() for col in arrays['weeks'][:steps]] + [""], dtype=object)
+    return pd.DataFrame({
+        'Priorytet': np.arange(1, len(order) + 1),
+        'Materiał': arrays['materials'][order],
+        'Ryzyko': np.array([RISK_LABELS[r] for r in risk[order]], dtype=object),
+        'Pierwszy brak': week_names[first_week[order]],
+        'Maks. niedobór': bounds['max_deficit'][order],
+        'Stan magazynowy': arrays['stock'][order],
+        'Pokrycie [tyg.]': coverage[order],
+        'Wiersz': order
+    })
+
+def shared_portfolio_arrays(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, forecast_key=None, stock_key=None) -> dict:
+    """Macierze portfela z magazynu współdzielonego - jedna kopia dla sesji z tymi samymi plikami.
+
+    Gdy Dashboard ma już wynik ``simulate_portfolio`` dla tych plików, używany jest
+    on (zawiera te same macierze); bez kluczy plików macierze są budowane lokalnie.
+    """
+    if not (forecast_key and stock_key):
+        return build_portfolio_arrays(forecast_df, stock_df)
+    store = get_shared_store()
+    return store.acquire(
+        ('portfolio_arrays', forecast_key, stock_key),
+        lambda: store.get(('portfolio', forecast_key, stock_key)) or build_portfolio_arrays(forecast_df, stock_df),
+        slot='triage'
+    )
+
+class TriageJob:
+    """Tryb triage: natychmiastowy ranking ryzyka i pełna symulacja w tle wg priorytetu.
+
+    Ranking powstaje w konstruktorze (operacje wektorowe na macierzach portfela),
+    a wątek w tle uruchamia symulacje wsadowe AS-IS/TO-BE porcjami po
+    ``chunk_size`` materiałów, zaczynając od najbardziej zagrożonych.
+    ``arrays`` to macierze portfela (``shared_portfolio_arrays``) - zadanie ich
+    nie kopiuje ani nie modyfikuje.
+    """
+
+    def __init__(self, arrays: dict, data_key=None, chunk_size: int = 2000):
+        start = time.perf_counter()
+        self.data_key = data_key
+        self.chunk_size = chunk_size
+        self.arrays = arrays
+        self.ranking = rank_shortage_risk(self.arrays)
+        self.ranking_seconds = time.perf_counter() - start
+
+        self.total = len(self.ranking)
+        self.done = 0
+        self.error = None
+        self._status = np.full(self.total, PENDING_STATUS, dtype=object)
+        self._production = np.full(self.total, np.nan)
+        self._postponed = np.zeros(self.total, dtype=np.int64)
+        self._min_stock = np.full(self.total, np.nan)
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'TriageJob':
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    @property
+    def finished(self) -> bool:
+        return self._thread.ident is not None and not self._thread.is_alive()
+
+    @property
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 1.0
+
+    def _run(self):
+        arrays = self.arrays
+        receivable = receivable_weeks(arrays['weeks'])
+        rows_in_order = self.ranking['Wiersz'].to_numpy()
+        try:
+            for start in range(0, self.total, self.chunk_size):
+                if self._cancelled.is_set():
+                    break
+                rows = rows_in_order[start:start + self.chunk_size]
+                forecast = arrays['forecast'][rows]
+                income = arrays['income'][rows]
+                consumption = arrays['consumption'][rows]
+                as_is = run_as_is_batch(arrays['stock'][rows], forecast, income, consumption)
+                to_be = run_optimized_batch(arrays['stock'][rows], forecast, income, consumption, arrays['batch'][rows], receivable)
+
+                has_shortage = (as_is['status'] == STATUS_SHORTAGE).any(axis=1)
+                has_excess = (as_is['status'] == STATUS_EXCESS).any(axis=1)
+                positions = slice(start, start + len(rows))
+                with self._lock:
+                    self._status[positions] = np.where(has_shortage, "🔴 BRAKI", np.where(has_excess, "🟡 NADMIAR", "✅ OK"))
+                    self._production[positions] = to_be['production'].sum(axis=1)
+                    self._postponed[positions] = (to_be['postponed'] > 0).sum(axis=1)
+                    self._min_stock[positions] = to_be['stock_end'].min(axis=1, initial=np.inf)
+                    self.done = start + len(rows)
+        except Exception as e:
+            self.error = e
+        finally:
+            # Macierze nie są już potrzebne - zwalniamy referencję, wynik zostaje w kolumnach podsumowania
+            self.arrays = None
+
+    def snapshot(self) -> pd.DataFrame:
+        """Ranking z wynikami pełnej symulacji dla materiałów już przeliczonych."""
+        with self._lock:
+            refined = pd.DataFrame({
+                'Status': self._status.copy(),
+                'Produkcja TO-BE': self._production.copy(),
+                'Przesunięcia TO-BE': self._postponed.copy(),
+                'Min. zapas TO-BE': self._min_stock.copy()
+            })
+        ranking = self.ranking.drop(columns='Wiersz').reset_index(drop=True)
+        return pd.concat([ranking, refined], axis=1)
@@ -1,6 +1,7 @@
 # utils.py
 
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import re
 import math
@@ -8,6 +9,12 @@ import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
+from scipy import sparse
+
+# Magazyn / lokalizacja dokumentu w pliku stanu (kolumna opcjonalna)
+WAREHOUSE_COLUMN = 'magazyn'
+WAREHOUSE_ALIASES = ['magazyn', 'Magazyn', 'lokalizacja', 'Lokalizacja', 'WhsCode']
+DEFAULT_WAREHOUSE = "Magazyn główny"
 
 def get_date_range_from_week(week_str: str) -> str:
     """Konwertuje identyfikator tygodnia na zakres dat roboczych (pon-pt) zgodnie ze standardem ISO 8601."""
@@ -90,10 +97,14 @@ def process_forecast_file(uploaded_file) -> pd.DataFrame:
     df.set_index(correct_material_col, inplace=True)
     
     for col in week_cols:
-        if df[col].dtype == 'object':
+        # Kolumny tekstowe (object lub str w pandas 3) - przecinek dziesiętny
+        if not pd.api.types.is_numeric_dtype(df[col]):
             df[col] = df[col].astype(str).str.replace(',', '.', regex=False)
     
-    return df[week_cols].fillna(0).apply(pd.to_numeric, errors='coerce').fillna(0)
+    result = df[week_cols].fillna(0).apply(pd.to_numeric, errors='coerce').fillna(0)
+    # Kolumny pominięte przy wczytywaniu - do raportu jakości danych
+    result.attrs['ignored_columns'] = [str(col) for col in df.columns if col not in week_cols]
+    return result
 
 def process_stock_file(uploaded_file, file_name: str) -> pd.DataFrame:
     """Przetwarza nowy plik dostępnych ilości - zwraca cały DataFrame."""
@@ -121,6 +132,17 @@ def process_stock_file(uploaded_file, file_name: str) -> pd.DataFrame:
             df[col] = df[col].astype(str).str.replace(',', '.', regex=False)
             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
     
+    # Magazyn - bez kolumny lokalizacji wszystkie dokumenty należą do jednego magazynu.
+    # Wiersze z pustym kodem dostają DEFAULT_WAREHOUSE; jeśli ich stan równa się sumie
+    # magazynów z kodem, to wiersz sumy z eksportu ERP i nie jest liczony drugi raz
+    # (patrz site_stock_levels), w przeciwnym razie to osobny, nieprzypisany magazyn.
+    warehouse_col = next((col for col in WAREHOUSE_ALIASES if col in df.columns), None)
+    if warehouse_col is None:
+        df[WAREHOUSE_COLUMN] = DEFAULT_WAREHOUSE
+    else:
+        warehouses = df[warehouse_col].fillna('').astype(str).str.strip()
+        df[WAREHOUSE_COLUMN] = warehouses.where(warehouses != '', DEFAULT_WAREHOUSE)
+    
     return df
 
 def extract_material_data(stock_df: pd.DataFrame, material_number: int):
@@ -130,8 +152,11 @@ def extract_material_data(stock_df: pd.DataFrame, material_number: int):
     if material_data.empty:
         raise ValueError(f"Nie znaleziono danych dla materiału {material_number}")
     
-    # Stan magazynowy (pierwsza wartość, bo jest taka sama dla wszystkich wierszy)
-    current_stock = float(material_data['w magazynie'].iloc[0])
+    # Stan magazynowy (pierwsza wartość w każdym magazynie, bo jest taka sama dla jego wierszy)
+    if WAREHOUSE_COLUMN in material_data.columns:
+        current_stock = float(site_stock_levels(material_data).sum())
+    else:
+        current_stock = float(material_data['w magazynie'].iloc[0])
     
     # Dokumenty ZP (zamówienia produkcyjne)
     zp_df = material_data[material_data['DocNum'].astype(str).str.upper().str.contains('ZP', na=False)]
@@ -151,88 +176,134 @@ def extract_material_data(stock_df: pd.DataFrame, material_number: int):
     
     return current_stock, weekly_zp_income, weekly_zs_consumption, standard_batch
 
-def run_as_is_simulation(current_stock, forecast_series, aligned_income, aligned_consumption):
-    """Symulacja AS-IS - obecny plan bez korekt."""
-    simulation_data = []
+def align_material_flows(forecast_series: pd.Series, weekly_zp: pd.Series, weekly_zs: pd.Series):
+    """Dopasowuje tygodniowe przychody ZP i rozchody ZS do kolumn prognozy."""
+    aligned_income = pd.Series(0.0, index=forecast_series.index)
+    aligned_consumption = pd.Series(0.0, index=forecast_series.index)
+    
+    for col in forecast_series.index:
+        parsed = get_year_week_from_col(col)
+        if parsed:
+            year, week = parsed
+            if (year, week) in weekly_zp.index:
+                aligned_income[col] = weekly_zp[(year, week)]
+            if (year, week) in weekly_zs.index:
+                aligned_consumption[col] = weekly_zs[(year, week)]
+    
+    return aligned_income, aligned_consumption
+
+# Kody statusów symulacji (wspólne dla silników wsadowych)
+STATUS_OK = 0
+STATUS_SHORTAGE = 1
+STATUS_EXCESS = 2
+STATUS_LABELS = {STATUS_OK: "✅ OK", STATUS_SHORTAGE: "🔴 BRAK", STATUS_EXCESS: "🟡 NADMIAR"}
+
+# Flagi akcji TO-BE (bitowe - tydzień może mieć przesunięcie i przyjęcie jednocześnie)
+ACTION_NONE = 0
+ACTION_PRODUCTION = 1
+ACTION_POSTPONE = 2
+ACTION_RECEIVE = 4
+
+# Rekordy symulacji jednego materiału (wiersz = tydzień); popyt i przepływy ZS zostają w seriach wejściowych
+AS_IS_DTYPE = np.dtype([
+    ('stock_start', 'f8'),
+    ('stock_end', 'f8'),
+    ('status', 'i1')
+])
+TO_BE_DTYPE = np.dtype([
+    ('stock_start', 'f8'),
+    ('income', 'f8'),
+    ('stock_end', 'f8'),
+    ('action', 'i1'),
+    ('production', 'f8'),
+    ('postponed', 'f8'),
+    ('target_week', 'i4'),
+    ('received', 'f8')
+])
+
+def run_as_is_simulation(current_stock, forecast_series, aligned_income, aligned_consumption) -> np.ndarray:
+    """Symulacja AS-IS - obecny plan bez korekt. Zwraca rekordy ``AS_IS_DTYPE``."""
+    forecast = forecast_series.to_numpy()
+    income = aligned_income.to_numpy()
+    consumption = aligned_consumption.to_numpy()
+    steps = max(len(forecast) - 1, 0)
+    records = np.zeros(steps, dtype=AS_IS_DTYPE)
     stock = current_stock
     
-    for i in range(len(forecast_series) - 1):
+    for i in range(steps):
         stock_at_start = stock
-        income_zp = aligned_income.iloc[i]
-        consumption_zs = aligned_consumption.iloc[i]
-        demand_forecast = forecast_series.iloc[i]
-        demand_next_week = forecast_series.iloc[i+1]
+        income_zp = income[i]
+        demand_next_week = forecast[i+1]
         
-        stock_after_all = stock_at_start + income_zp - (demand_forecast + consumption_zs)
+        stock_after_all = stock_at_start + income_zp - (forecast[i] + consumption[i])
         
         # Analiza problemu
-        decision = "✅ OK"
+        decision = STATUS_OK
         if stock_after_all < demand_next_week:
-            decision = "🔴 BRAK"
-        elif i + 3 < len(forecast_series) and income_zp > 0:
-            three_week_buffer = demand_next_week + forecast_series.iloc[i+2] + forecast_series.iloc[i+3]
+            decision = STATUS_SHORTAGE
+        elif i + 3 < len(forecast) and income_zp > 0:
+            three_week_buffer = demand_next_week + forecast[i+2] + forecast[i+3]
             if stock_after_all > three_week_buffer:
-                decision = "🟡 NADMIAR"
+                decision = STATUS_EXCESS
         
-        row = {
-            "Tydzień (pon-pt)": get_date_range_from_week(forecast_series.index[i]),
-            "Tydzień": str(forecast_series.index[i]).strip(),
-            "Zapas początek": stock_at_start,
-            "Przychód ZP": income_zp,
-            "Rozchód ZS": consumption_zs,
-            "Popyt (prognoza)": demand_forecast,
-            "Zapas koniec": stock_after_all,
-            "Bufor (nast. tydz.)": demand_next_week,
-            "Status": decision
-        }
-        simulation_data.append(row)
+        records[i] = (stock_at_start, stock_after_all, decision)
         stock = stock_after_all
     
-    return simulation_data
+    return records
 
-def run_optimized_simulation(current_stock, forecast_series, aligned_income, aligned_consumption, batch_size):
-    """Symulacja TO-BE - zoptymalizowany plan."""
-    simulation_data = []
+def run_optimized_simulation(current_stock, forecast_series, aligned_income, aligned_consumption, batch_size) -> np.ndarray:
+    """Symulacja TO-BE - zoptymalizowany plan. Zwraca rekordy ``TO_BE_DTYPE``.
+
+    ``target_week`` to pozycja tygodnia docelowego przesunięcia w prognozie (-1 = poza horyzontem).
+    """
+    weeks = forecast_series.index
+    forecast = forecast_series.to_numpy()
+    income = aligned_income.to_numpy()
+    consumption = aligned_consumption.to_numpy()
+    steps = max(len(forecast) - 1, 0)
+    records = np.zeros(steps, dtype=TO_BE_DTYPE)
+    records['target_week'] = -1
     stock = current_stock
     future_adjustments = {}
     
-    for i in range(len(forecast_series) - 1):
-        week_name = forecast_series.index[i]
-        postponed = future_adjustments.get(week_name, 0)
-        original_income = aligned_income.iloc[i]
+    for i in range(steps):
+        record = records[i]
+        postponed = future_adjustments.get(weeks[i], 0)
+        original_income = income[i]
         current_income = original_income + postponed
         
-        demand_forecast = forecast_series.iloc[i]
-        demand_next_week = forecast_series.iloc[i+1]
-        consumption_zs = aligned_consumption.iloc[i]
+        demand_next_week = forecast[i+1]
         
         stock_at_start = stock
-        stock_after = stock_at_start + current_income - (demand_forecast + consumption_zs)
+        stock_after = stock_at_start + current_income - (forecast[i] + consumption[i])
         
-        action = ""
+        action = ACTION_NONE
         
         # Logika optymalizacji
         if stock_after < demand_next_week:
             deficit = demand_next_week - stock_after
             needed = (math.ceil(deficit / batch_size) * batch_size) if batch_size and batch_size > 0 else deficit
-            action = f"🔴 PRODUKCJA: +{needed:,.0f}"
+            action = ACTION_PRODUCTION
+            record['production'] = needed
             stock = stock_after + needed
-        elif i + 3 < len(forecast_series) and original_income > 0:
+        elif i + 3 < len(forecast) and original_income > 0:
             stock_without_zp = stock_after - original_income
-            three_week_buffer = demand_next_week + forecast_series.iloc[i+2] + forecast_series.iloc[i+3]
+            three_week_buffer = demand_next_week + forecast[i+2] + forecast[i+3]
             
             if (stock_after > three_week_buffer) and (stock_without_zp >= demand_next_week):
                 target_week = "Poza horyzontem"
                 temp_stock = stock_without_zp
                 
-                for k in range(i + 1, len(forecast_series) - 1):
-                    temp_stock += (aligned_income.iloc[k] + future_adjustments.get(forecast_series.index[k], 0)) - (aligned_consumption.iloc[k] + forecast_series.iloc[k])
-                    if temp_stock < forecast_series.iloc[k+1]:
-                        target_week = forecast_series.index[k].strip()
+                for k in range(i + 1, steps):
+                    temp_stock += (income[k] + future_adjustments.get(weeks[k], 0)) - (consumption[k] + forecast[k])
+                    if temp_stock < forecast[k+1]:
+                        target_week = weeks[k].strip()
+                        record['target_week'] = k
                         break
                 
                 future_adjustments[target_week] = future_adjustments.get(target_week, 0) + original_income
-                action = f"🟡➡️ PRZESUNIĘTO: {original_income:,.0f} na {target_week}"
+                action = ACTION_POSTPONE
+                record['postponed'] = original_income
                 current_income -= original_income
                 stock = stock_without_zp
             else:
@@ -241,22 +312,481 @@ def run_optimized_simulation(current_stock, forecast_series, aligned_income, ali
             stock = stock_after
         
         if postponed > 0:
-            action += f" 🟡⬅️ PRZYJĘTO: {postponed:,.0f}"
+            action |= ACTION_RECEIVE
+            record['received'] = postponed
         
-        row = {
-            "Tydzień (pon-pt)": get_date_range_from_week(week_name),
-            "Tydzień": str(week_name).strip(),
-            "Zapas początek": stock_at_start,
-            "Przychód ZP": current_income,
-            "Rozchód ZS": consumption_zs,
-            "Popyt (prognoza)": demand_forecast,
-            "Akcja": action.strip(),
-            "Zapas koniec": stock,
-            "Bufor (nast. tydz.)": demand_next_week
-        }
-        simulation_data.append(row)
-    
-    return simulation_data
+        record['stock_start'] = stock_at_start
+        record['income'] = current_income
+        record['stock_end'] = stock
+        record['action'] = action
+    
+    return records
+
+def format_action(record, weeks) -> str:
+    """Opis akcji TO-BE dla jednego rekordu (tylko do wyświetlania)."""
+    action = int(record['action'])
+    parts = []
+    if action & ACTION_PRODUCTION:
+        parts.append(f"🔴 PRODUKCJA: +{record['production']:,.0f}")
+    if action & ACTION_POSTPONE:
+        target = int(record['target_week'])
+        target_week = str(weeks[target]).strip() if target >= 0 else "Poza horyzontem"
+        parts.append(f"🟡➡️ PRZESUNIĘTO: {record['postponed']:,.0f} na {target_week}")
+    if action & ACTION_RECEIVE:
+        parts.append(f"🟡⬅️ PRZYJĘTO: {record['received']:,.0f}")
+    return " ".join(parts)
+
+def as_is_frame(records: np.ndarray, forecast_series: pd.Series, aligned_income: pd.Series, aligned_consumption: pd.Series) -> pd.DataFrame:
+    """Tabela AS-IS do wyświetlenia/eksportu - etykiety renderowane z kodów statusu."""
+    steps = len(records)
+    weeks = forecast_series.index[:steps]
+    return pd.DataFrame({
+        "Tydzień (pon-pt)": [get_date_range_from_week(week) for week in weeks],
+        "Tydzień": [str(week).strip() for week in weeks],
+        "Zapas początek": records['stock_start'],
+        "Przychód ZP": aligned_income.to_numpy()[:steps],
+        "Rozchód ZS": aligned_consumption.to_numpy()[:steps],
+        "Popyt (prognoza)": forecast_series.to_numpy()[:steps],
+        "Zapas koniec": records['stock_end'],
+        "Bufor (nast. tydz.)": forecast_series.to_numpy()[1:steps + 1],
+        "Status": [STATUS_LABELS[int(code)] for code in records['status']]
+    })
+
+def to_be_frame(records: np.ndarray, forecast_series: pd.Series, aligned_consumption: pd.Series) -> pd.DataFrame:
+    """Tabela TO-BE do wyświetlenia/eksportu - opisy akcji renderowane z flag i ilości."""
+    steps = len(records)
+    weeks = forecast_series.index
+    return pd.DataFrame({
+        "Tydzień (pon-pt)": [get_date_range_from_week(week) for week in weeks[:steps]],
+        "Tydzień": [str(week).strip() for week in weeks[:steps]],
+        "Zapas początek": records['stock_start'],
+        "Przychód ZP": records['income'],
+        "Rozchód ZS": aligned_consumption.to_numpy()[:steps],
+        "Popyt (prognoza)": forecast_series.to_numpy()[:steps],
+        "Akcja": [format_action(record, weeks) for record in records],
+        "Zapas koniec": records['stock_end'],
+        "Bufor (nast. tydz.)": forecast_series.to_numpy()[1:steps + 1]
+    })
+
+def portfolio_records(portfolio: dict, row: int):
+    """Rekordy ``AS_IS_DTYPE`` i ``TO_BE_DTYPE`` jednego wiersza wyniku ``simulate_portfolio``.
+
+    Odpowiadają wynikom ``run_as_is_simulation`` i ``run_optimized_simulation``,
+    więc można je przekazać do ``as_is_frame`` i ``to_be_frame``.
+    """
+    as_is, to_be = portfolio['as_is'], portfolio['to_be']
+    steps = as_is['stock_end'].shape[1]
+    as_is_records = np.zeros(steps, dtype=AS_IS_DTYPE)
+    for field in AS_IS_DTYPE.names:
+        as_is_records[field] = as_is[field][row]
+    
+    to_be_records = np.zeros(steps, dtype=TO_BE_DTYPE)
+    for field in TO_BE_DTYPE.names:
+        if field != 'action':
+            to_be_records[field] = to_be[field][row]
+    to_be_records['action'] = (
+        np.where(to_be['production'][row] > 0, ACTION_PRODUCTION, ACTION_NONE)
+        | np.where(to_be['postponed'][row] > 0, ACTION_POSTPONE, ACTION_NONE)
+        | np.where(to_be['received'][row] > 0, ACTION_RECEIVE, ACTION_NONE)
+    )
+    return as_is_records, to_be_records
+
+def build_portfolio_arrays(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, bucket: str = 'week') -> dict:
+    """Buduje macierze portfela (materiały × okresy) dla symulacji wsadowych.
+
+    Dane są wyznaczane tak samo jak w ``extract_material_data`` i
+    ``align_material_flows``, ale jedną operacją dla wszystkich materiałów.
+    Dla ``bucket`` 'day' / 'month' prognoza jest rozkładana macierzą
+    z ``bucket_calendar``, a ZP/ZS sumowane wg dziennej daty dostawy;
+    klucz 'weeks' zawiera wtedy etykiety okresów.
+    """
+    weeks = list(forecast_df.columns)
+    forecast_unique = forecast_df[~forecast_df.index.duplicated(keep='first')]
+    materials = np.intersect1d(
+        forecast_unique.index.to_numpy(dtype=np.int64),
+        stock_df['numer indeksu'].to_numpy(dtype=np.int64)
+    )
+    n = len(weeks)
+    
+    forecast = forecast_unique.loc[materials].to_numpy(dtype=float)
+    stock_rows = stock_df[stock_df['numer indeksu'].isin(materials)]
+    current_stock = site_stock_levels(stock_rows).groupby(level=0).sum().reindex(materials).to_numpy(dtype=float)
+    
+    zp_rows, zs_rows = split_documents(stock_rows)
+    
+    # Standardowa partia - z pierwszego ZP wg daty dostawy
+    batch = (
+        zp_rows.sort_values(by='Data dostawy', kind='stable')
+        .groupby('numer indeksu')['Zamówione'].first()
+        .reindex(materials).fillna(0).to_numpy(dtype=float)
+    )
+    
+    if bucket == 'week':
+        week_positions = forecast_week_positions(weeks)
+        income = build_weekly_flows(zp_rows, 'Zamówione', materials, week_positions, n)
+        consumption = build_weekly_flows(zs_rows, 'Potwierdzone', materials, week_positions, n)
+    else:
+        weeks, first_day, day_bucket, spread = bucket_calendar(weeks, bucket)
+        forecast = np.asarray(forecast @ spread)
+        income = build_bucket_flows(zp_rows, 'Zamówione', materials, first_day, day_bucket)
+        consumption = build_bucket_flows(zs_rows, 'Potwierdzone', materials, first_day, day_bucket)
+    
+    return {
+        'materials': materials,
+        'weeks': weeks,
+        'bucket': bucket,
+        'stock': current_stock,
+        'forecast': forecast,
+        'income': income,
+        'consumption': consumption,
+        'batch': batch
+    }
+
+def split_documents(stock_rows: pd.DataFrame):
+    """Dzieli dokumenty na dostawy ZP i rozchody ZS (z dodatnią ilością)."""
+    doc = stock_rows['DocNum'].astype(str).str.upper()
+    zp_rows = stock_rows[doc.str.contains('ZP', na=False) & (stock_rows['Zamówione'] > 0)]
+    zs_rows = stock_rows[doc.str.contains('ZS', na=False) & (stock_rows['Potwierdzone'] > 0)]
+    return zp_rows, zs_rows
+
+def blank_site_rows(levels: pd.Series):
+    """Maski (wiersz sumy, magazyn nieprzypisany) dla stanów per (materiał, magazyn).
+
+    Dotyczą tylko ``DEFAULT_WAREHOUSE`` materiałów, które mają też magazyny z kodem:
+    stan równy sumie tych magazynów to wiersz sumy z eksportu ERP, każdy inny -
+    zapas bez przypisanego magazynu.
+    """
+    blank = levels.index.get_level_values(1) == DEFAULT_WAREHOUSE
+    sites_per_material = levels.groupby(level=0).transform('size').to_numpy()
+    coded_sum = levels.where(~blank, 0.0).groupby(level=0).transform('sum').to_numpy(dtype=float)
+    mixed = blank & (sites_per_material > 1)
+    total_row = mixed & np.isclose(levels.to_numpy(dtype=float), coded_sum)
+    return total_row, mixed & ~total_row
+
+def site_stock_levels(stock_rows: pd.DataFrame) -> pd.Series:
+    """Stan magazynowy per (materiał, magazyn) - pierwsza wartość 'w magazynie' w każdym magazynie.
+
+    Stan wiersza sumy z eksportu ERP (``blank_site_rows``) jest zerowany, żeby zapas
+    nie był liczony dwa razy; dokumenty ZP/ZS takich wierszy pozostają w przepływach.
+    Wiersz bez kodu z innym stanem liczy się jak osobny magazyn (raport jakości
+    zgłasza go jako ostrzeżenie).
+    """
+    if WAREHOUSE_COLUMN not in stock_rows.columns:
+        return stock_rows.groupby('numer indeksu')['w magazynie'].first()
+    levels = stock_rows.groupby(['numer indeksu', WAREHOUSE_COLUMN], sort=False)['w magazynie'].first().sort_index()
+    total_row, _ = blank_site_rows(levels)
+    return levels.where(~total_row, 0.0)
+
+def forecast_week_positions(weeks) -> pd.DataFrame:
+    """Kolumny prognozy odpowiadające danemu (rok, tydzień)."""
+    return pd.DataFrame(
+        [(*parsed, pos) for pos, parsed in enumerate(map(get_year_week_from_col, weeks)) if parsed],
+        columns=['year', 'week', 'pos']
+    )
+
+def build_weekly_flows(doc_rows: pd.DataFrame, value_col: str, materials: np.ndarray,
+                       week_positions: pd.DataFrame, n_weeks: int) -> sparse.csr_matrix:
+    """Buduje rzadką macierz przepływów (materiały × tygodnie) w formacie CSR.
+
+    Koszt pamięci i dopasowania zależy od liczby dokumentów, a nie od iloczynu
+    liczby materiałów i tygodni. ``week_positions`` mapuje (year, week) na kolumnę.
+    """
+    shape = (len(materials), n_weeks)
+    weekly = doc_rows.groupby(['numer indeksu', 'year', 'week'])[value_col].sum().reset_index()
+    if weekly.empty or week_positions.empty:
+        return sparse.csr_matrix(shape)
+    
+    weekly[['year', 'week']] = weekly[['year', 'week']].astype('int64')
+    merged = weekly.merge(week_positions, on=['year', 'week'])
+    row_idx = np.searchsorted(materials, merged['numer indeksu'].to_numpy(dtype=np.int64))
+    return sparse.csr_matrix(
+        (merged[value_col].to_numpy(dtype=float), (row_idx, merged['pos'].to_numpy())),
+        shape=shape
+    )
+
+# Granulacja okresów symulacji (klucz -> nazwa kolumny okresu)
+BUCKET_LABELS = {'day': "Dzień", 'week': "Tydzień", 'month': "Miesiąc"}
+WORKING_DAYS = 5
+
+def bucket_calendar(weeks, bucket: str):
+    """Kalendarz okresów dziennych lub miesięcznych dla kolumn tygodni prognozy.
+
+    Horyzont to dni od poniedziałku pierwszego do niedzieli ostatniego tygodnia.
+    Popyt tygodnia jest rozkładany po równo na dni robocze (pon-pt).
+    Zwraca (etykiety okresów, pierwszy dzień, okres każdego dnia horyzontu,
+    rzadka macierz rozkładu tygodnie × okresy).
+    """
+    if bucket not in ('day', 'month'):
+        raise ValueError(f"Nieobsługiwana granulacja kalendarza: {bucket}")
+    positions = forecast_week_positions(weeks)
+    mondays = pd.to_datetime(
+        positions['year'].astype(str) + '-' + positions['week'].astype(str).str.zfill(2) + '-1',
+        format='%G-%V-%u', errors='coerce'
+    )
+    valid = mondays.notna().to_numpy()
+    if not valid.any():
+        raise ValueError("Brak kolumn prognozy rozpoznanych jako tydzień.")
+    positions = positions[valid]
+    mondays = mondays[valid].to_numpy().astype('datetime64[D]')
+    
+    first_day = mondays.min()
+    days = np.arange(first_day, mondays.max() + 7)
+    if bucket == 'day':
+        day_bucket = np.arange(len(days))
+        labels = [str(day) for day in days]
+    else:
+        months, day_bucket = np.unique(days.astype('datetime64[M]'), return_inverse=True)
+        labels = [str(month) for month in months]
+    
+    day_pos = ((mondays - first_day).astype(np.int64)[:, None] + np.arange(WORKING_DAYS)).ravel()
+    spread = sparse.csr_matrix(
+        (
+            np.full(day_pos.size, 1.0 / WORKING_DAYS),
+            (np.repeat(positions['pos'].to_numpy(), WORKING_DAYS), day_bucket[day_pos])
+        ),
+        shape=(len(weeks), len(labels))
+    )
+    return labels, first_day, day_bucket, spread
+
+def build_bucket_flows(doc_rows: pd.DataFrame, value_col: str, materials: np.ndarray,
+                       first_day: np.datetime64, day_bucket: np.ndarray) -> sparse.csr_matrix:
+    """Rzadka macierz przepływów (materiały × okresy) z dziennych dat dostawy.
+
+    Dokumenty bez daty lub poza horyzontem kalendarza są pomijane, jak w ``build_weekly_flows``.
+    """
+    shape = (len(materials), int(day_bucket.max()) + 1 if len(day_bucket) else 0)
+    dates = doc_rows['Data dostawy'].to_numpy(dtype='datetime64[D]')
+    dated = ~np.isnat(dates)
+    offsets = np.full(len(dates), -1, dtype=np.int64)
+    offsets[dated] = (dates[dated] - first_day).astype(np.int64)
+    inside = (offsets >= 0) & (offsets < len(day_bucket))
+    
+    row_idx = np.searchsorted(materials, doc_rows['numer indeksu'].to_numpy(dtype=np.int64)[inside])
+    return sparse.csr_matrix(
+        (doc_rows[value_col].to_numpy(dtype=float)[inside], (row_idx, day_bucket[offsets[inside]])),
+        shape=shape
+    )
+
+def _flow_column_reader(flows):
+    """Zwraca funkcję odczytującą gęstą kolumnę tygodnia z macierzy przepływów (gęstej lub rzadkiej)."""
+    if not sparse.issparse(flows):
+        return lambda j: flows[:, j]
+    
+    csc = flows.tocsc()
+    csc.sum_duplicates()
+    
+    def read_column(j):
+        column = np.zeros(csc.shape[0])
+        start, end = csc.indptr[j], csc.indptr[j + 1]
+        column[csc.indices[start:end]] = csc.data[start:end]
+        return column
+    
+    return read_column
+
+def _flow_rows(flows, rows, start: int, end: int) -> np.ndarray:
+    """Zwraca gęsty fragment macierzy przepływów dla wybranych wierszy i tygodni [start, end).
+
+    Macierz rzadka musi być w formacie CSR (``build_weekly_flows`` / ``build_bucket_flows``).
+    """
+    if sparse.issparse(flows):
+        return flows[rows][:, start:end].toarray()
+    return flows[rows, start:end]
+
+class ForecastRows:
+    """Widok wybranych wierszy wspólnej macierzy prognozy (opcjonalnie przeskalowanych).
+
+    Silniki wsadowe czytają prognozę tylko kolumnami (``forecast[:, j]`` i
+    ``forecast[rows, j]``), więc widok odczytuje wiersze partycji w momencie
+    dostępu - bez kopii całej macierzy dla każdej partycji.
+    """
+
+    def __init__(self, matrix: np.ndarray, rows: np.ndarray, scale: np.ndarray = None):
+        self.matrix = matrix
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.scale = None if scale is None else np.asarray(scale, dtype=float)
+        self.shape = (len(self.rows), matrix.shape[1])
+
+    def __getitem__(self, key):
+        rows, column = key
+        values = self.matrix[self.rows[rows], column]
+        if self.scale is not None:
+            values = values * self.scale[rows]
+        return values
+
+def run_as_is_batch(current_stock, forecast, income, consumption) -> dict:
+    """Wsadowa symulacja AS-IS - te same reguły co ``run_as_is_simulation``, wektorowo po materiałach.
+
+    ``income`` i ``consumption`` mogą być macierzami gęstymi lub rzadkimi (``build_weekly_flows``).
+    """
+    m, n = forecast.shape
+    steps = max(n - 1, 0)
+    stock_start = np.zeros((m, steps))
+    stock_end = np.zeros((m, steps))
+    status = np.full((m, steps), STATUS_OK, dtype=np.int8)
+    stock = np.asarray(current_stock, dtype=float).copy()
+    income_column = _flow_column_reader(income)
+    consumption_column = _flow_column_reader(consumption)
+    
+    for i in range(steps):
+        income_zp = income_column(i)
+        stock_start[:, i] = stock
+        stock = stock + income_zp - (forecast[:, i] + consumption_column(i))
+        stock_end[:, i] = stock
+        
+        demand_next_week = forecast[:, i + 1]
+        shortage = stock < demand_next_week
+        status[shortage, i] = STATUS_SHORTAGE
+        if i + 3 < n:
+            three_week_buffer = demand_next_week + forecast[:, i + 2] + forecast[:, i + 3]
+            excess = ~shortage & (income_zp > 0) & (stock > three_week_buffer)
+            status[excess, i] = STATUS_EXCESS
+    
+    return {'stock_start': stock_start, 'stock_end': stock_end, 'status': status}
+
+def receivable_weeks(weeks) -> np.ndarray:
+    """Tygodnie, w których można przyjąć przesuniętą dostawę - maska dla ``run_optimized_batch``.
+
+    W symulacji referencyjnej przesunięcia trafiają tylko do kolumn bez białych znaków w nazwie.
+    """
+    return np.array([str(col) == str(col).strip() for col in weeks], dtype=bool)
+
+def run_optimized_batch(current_stock, forecast, income, consumption, batch, receivable=None) -> dict:
+    """Wsadowa symulacja TO-BE - te same reguły co ``run_optimized_simulation``, wektorowo po materiałach.
+
+    ``receivable`` wskazuje tygodnie, w których można przyjąć przesuniętą dostawę
+    (``receivable_weeks``; domyślnie wszystkie).
+    Tydzień docelowy przesunięcia ``-1`` oznacza "Poza horyzontem".
+    ``income`` i ``consumption`` mogą być macierzami gęstymi lub rzadkimi (``build_weekly_flows``).
+    """
+    m, n = forecast.shape
+    steps = max(n - 1, 0)
+    if receivable is None:
+        receivable = np.ones(n, dtype=bool)
+    
+    stock_start = np.zeros((m, steps))
+    stock_end = np.zeros((m, steps))
+    income_used = np.zeros((m, steps))
+    production = np.zeros((m, steps))
+    postponed = np.zeros((m, steps))
+    target_week = np.full((m, steps), -1, dtype=np.int32)
+    received = np.zeros((m, steps))
+    
+    # Przesunięte dostawy - kolumna tworzona dopiero dla tygodnia, który coś otrzymał
+    adjustments = {}
+    batch = np.asarray(batch, dtype=float)
+    valid_batch = batch > 0
+    # Wiersze przepływów czytane przy każdym przesunięciu - konwersja do CSR raz, przed pętlą
+    income, consumption = (flows.tocsr() if sparse.issparse(flows) else flows for flows in (income, consumption))
+    stock = np.asarray(current_stock, dtype=float).copy()
+    income_column = _flow_column_reader(income)
+    consumption_column = _flow_column_reader(consumption)
+    
+    for i in range(steps):
+        incoming = adjustments.pop(i) if receivable[i] and i in adjustments else np.zeros(m)
+        original_income = income_column(i)
+        current_income = original_income + incoming
+        demand_next_week = forecast[:, i + 1]
+        
+        stock_start[:, i] = stock
+        stock_after = stock + current_income - (forecast[:, i] + consumption_column(i))
+        stock = stock_after.copy()
+        
+        # Produkcja w wielokrotnościach partii
+        shortage = stock_after < demand_next_week
+        if shortage.any():
+            deficit = demand_next_week[shortage] - stock_after[shortage]
+            batch_rows = batch[shortage]
+            needed = np.where(
+                valid_batch[shortage],
+                np.ceil(deficit / np.where(valid_batch[shortage], batch_rows, 1.0)) * batch_rows,
+                deficit
+            )
+            production[shortage, i] = needed
+            stock[shortage] = stock_after[shortage] + needed
+        
+        # Przesunięcie dostaw ZP przy nadmiarze
+        if i + 3 < n:
+            stock_without_zp = stock_after - original_income
+            three_week_buffer = demand_next_week + forecast[:, i + 2] + forecast[:, i + 3]
+            move = (
+                ~shortage & (original_income > 0)
+                & (stock_after > three_week_buffer) & (stock_without_zp >= demand_next_week)
+            )
+            rows = np.flatnonzero(move)
+            if len(rows):
+                temp_stock = stock_without_zp[rows]
+                target = np.full(len(rows), -1, dtype=np.int32)
+                searching = np.ones(len(rows), dtype=bool)
+                future_income = _flow_rows(income, rows, i + 1, n - 1)
+                future_consumption = _flow_rows(consumption, rows, i + 1, n - 1)
+                for k in range(i + 1, n - 1):
+                    adjustment = adjustments[k][rows] if receivable[k] and k in adjustments else 0.0
+                    temp_stock = temp_stock + (
+                        (future_income[:, k - i - 1] + adjustment)
+                        - (future_consumption[:, k - i - 1] + forecast[rows, k])
+                    )
+                    found = searching & (temp_stock < forecast[rows, k + 1])
+                    target[found] = k
+                    searching &= ~found
+                    if not searching.any():
+                        break
+                
+                moved = original_income[rows]
+                for k in np.unique(target[target >= 0]):
+                    hit = target == k
+                    column = adjustments.setdefault(int(k), np.zeros(m))
+                    column[rows[hit]] += moved[hit]
+                postponed[rows, i] = moved
+                target_week[rows, i] = target
+                current_income[rows] -= moved
+                stock[rows] = stock_without_zp[rows]
+        
+        received[:, i] = np.where(incoming > 0, incoming, 0.0)
+        income_used[:, i] = current_income
+        stock_end[:, i] = stock
+    
+    return {
+        'stock_start': stock_start,
+        'stock_end': stock_end,
+        'income': income_used,
+        'production': production,
+        'postponed': postponed,
+        'target_week': target_week,
+        'received': received
+    }
+
+def simulate_portfolio(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, bucket: str = 'week') -> dict:
+    """Buduje macierze portfela i uruchamia na nich wsadowe symulacje AS-IS i TO-BE.
+
+    Przy granulacji innej niż tydzień reguły silników (bufor na następny okres,
+    przesunięcie ZP o 1-3 okresy) dotyczą okresów: dni lub miesięcy.
+    """
+    arrays = build_portfolio_arrays(forecast_df, stock_df, bucket)
+    receivable = receivable_weeks(arrays['weeks'])
+    arrays['as_is'] = run_as_is_batch(arrays['stock'], arrays['forecast'], arrays['income'], arrays['consumption'])
+    arrays['to_be'] = run_optimized_batch(
+        arrays['stock'], arrays['forecast'], arrays['income'], arrays['consumption'], arrays['batch'], receivable
+    )
+    return arrays
+
+def aggregate_portfolio_projection(portfolio: dict, materials=None) -> pd.DataFrame:
+    """Sumuje projekcję zapasów i liczby braków okres po okresie dla całego portfela lub jego podzbioru."""
+    if materials is None:
+        rows = slice(None)
+    else:
+        materials = np.asarray(materials, dtype=np.int64)
+        rows = np.flatnonzero(np.isin(portfolio['materials'], materials))
+    
+    as_is, to_be = portfolio['as_is'], portfolio['to_be']
+    weeks = [str(col).strip() for col in portfolio['weeks'][:as_is['stock_end'].shape[1]]]
+    return pd.DataFrame({
+        BUCKET_LABELS[portfolio.get('bucket', 'week')]: weeks,
+        'Zapas koniec AS-IS': as_is['stock_end'][rows].sum(axis=0),
+        'Zapas koniec TO-BE': to_be['stock_end'][rows].sum(axis=0),
+        'Braki AS-IS': (as_is['status'][rows] == STATUS_SHORTAGE).sum(axis=0),
+        'Nadmiar AS-IS': (as_is['status'][rows] == STATUS_EXCESS).sum(axis=0),
+        'Akcje produkcji TO-BE': (to_be['production'][rows] > 0).sum(axis=0)
+    })
 
 def create_comparison_chart(as_is_df: pd.DataFrame, optimized_df: pd.DataFrame, material_number: int):
     """Tworzy interaktywny wykres porównawczy z Plotly."""
@@ -296,8 +826,113 @@ def create_comparison_chart(as_is_df: pd.DataFrame, optimized_df: pd.DataFrame,
     
     return fig
 
+def downsample_minmax(values: np.ndarray, max_points: int):
+    """Zmniejsza liczbę punktów na wiersz, zachowując minimum i maksimum w każdym przedziale.
+
+    Zwraca (pozycje kolumn, wartości) - obie tablice o kształcie (wiersze, punkty).
+    """
+    values = np.atleast_2d(values)
+    rows, cols = values.shape
+    positions = np.broadcast_to(np.arange(cols), values.shape)
+    if cols <= max_points or max_points < 2:
+        return positions, values
+    
+    buckets = max_points // 2
+    width = math.ceil(cols / buckets)
+    padded = np.pad(values, ((0, 0), (0, buckets * width - cols)), mode='edge').reshape(rows, buckets, width)
+    offsets = np.arange(buckets) * width
+    lo = np.minimum(padded.argmin(axis=2) + offsets, cols - 1)
+    hi = np.minimum(padded.argmax(axis=2) + offsets, cols - 1)
+    picked = np.sort(np.stack([lo, hi], axis=2).reshape(rows, -1), axis=1)
+    return picked, np.take_along_axis(values, picked, axis=1)
+
+def create_portfolio_chart(projection: pd.DataFrame, max_points: int = 2000):
+    """Tworzy wykres zbiorczy portfela (WebGL): łączny zapas AS-IS/TO-BE i liczba braków."""
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    # Pierwsza kolumna projekcji to okres (Tydzień / Dzień / Miesiąc)
+    period = projection.columns[0]
+    weeks = projection[period].to_numpy()
+    
+    for column, name, line in (
+        ('Zapas koniec AS-IS', 'AS-IS (bez korekt)', dict(color='red', width=2, dash='dash')),
+        ('Zapas koniec TO-BE', 'TO-BE (zoptymalizowany)', dict(color='green', width=3))
+    ):
+        positions, values = downsample_minmax(projection[column].to_numpy(dtype=float), max_points)
+        fig.add_trace(go.Scattergl(
+            x=weeks[positions[0]],
+            y=values[0],
+            mode='lines+markers',
+            name=name,
+            line=line,
+            marker=dict(size=6)
+        ), secondary_y=False)
+    
+    fig.add_trace(go.Bar(
+        x=weeks,
+        y=projection['Braki AS-IS'],
+        name='Materiały z brakiem (AS-IS)',
+        marker_color='rgba(244, 67, 54, 0.35)'
+    ), secondary_y=True)
+    
+    fig.add_hline(y=0, line_dash="solid", line_color="black", line_width=1)
+    
+    fig.update_layout(
+        title='Projekcja Zapasów Portfela: AS-IS vs TO-BE',
+        xaxis_title=period,
+        hovermode='x unified',
+        height=500,
+        legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01)
+    )
+    fig.update_yaxes(title_text='Łączny zapas na koniec okresu [szt.]', secondary_y=False)
+    fig.update_yaxes(title_text='Liczba materiałów z brakiem', secondary_y=True)
+    
+    return fig
+
+def create_overlay_chart(portfolio: dict, materials, scenario: str = 'as_is', max_points: int = 200):
+    """Tworzy nakładkę przebiegów zapasu wielu materiałów jako jeden ślad WebGL."""
+    materials = np.asarray(materials, dtype=np.int64)
+    rows = np.flatnonzero(np.isin(portfolio['materials'], materials))
+    stock_end = portfolio[scenario]['stock_end'][rows]
+    weeks = np.array([str(col).strip() for col in portfolio['weeks'][:stock_end.shape[1]]], dtype=object)
+    positions, values = downsample_minmax(stock_end, max_points)
+    
+    # Jeden ślad z przerwami (None) zamiast setek osobnych śladów
+    count, points = values.shape
+    x = np.empty((count, points + 1), dtype=object)
+    y = np.full((count, points + 1), np.nan)
+    x[:, :points] = weeks[positions]
+    x[:, points] = None
+    y[:, :points] = values
+    labels = np.repeat(portfolio['materials'][rows], points + 1)
+    
+    fig = go.Figure(go.Scattergl(
+        x=x.ravel(),
+        y=y.ravel(),
+        customdata=labels,
+        mode='lines',
+        line=dict(color='red' if scenario == 'as_is' else 'green', width=1),
+        opacity=0.35,
+        connectgaps=False,
+        hovertemplate='Materiał %{customdata}<br>%{x}: %{y:,.0f}<extra></extra>'
+    ))
+    fig.add_hline(y=0, line_dash="solid", line_color="black", line_width=1)
+    fig.update_layout(
+        title=f"Zapas na koniec okresu - {'AS-IS' if scenario == 'as_is' else 'TO-BE'} ({count} materiałów)",
+        xaxis_title=BUCKET_LABELS[portfolio.get('bucket', 'week')],
+        yaxis_title='Zapas [szt.]',
+        height=500,
+        showlegend=False
+    )
+    
+    return fig
+
 def calculate_coverage(stock: float, avg_weekly_demand: float) -> float:
-    """Oblicza pokrycie zapasów w tygodniach."""
+    """Oblicza pokrycie zapasów w tygodniach (dla tablic - element po elemencie)."""
+    if np.ndim(avg_weekly_demand):
+        avg_weekly_demand = np.asarray(avg_weekly_demand, dtype=float)
+        coverage = np.full(avg_weekly_demand.shape, np.inf)
+        np.divide(stock, avg_weekly_demand, out=coverage, where=avg_weekly_demand > 0)
+        return coverage
     if avg_weekly_demand > 0:
         return stock / avg_weekly_demand
     return float('inf')
@@ -320,24 +955,16 @@ def analyze_all_materials(forecast_df: pd.DataFrame, stock_df: pd.DataFrame):
             coverage = calculate_coverage(current_stock, avg_demand)
             
             # Symulacja AS-IS
-            aligned_income = pd.Series(0.0, index=forecast_series.index)
-            aligned_consumption = pd.Series(0.0, index=forecast_series.index)
+            aligned_income, aligned_consumption = align_material_flows(forecast_series, weekly_zp, weekly_zs)
             
-            for col in forecast_series.index:
-                parsed = get_year_week_from_col(col)
-                if parsed:
-                    year, week = parsed
-                    if (year, week) in weekly_zp.index:
-                        aligned_income[col] = weekly_zp[(year, week)]
-                    if (year, week) in weekly_zs.index:
-                        aligned_consumption[col] = weekly_zs[(year, week)]
+            as_is = run_as_is_simulation(current_stock, forecast_series, aligned_income, aligned_consumption)
             
-            as_is_data = run_as_is_simulation(current_stock, forecast_series, aligned_income, aligned_consumption)
-            as_is_df = pd.DataFrame(as_is_data)
+            if not len(as_is):
+                raise ValueError("Horyzont prognozy < 2 tygodni")
             
             # Wykryj problemy
-            has_shortage = any('BRAK' in status for status in as_is_df['Status'])
-            has_excess = any('NADMIAR' in status for status in as_is_df['Status'])
+            has_shortage = bool((as_is['status'] == STATUS_SHORTAGE).any())
+            has_excess = bool((as_is['status'] == STATUS_EXCESS).any())
             
             status = "✅ OK"
             if has_shortage:
@@ -371,3 +998,57 @@ def analyze_all_materials(forecast_df: pd.DataFrame, stock_df: pd.DataFrame):
             })
     
     return pd.DataFrame(results)
+
+def analyze_all_materials_batch(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, portfolio: dict = None):
+    """Wsadowy odpowiednik ``analyze_all_materials`` oparty o ``run_as_is_batch``.
+
+    Zwraca te same kolumny i wiersze w kolejności indeksu prognozy. Można przekazać
+    gotowy wynik ``simulate_portfolio``, aby nie budować macierzy ponownie.
+    """
+    if portfolio is None:
+        portfolio = build_portfolio_arrays(forecast_df, stock_df)
+    as_is = portfolio.get('as_is') or run_as_is_batch(
+        portfolio['stock'], portfolio['forecast'], portfolio['income'], portfolio['consumption']
+    )
+    
+    materials = portfolio['materials']
+    forecast = portfolio['forecast']
+    n_weeks = forecast.shape[1]
+    
+    total_demand = forecast.sum(axis=1)
+    avg_demand = total_demand / n_weeks if n_weeks else np.full(len(materials), np.nan)
+    coverage = calculate_coverage(portfolio['stock'], avg_demand)
+    has_shortage = (as_is['status'] == STATUS_SHORTAGE).any(axis=1)
+    has_excess = (as_is['status'] == STATUS_EXCESS).any(axis=1)
+    status = np.where(has_shortage, "🔴 BRAKI", np.where(has_excess, "🟡 NADMIAR", "✅ OK")).astype(object)
+    
+    # Wiersze w kolejności prognozy; materiały bez danych magazynowych dostają wiersz błędu
+    order = forecast_df.index.to_numpy(dtype=np.int64)
+    pos = np.minimum(np.searchsorted(materials, order), max(len(materials) - 1, 0))
+    found = (materials[pos] == order) if len(materials) else np.zeros(len(order), dtype=bool)
+    
+    if n_weeks < 2:
+        found[:] = False
+        errors = ["❌ BŁĄD: Horyzont prognozy < 2 tygodni"] * len(order)
+    else:
+        errors = [f"❌ BŁĄD: {f'Nie znaleziono danych dla materiału {m}'[:30]}" for m in order[~found]]
+    
+    def pick(values, fill):
+        column = np.full(len(order), fill, dtype=object if isinstance(fill, str) else np.result_type(values, type(fill)))
+        column[found] = values[pos[found]]
+        return column
+    
+    result_status = pick(status, "")
+    result_status[~found] = errors
+    
+    return pd.DataFrame({
+        'Materiał': forecast_df.index,
+        'Stan magazynowy': pick(portfolio['stock'], 0.0),
+        'Popyt całkowity': pick(total_demand, 0.0),
+        'Śr. popyt tyg.': pick(avg_demand, 0.0),
+        'Pokrycie [tyg.]': pick(coverage, 0.0),
+        'Partia std.': pick(portfolio['batch'], 0.0),
+        'Status': result_status,
+        'Braki': pick(has_shortage, False).astype(bool),
+        'Nadmiar': pick(has_excess, False).astype(bool)
+    })
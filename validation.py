@@ -0,0 +1,195 @@
+# validation.py
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from shared_store import get_shared_store
+from utils import get_year_week_from_col, blank_site_rows, WAREHOUSE_COLUMN, DEFAULT_WAREHOUSE
+
+LEVEL_ERROR = 'error'
+LEVEL_WARNING = 'warning'
+LEVEL_INFO = 'info'
+LEVEL_LABELS = {LEVEL_ERROR: "❌ Błąd", LEVEL_WARNING: "⚠️ Ostrzeżenie", LEVEL_INFO: "ℹ️ Informacja"}
+
+# Kod problemu -> (poziom, opis); materiały z błędami są wykluczane z symulacji
+ISSUE_TYPES = {
+    'short_horizon': (LEVEL_ERROR, "Horyzont prognozy krótszy niż 2 tygodnie"),
+    'missing_stock': (LEVEL_ERROR, "Materiał z prognozy nie występuje w pliku stanu"),
+    'duplicate_forecast': (LEVEL_ERROR, "Materiał występuje w prognozie więcej niż raz"),
+    'inconsistent_stock': (LEVEL_ERROR, "Różne wartości 'w magazynie' w dokumentach materiału w jednym magazynie"),
+    'invalid_delivery_date': (LEVEL_WARNING, "Nieczytelna 'Data dostawy' dokumentu ZP/ZS - dokument pominięty"),
+    'outside_horizon': (LEVEL_WARNING, "Dokument ZP/ZS poza horyzontem prognozy - dokument pominięty"),
+    'duplicate_week': (LEVEL_WARNING, "Kilka kolumn prognozy wskazuje ten sam tydzień"),
+    'negative_stock': (LEVEL_WARNING, "Ujemny stan magazynowy"),
+    'unassigned_site_stock': (LEVEL_WARNING, "Stan wiersza bez kodu magazynu różni się od sumy magazynów - liczony jako osobny magazyn"),
+    'site_total_row': (LEVEL_INFO, "Wiersz bez kodu magazynu równy sumie magazynów - traktowany jako wiersz sumy ERP"),
+    'ignored_column': (LEVEL_INFO, "Kolumna prognozy nierozpoznana jako tydzień - pominięta")
+}
+STOCK_REPORT_COLUMNS = ['numer indeksu', WAREHOUSE_COLUMN, 'DocNum', 'Data dostawy', 'Zamówione', 'Potwierdzone', 'w magazynie']
+
+class QualityReport:
+    """Raport jakości danych wejściowych: problemy z liczbą wystąpień i wierszami, których dotyczą."""
+
+    def __init__(self):
+        self.issues = {}
+
+    def add(self, code: str, rows: pd.DataFrame, materials=None):
+        """Rejestruje problem (pomijany, jeśli nie ma żadnych wierszy)."""
+        if rows.empty:
+            return
+        level, description = ISSUE_TYPES[code]
+        materials = np.unique(np.asarray(materials if materials is not None else [], dtype=np.int64))
+        self.issues[code] = {'level': level, 'description': description, 'rows': rows, 'materials': materials}
+
+    @property
+    def excluded_materials(self) -> np.ndarray:
+        """Materiały wykluczone z symulacji (dotknięte problemami na poziomie błędu)."""
+        excluded = [issue['materials'] for issue in self.issues.values() if issue['level'] == LEVEL_ERROR]
+        return np.unique(np.concatenate(excluded)) if excluded else np.array([], dtype=np.int64)
+
+    @property
+    def has_errors(self) -> bool:
+        return any(issue['level'] == LEVEL_ERROR for issue in self.issues.values())
+
+    def rows(self, code: str) -> pd.DataFrame:
+        return self.issues[code]['rows'] if code in self.issues else pd.DataFrame()
+
+    def summary(self) -> pd.DataFrame:
+        """Tabela podsumowania: poziom, opis problemu, liczba wierszy i materiałów."""
+        return pd.DataFrame([
+            {
+                'Kod': code,
+                'Poziom': LEVEL_LABELS[issue['level']],
+                'Problem': issue['description'],
+                'Wierszy': len(issue['rows']),
+                'Materiałów': len(issue['materials'])
+            }
+            for code, issue in self.issues.items()
+        ], columns=['Kod', 'Poziom', 'Problem', 'Wierszy', 'Materiałów'])
+
+    def apply(self, forecast_df: pd.DataFrame, stock_df: pd.DataFrame):
+        """Zwraca (prognoza, stan) bez materiałów wykluczonych; bez kopii, jeśli nic nie wykluczono."""
+        excluded = self.excluded_materials
+        if not len(excluded):
+            return forecast_df, stock_df
+        forecast_df = forecast_df[~forecast_df.index.isin(excluded)]
+        stock_df = stock_df[~stock_df['numer indeksu'].isin(excluded)]
+        return forecast_df, stock_df
+
+def _stock_rows(stock_df: pd.DataFrame, mask) -> pd.DataFrame:
+    """Wiersze pliku stanu z numerem linii w pliku źródłowym (nagłówek = linia 1)."""
+    rows = stock_df.loc[mask, [c for c in STOCK_REPORT_COLUMNS if c in stock_df.columns]]
+    return rows.assign(**{'Wiersz pliku': rows.index.to_numpy() + 2 if pd.api.types.is_integer_dtype(rows.index) else rows.index})
+
+def validate_inputs(forecast_df: pd.DataFrame, stock_df: pd.DataFrame) -> QualityReport:
+    """Jeden przebieg walidacji obu plików - wyłącznie operacje wektorowe, bez symulacji."""
+    report = QualityReport()
+    forecast_materials = forecast_df.index.to_numpy(dtype=np.int64)
+    stock_materials = stock_df['numer indeksu'].to_numpy(dtype=np.int64)
+
+    # Kolumny prognozy
+    weeks = list(forecast_df.columns)
+    parsed = [get_year_week_from_col(col) for col in weeks]
+    if len(weeks) < 2:
+        report.add('short_horizon', pd.DataFrame({'Kolumna': weeks}), forecast_materials)
+    ignored = forecast_df.attrs.get('ignored_columns', [])
+    report.add('ignored_column', pd.DataFrame({'Kolumna': ignored}))
+    week_table = pd.DataFrame({
+        'Kolumna': weeks,
+        'Rok': [p[0] if p else None for p in parsed],
+        'Tydzień': [p[1] if p else None for p in parsed]
+    })
+    report.add('duplicate_week', week_table[week_table.duplicated(['Rok', 'Tydzień'], keep=False)])
+
+    # Materiały prognozy
+    duplicated = forecast_df.index.duplicated(keep=False)
+    report.add(
+        'duplicate_forecast',
+        forecast_df[duplicated].reset_index().rename(columns={forecast_df.index.name or 'index': 'Materiał'}),
+        forecast_materials[duplicated]
+    )
+    missing = np.setdiff1d(forecast_materials, stock_materials)
+    report.add('missing_stock', pd.DataFrame({'Materiał': missing}), missing)
+
+    # Plik stanu - tylko materiały obecne w prognozie
+    in_forecast = np.isin(stock_materials, forecast_materials)
+    on_hand = stock_df['w magazynie']
+    site_keys = [stock_df['numer indeksu']] + ([stock_df[WAREHOUSE_COLUMN]] if WAREHOUSE_COLUMN in stock_df.columns else [])
+    spread = on_hand.groupby(site_keys).transform('nunique').to_numpy()
+    inconsistent = in_forecast & (spread > 1)
+    report.add('inconsistent_stock', _stock_rows(stock_df, inconsistent), stock_materials[inconsistent])
+    negative = in_forecast & (on_hand.to_numpy(dtype=float) < 0)
+    report.add('negative_stock', _stock_rows(stock_df, negative), stock_materials[negative])
+
+    # Wiersze bez kodu magazynu obok magazynów z kodem - suma ERP albo zapas nieprzypisany
+    if WAREHOUSE_COLUMN in stock_df.columns:
+        blank = in_forecast & (stock_df[WAREHOUSE_COLUMN] == DEFAULT_WAREHOUSE).to_numpy()
+        levels = (
+            stock_df[in_forecast].groupby(['numer indeksu', WAREHOUSE_COLUMN], sort=False)['w magazynie']
+            .first().sort_index()
+        )
+        for code, mask in zip(('site_total_row', 'unassigned_site_stock'), blank_site_rows(levels)):
+            rows = blank & np.isin(stock_materials, levels.index.get_level_values(0)[mask])
+            report.add(code, _stock_rows(stock_df, rows), stock_materials[rows])
+
+    doc = stock_df['DocNum'].astype(str).str.upper()
+    relevant = in_forecast & (
+        (doc.str.contains('ZP', na=False) & (stock_df['Zamówione'] > 0)) |
+        (doc.str.contains('ZS', na=False) & (stock_df['Potwierdzone'] > 0))
+    ).to_numpy()
+    no_date = stock_df['Data dostawy'].isna().to_numpy()
+    report.add('invalid_delivery_date', _stock_rows(stock_df, relevant & no_date), stock_materials[relevant & no_date])
+
+    week_keys = np.array([year * 100 + week for year, week in filter(None, parsed)], dtype=float)
+    row_keys = (
+        stock_df['year'].to_numpy(dtype=float, na_value=np.nan) * 100 +
+        stock_df['week'].to_numpy(dtype=float, na_value=np.nan)
+    )
+    outside = relevant & ~no_date & ~np.isin(row_keys, week_keys)
+    report.add('outside_horizon', _stock_rows(stock_df, outside), stock_materials[outside])
+
+    return report
+
+def prepare_inputs(forecast_df: pd.DataFrame, stock_df: pd.DataFrame):
+    """Walidacja i wykluczenie błędnych materiałów. Zwraca (prognoza, stan, raport)."""
+    report = validate_inputs(forecast_df, stock_df)
+    forecast_clean, stock_clean = report.apply(forecast_df, stock_df)
+    return forecast_clean, stock_clean, report
+
+def get_validated_inputs():
+    """Dane bieżącej sesji po walidacji - wynik współdzielony przez sesje z tymi samymi plikami."""
+    forecast_df = st.session_state.forecast_data
+    stock_df = st.session_state.stock_data
+    forecast_key = st.session_state.get('forecast_key')
+    stock_key = st.session_state.get('stock_key')
+    if forecast_key and stock_key:
+        return get_shared_store().acquire(
+            ('quality', forecast_key, stock_key),
+            lambda: prepare_inputs(forecast_df, stock_df),
+            slot='quality'
+        )
+    return prepare_inputs(forecast_df, stock_df)
+
+def render_quality_report(report: QualityReport):
+    """Raport jakości danych: tabela podsumowania i wiersze, których dotyczy każdy problem."""
+    if not report.issues:
+        st.success("✅ Nie wykryto problemów z jakością danych.")
+        return
+
+    excluded = report.excluded_materials
+    if len(excluded):
+        st.warning(f"⚠️ {len(excluded)} materiałów zostanie wykluczonych z analizy z powodu błędów w danych.")
+    st.dataframe(report.summary().drop(columns='Kod'), use_container_width=True, hide_index=True)
+
+    for code, issue in report.issues.items():
+        rows = issue['rows']
+        with st.expander(f"{LEVEL_LABELS[issue['level']]}: {issue['description']} ({len(rows)})"):
+            st.dataframe(rows.head(500), use_container_width=True, hide_index=True)
+            st.download_button(
+                label="📥 Pobierz wiersze (CSV)",
+                data=rows.to_csv(index=False, sep=';', decimal=',').encode('utf-8-sig'),
+                file_name=f"jakosc_{code}.csv",
+                mime="text/csv",
+                key=f"quality_download_{code}"
+            )
@@ -0,0 +1,156 @@
+# warehouses.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils import (
+    simulate_portfolio,
+    build_weekly_flows,
+    forecast_week_positions,
+    site_stock_levels,
+    run_as_is_batch,
+    run_optimized_batch,
+    receivable_weeks,
+    ForecastRows,
+    STATUS_SHORTAGE,
+    STATUS_EXCESS,
+    WAREHOUSE_COLUMN
+)
+
+CONSOLIDATED = "Σ Skonsolidowany"
+
+def demand_shares(stock_rows: pd.DataFrame, stock_levels: pd.Series = None) -> pd.Series:
+    """Udział magazynu w popycie materiału, indeks (materiał, magazyn).
+
+    Podział wg potwierdzonych rozchodów ZS magazynu; materiały bez ZS dzielone
+    są wg stanu magazynowego, a bez zapasu - po równo między ich magazyny.
+    """
+    doc = stock_rows['DocNum'].astype(str).str.upper()
+    zs = stock_rows['Potwierdzone'].where(doc.str.contains('ZS', na=False) & (stock_rows['Potwierdzone'] > 0), 0.0)
+    keys = [stock_rows['numer indeksu'], stock_rows[WAREHOUSE_COLUMN]]
+    zs_by_site = zs.groupby(keys).sum().sort_index()
+    if stock_levels is None:
+        stock_levels = site_stock_levels(stock_rows)
+    stock_by_site = stock_levels.clip(lower=0).reindex(zs_by_site.index)
+
+    def share(values: pd.Series) -> pd.Series:
+        total = values.groupby(level=0).transform('sum')
+        return values / total.where(total > 0)
+
+    equal = 1.0 / zs_by_site.groupby(level=0).transform('size')
+    return share(zs_by_site).fillna(share(stock_by_site)).fillna(equal)
+
+def simulate_site(shared: dict, site_rows: pd.DataFrame, shares: pd.Series, stock_levels: pd.Series, site: str) -> dict:
+    """Symulacja AS-IS/TO-BE jednego magazynu na wspólnej macierzy prognozy.
+
+    Popyt magazynu to wiersz prognozy materiału przemnożony przez udział
+    magazynu (``ForecastRows``); ZP i ZS pochodzą z dokumentów magazynu, a stan
+    z ``stock_levels`` (``site_stock_levels`` całego pliku - z regułą wiersza sumy).
+    """
+    site_materials = np.unique(site_rows['numer indeksu'].to_numpy(dtype=np.int64))
+    materials = np.intersect1d(shared['materials'], site_materials)
+    rows = np.searchsorted(shared['materials'], materials)
+    site_rows = site_rows[site_rows['numer indeksu'].isin(materials)]
+
+    weeks = shared['weeks']
+    n = len(weeks)
+    week_positions = forecast_week_positions(weeks)
+    doc = site_rows['DocNum'].astype(str).str.upper()
+    zp_rows = site_rows[doc.str.contains('ZP', na=False) & (site_rows['Zamówione'] > 0)]
+    zs_rows = site_rows[doc.str.contains('ZS', na=False) & (site_rows['Potwierdzone'] > 0)]
+
+    stock = stock_levels.xs(site, level=1).reindex(materials).fillna(0).to_numpy(dtype=float)
+    share = shares.xs(site, level=1).reindex(materials).to_numpy(dtype=float)
+    # Partia magazynu z jego pierwszego ZP, w przeciwnym razie partia materiału z całego portfela
+    site_batch = (
+        zp_rows.sort_values(by='Data dostawy', kind='stable')
+        .groupby('numer indeksu')['Zamówione'].first()
+        .reindex(materials).to_numpy(dtype=float)
+    )
+    batch = np.where(np.isnan(site_batch), shared['batch'][rows], site_batch)
+
+    forecast = ForecastRows(shared['forecast'], rows, share)
+    income = build_weekly_flows(zp_rows, 'Zamówione', materials, week_positions, n)
+    consumption = build_weekly_flows(zs_rows, 'Potwierdzone', materials, week_positions, n)
+    receivable = receivable_weeks(weeks)
+    return {
+        'site': site,
+        'materials': materials,
+        'rows': rows,
+        'share': share,
+        'stock': stock,
+        'batch': batch,
+        'as_is': run_as_is_batch(stock, forecast, income, consumption),
+        'to_be': run_optimized_batch(stock, forecast, income, consumption, batch, receivable)
+    }
+
+def _site_summary(result: dict, total_demand: np.ndarray) -> pd.DataFrame:
+    has_shortage = (result['as_is']['status'] == STATUS_SHORTAGE).any(axis=1)
+    has_excess = (result['as_is']['status'] == STATUS_EXCESS).any(axis=1)
+    return pd.DataFrame({
+        'Magazyn': result['site'],
+        'Materiał': result['materials'],
+        'Udział popytu': result['share'],
+        'Stan magazynowy': result['stock'],
+        'Popyt całkowity': total_demand[result['rows']] * result['share'],
+        'Status': np.where(has_shortage, "🔴 BRAKI", np.where(has_excess, "🟡 NADMIAR", "✅ OK")),
+        'Braki': has_shortage,
+        'Nadmiar': has_excess,
+        'Produkcja TO-BE': result['to_be']['production'].sum(axis=1)
+    })
+
+def analyze_warehouses(forecast_df: pd.DataFrame, stock_df: pd.DataFrame, portfolio: dict = None,
+                       max_workers: int = None) -> dict:
+    """Analiza per magazyn i widok skonsolidowany.
+
+    Widok skonsolidowany to wynik ``simulate_portfolio`` ze stanem zsumowanym po
+    magazynach - można przekazać gotowy ``portfolio`` z Dashboardu, wtedy
+    symulowane są tylko partycje magazynów. Partycje są przeliczane współbieżnie
+    w wątkach, które współdzielą jedną macierz prognozy (bez kopii na partycję);
+    pętle tygodni silników trzymają GIL, więc przyspieszenie zależy od udziału
+    operacji NumPy - to współbieżność, nie pełne zrównoleglenie.
+    Zwraca słownik: 'sites' (wyniki per magazyn), 'consolidated' (portfel)
+    i 'summary' (wiersz = magazyn × materiał).
+    """
+    if portfolio is None:
+        portfolio = simulate_portfolio(forecast_df, stock_df)
+    stock_rows = stock_df[stock_df['numer indeksu'].isin(portfolio['materials'])]
+    stock_levels = site_stock_levels(stock_rows)
+    shares = demand_shares(stock_rows, stock_levels)
+    partitions = [(site, rows) for site, rows in stock_rows.groupby(WAREHOUSE_COLUMN, sort=True)]
+
+    workers = max_workers or min(len(partitions), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        site_futures = [
+            pool.submit(simulate_site, portfolio, rows, shares, stock_levels, site) for site, rows in partitions
+        ]
+        sites = {result['site']: result for result in (future.result() for future in site_futures)}
+
+    total_demand = portfolio['forecast'].sum(axis=1)
+    consolidated_summary = _site_summary({
+        'site': CONSOLIDATED,
+        'materials': portfolio['materials'],
+        'rows': np.arange(len(portfolio['materials'])),
+        'share': np.ones(len(portfolio['materials'])),
+        'stock': portfolio['stock'],
+        'as_is': portfolio['as_is'],
+        'to_be': portfolio['to_be']
+    }, total_demand)
+    summary = pd.concat(
+        [consolidated_summary] + [_site_summary(result, total_demand) for result in sites.values()],
+        ignore_index=True
+    )
+    return {'sites': sites, 'consolidated': portfolio, 'summary': summary}
+
+def warehouse_overview(summary: pd.DataFrame) -> pd.DataFrame:
+    """Zestawienie per magazyn: liczba materiałów, braki, nadmiar, zapas i produkcja TO-BE."""
+    return summary.groupby('Magazyn', sort=False).agg(**{
+        'Materiałów': ('Materiał', 'size'),
+        'Braki': ('Braki', 'sum'),
+        'Nadmiar': ('Nadmiar', 'sum'),
+        'Stan magazynowy': ('Stan magazynowy', 'sum'),
+        'Produkcja TO-BE': ('Produkcja TO-BE', 'sum')
+    }).reset_index()
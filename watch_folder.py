@@ -0,0 +1,399 @@
+# watch_folder.py
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from scipy import sparse
+
+from shared_store import content_hash, current_session_id, get_shared_store
+from validation import prepare_inputs
+from utils import (
+    process_forecast_file,
+    process_stock_file,
+    build_portfolio_arrays,
+    run_as_is_batch,
+    run_optimized_batch,
+    receivable_weeks,
+    simulate_portfolio,
+    analyze_all_materials_batch,
+    WAREHOUSE_COLUMN
+)
+
+WATCHER_SESSION = "watch-folder"
+# Katalog główny, poza który obserwator nie wychodzi (bez niego folder obserwowany jest wyłączony)
+WATCH_ROOT_ENV = 'THIMM_WATCH_ROOT'
+STORE_SLOTS = ('forecast', 'stock', 'quality', 'portfolio', 'analysis')
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+STOCK_HASH_COLUMNS = ['numer indeksu', WAREHOUSE_COLUMN, 'DocNum', 'Data dostawy', 'Zamówione', 'Potwierdzone', 'w magazynie']
+
+def detect_file_kind(path: str):
+    """Rozpoznaje typ eksportu po nagłówku: 'forecast', 'stock' albo None."""
+    try:
+        if path.lower().endswith('.csv'):
+            columns = None
+            for encoding in ['utf-8', 'windows-1250', 'latin1', 'iso-8859-2']:
+                try:
+                    columns = pd.read_csv(path, sep=';', encoding=encoding, nrows=0).columns
+                    break
+                except Exception:
+                    continue
+        else:
+            columns = pd.read_excel(path, nrows=0).columns
+    except Exception:
+        return None
+    if columns is None:
+        return None
+    if 'Materialnummer' in columns:
+        return 'forecast'
+    if 'numer indeksu' in columns:
+        return 'stock'
+    return None
+
+def forecast_fingerprints(forecast_df: pd.DataFrame) -> pd.Series:
+    """Skrót wiersza prognozy dla każdego materiału."""
+    unique = forecast_df[~forecast_df.index.duplicated(keep='first')]
+    return pd.Series(pd.util.hash_pandas_object(unique, index=True).to_numpy(), index=unique.index)
+
+def stock_fingerprints(stock_df: pd.DataFrame) -> pd.Series:
+    """Skrót wszystkich dokumentów materiału (z uwzględnieniem ich kolejności)."""
+    rows = stock_df[STOCK_HASH_COLUMNS].copy()
+    rows['pozycja'] = rows.groupby('numer indeksu').cumcount()
+    hashes = pd.Series(pd.util.hash_pandas_object(rows, index=False).to_numpy(), index=rows['numer indeksu'])
+    return hashes.groupby(level=0).sum()
+
+def _changed(new: pd.Series, old: pd.Series) -> np.ndarray:
+    """Materiały nowe lub ze zmienionym skrótem."""
+    known = new.index.isin(old.index)
+    same = old.reindex(new.index, fill_value=0).to_numpy() == new.to_numpy()
+    return new.index[~known | ~same].to_numpy()
+
+def update_portfolio(previous: dict, forecast_df: pd.DataFrame, stock_df: pd.DataFrame):
+    """Aktualizuje wynik ``simulate_portfolio``, symulując ponownie tylko zmienione materiały.
+
+    Zwraca (nowy portfel, liczba przeliczonych materiałów). Gdy zmieniły się
+    kolumny tygodni, portfel jest budowany od zera.
+    """
+    fingerprints = (forecast_fingerprints(forecast_df), stock_fingerprints(stock_df))
+    if previous is None or list(previous['weeks']) != list(forecast_df.columns):
+        portfolio = simulate_portfolio(forecast_df, stock_df)
+        portfolio['fingerprints'] = fingerprints
+        return portfolio, len(portfolio['materials'])
+
+    old_forecast, old_stock = previous['fingerprints']
+    changed = np.union1d(_changed(fingerprints[0], old_forecast), _changed(fingerprints[1], old_stock))
+
+    # Przeliczenie tylko podzbioru - każdy materiał zależy wyłącznie od własnych wierszy
+    update = build_portfolio_arrays(
+        forecast_df[forecast_df.index.isin(changed)],
+        stock_df[stock_df['numer indeksu'].isin(changed)]
+    )
+    receivable = receivable_weeks(update['weeks'])
+    update['as_is'] = run_as_is_batch(update['stock'], update['forecast'], update['income'], update['consumption'])
+    update['to_be'] = run_optimized_batch(
+        update['stock'], update['forecast'], update['income'], update['consumption'], update['batch'], receivable
+    )
+
+    materials = np.intersect1d(
+        forecast_df.index.to_numpy(dtype=np.int64),
+        stock_df['numer indeksu'].to_numpy(dtype=np.int64)
+    )
+    from_update = np.isin(materials, update['materials'])
+    prev_rows = np.searchsorted(previous['materials'], materials[~from_update])
+    update_rows = np.searchsorted(update['materials'], materials[from_update])
+    order = np.argsort(np.concatenate([np.flatnonzero(~from_update), np.flatnonzero(from_update)]), kind='stable')
+
+    def merge(old, new):
+        if sparse.issparse(old):
+            return sparse.vstack([old.tocsr()[prev_rows], new.tocsr()[update_rows]]).tocsr()[order]
+        return np.concatenate([old[prev_rows], new[update_rows]])[order]
+
+    portfolio = {'materials': materials, 'weeks': list(forecast_df.columns), 'fingerprints': fingerprints}
+    for key in ('stock', 'forecast', 'income', 'consumption', 'batch'):
+        portfolio[key] = merge(previous[key], update[key])
+    for scenario in ('as_is', 'to_be'):
+        portfolio[scenario] = {
+            key: merge(previous[scenario][key], update[scenario][key])
+            for key in previous[scenario]
+        }
+    return portfolio, len(update['materials'])
+
+class FolderWatcher:
+    """Obserwuje katalog z eksportami ERP i na bieżąco przelicza analizę w tle.
+
+    Plik jest przetwarzany dopiero, gdy jego rozmiar i data modyfikacji nie
+    zmieniły się między dwoma kolejnymi skanami (eksport został dopisany do końca).
+    Wyniki trafiają do współdzielonego magazynu pod tymi samymi kluczami co
+    pliki wgrane ręcznie, więc Dashboard od razu trafia w gotowe dane.
+    """
+
+    def __init__(self, directory: str, store, interval: float = 30.0):
+        self.directory = directory
+        self.store = store
+        # Osobna "sesja" magazynu dla każdego katalogu - obserwatory nie podmieniają sobie slotów
+        self.session_id = f"{WATCHER_SESSION}:{directory}"
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._signatures = {}
+        self._processed = {}
+        self._portfolio = None
+        self.forecast = None
+        self.stock = None
+        self.analysis_key = None
+        self.last_scan = None
+        self.last_refresh = None
+        self.last_refresh_seconds = None
+        self.last_recomputed = 0
+        self.error = None
+        self._pending = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self) -> 'FolderWatcher':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.scan()
+                self.error = None
+            except Exception as e:
+                self.error = e
+            # Nowe pliki sprawdzamy ponownie szybciej, żeby nie czekać pełnego interwału
+            self._stop.wait(min(self.interval, 2.0) if self._pending else self.interval)
+        for slot in STORE_SLOTS:
+            self.store.release(slot, session_id=self.session_id)
+
+    def _stable_files(self):
+        """Zwraca nowe lub zmienione pliki, których zapis się zakończył."""
+        ready = []
+        current = {}
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.lower().endswith(SUPPORTED_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            signature = (stat.st_mtime, stat.st_size)
+            current[entry.path] = signature
+            if self._signatures.get(entry.path) == signature and self._processed.get(entry.path) != signature:
+                ready.append((stat.st_mtime, entry.path, signature))
+        self._signatures = current
+        ready_paths = {path for _, path, _ in ready}
+        self._pending = any(
+            path not in ready_paths and self._processed.get(path) != signature
+            for path, signature in current.items()
+        )
+        return [(path, signature) for _, path, signature in sorted(ready)]
+
+    def scan(self):
+        """Jeden przebieg: wczytuje najnowsze gotowe pliki i odświeża analizę."""
+        self.last_scan = time.time()
+        self.store.keep_alive(self.session_id)
+        updated = False
+
+        for path, signature in self._stable_files():
+            kind = detect_file_kind(path)
+            self._processed[path] = signature
+            if kind is None:
+                continue
+            with open(path, 'rb') as handle:
+                data = handle.read()
+            key = (kind, content_hash(data))
+            current = self.forecast if kind == 'forecast' else self.stock
+            if current is not None and (current['key'] == key or current['mtime'] > signature[0]):
+                continue
+
+            with open(path, 'rb') as handle:
+                if kind == 'forecast':
+                    value = self.store.acquire(key, lambda: process_forecast_file(handle), slot='forecast', session_id=self.session_id)
+                else:
+                    value = self.store.acquire(key, lambda: process_stock_file(handle, path), slot='stock', session_id=self.session_id)
+            entry = {'key': key, 'data': value, 'filename': os.path.basename(path), 'mtime': signature[0]}
+            with self._lock:
+                if kind == 'forecast':
+                    self.forecast = entry
+                else:
+                    self.stock = entry
+            updated = True
+
+        if updated and self.forecast is not None and self.stock is not None:
+            self.refresh()
+
+    def refresh(self):
+        """Przelicza portfel przyrostowo i publikuje wyniki w magazynie."""
+        start = time.perf_counter()
+        forecast, stock = self.forecast, self.stock
+        # Te same dane po walidacji co w sesjach - klucze magazynu wskazują wyniki dla danych oczyszczonych
+        validated = prepare_inputs(forecast['data'], stock['data'])
+        forecast_df, stock_df, _ = validated
+        portfolio, recomputed = update_portfolio(self._portfolio, forecast_df, stock_df)
+        summary_df = analyze_all_materials_batch(forecast_df, stock_df, portfolio)
+        self._portfolio = portfolio
+
+        analysis_key = ('analysis', forecast['key'], stock['key'])
+        self.store.acquire(('quality', forecast['key'], stock['key']), lambda: validated, slot='quality', session_id=self.session_id)
+        self.store.acquire(('portfolio', forecast['key'], stock['key']), lambda: portfolio, slot='portfolio', session_id=self.session_id)
+        self.store.acquire(analysis_key, lambda: summary_df, slot='analysis', session_id=self.session_id)
+
+        with self._lock:
+            self.analysis_key = analysis_key
+            self.last_recomputed = recomputed
+            self.last_refresh = time.time()
+            self.last_refresh_seconds = time.perf_counter() - start
+
+    def snapshot(self):
+        """Zwraca (prognoza, stan) gotowe do użycia w sesji lub None, jeśli analiza nie jest jeszcze gotowa."""
+        with self._lock:
+            if self.analysis_key is None:
+                return None
+            return self.forecast, self.stock
+
+class WatcherRegistry:
+    """Obserwatory katalogów współdzielone przez sesje serwera.
+
+    Sesja śledzi co najwyżej jeden katalog - wybór innego odłącza ją od
+    poprzedniego. Obserwator działa, dopóki śledzi go choć jedna sesja; koniec
+    sesji (wygaśnięcie w magazynie współdzielonym) odłącza ją automatycznie.
+    """
+
+    def __init__(self, store, interval: float = 30.0):
+        self.store = store
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._watchers = {}
+        self._owners = {}
+        self._sessions = {}
+
+    def attach(self, directory: str, session_id: str) -> FolderWatcher:
+        """Przypisuje sesji obserwator katalogu (uruchamiając go w razie potrzeby)."""
+        with self._lock:
+            previous = self._sessions.get(session_id)
+            if previous is None:
+                self.store.on_session_end(lambda: self.detach(session_id), session_id=session_id)
+            elif previous != directory:
+                self._detach(session_id)
+            watcher = self._watchers.get(directory)
+            if watcher is None or not watcher.running:
+                watcher = FolderWatcher(directory, self.store, self.interval).start()
+                self._watchers[directory] = watcher
+            self._owners.setdefault(directory, set()).add(session_id)
+            self._sessions[session_id] = directory
+            return watcher
+
+    def detach(self, session_id: str):
+        """Odłącza sesję; obserwator bez sesji jest zatrzymywany."""
+        with self._lock:
+            self._detach(session_id)
+
+    def _detach(self, session_id: str):
+        directory = self._sessions.pop(session_id, None)
+        owners = self._owners.get(directory)
+        if owners is None:
+            return
+        owners.discard(session_id)
+        if not owners:
+            self._watchers.pop(directory).stop()
+            del self._owners[directory]
+
+    def watcher(self, session_id: str):
+        """Obserwator śledzony przez sesję lub None."""
+        with self._lock:
+            return self._watchers.get(self._sessions.get(session_id))
+
+@st.cache_resource
+def get_watcher_registry() -> WatcherRegistry:
+    """Zwraca jeden rejestr obserwatorów dla całego procesu serwera."""
+    return WatcherRegistry(get_shared_store())
+
+def resolve_watch_directory(directory: str, root: str = None) -> str:
+    """Ścieżka katalogu wewnątrz katalogu głównego ``THIMM_WATCH_ROOT``.
+
+    ``directory`` jest względna wobec katalogu głównego (pusta = sam katalog główny).
+    Ścieżki wychodzące poza niego (``..``, ścieżki bezwzględne, dowiązania) dają ValueError.
+    """
+    root = root if root is not None else os.environ.get(WATCH_ROOT_ENV)
+    if not root:
+        raise ValueError(f"Folder obserwowany jest wyłączony - ustaw zmienną środowiskową {WATCH_ROOT_ENV}.")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, directory.strip()))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError("Katalog musi leżeć wewnątrz katalogu głównego obserwacji.")
+    if not os.path.isdir(path):
+        raise ValueError("Katalog nie istnieje.")
+    return path
+
+def sync_session_from_watcher():
+    """Podmienia dane sesji na najnowszy komplet z folderu, jeśli sesja śledzi folder."""
+    if not st.session_state.get('follow_watch_folder'):
+        return
+    watcher = get_watcher_registry().watcher(current_session_id())
+    snapshot = watcher.snapshot() if watcher is not None else None
+    if snapshot is None:
+        return
+    forecast, stock = snapshot
+    store = get_shared_store()
+    if st.session_state.get('forecast_key') != forecast['key']:
+        st.session_state.forecast_data = store.acquire(forecast['key'], lambda: forecast['data'], slot='forecast')
+        st.session_state.forecast_key = forecast['key']
+        st.session_state.forecast_filename = f"📂 {forecast['filename']}"
+    if st.session_state.get('stock_key') != stock['key']:
+        st.session_state.stock_data = store.acquire(stock['key'], lambda: stock['data'], slot='stock')
+        st.session_state.stock_key = stock['key']
+        st.session_state.stock_filename = f"📂 {stock['filename']}"
+
+def render_watch_folder_controls():
+    """Panel w sidebarze: wybór katalogu, śledzenie zmian i stan obserwatora."""
+    root = os.environ.get(WATCH_ROOT_ENV)
+    if not root:
+        return
+    registry = get_watcher_registry()
+    session_id = current_session_id()
+    with st.sidebar.expander("📂 Folder obserwowany", expanded=st.session_state.get('watch_folder') is not None):
+        directory = st.text_input(
+            f"Podkatalog w {root}:",
+            value=st.session_state.get('watch_folder') or "",
+            help="Ścieżka względna wobec katalogu głównego obserwacji; pusta - sam katalog główny."
+        )
+        follow = st.checkbox(
+            "Automatycznie używaj najnowszych plików",
+            value=st.session_state.get('follow_watch_folder', False)
+        )
+        if not st.toggle("Obserwuj katalog", value=st.session_state.get('watch_folder') is not None):
+            registry.detach(session_id)
+            st.session_state.watch_folder = None
+            st.session_state.follow_watch_folder = False
+            return
+        try:
+            path = resolve_watch_directory(directory, root)
+        except ValueError as e:
+            registry.detach(session_id)
+            st.error(f"❌ {e}")
+            return
+
+        st.session_state.watch_folder = directory
+        st.session_state.follow_watch_folder = follow
+        watcher = registry.attach(path, session_id)
+
+        if watcher.error is not None:
+            st.error(f"❌ Błąd obserwatora: {watcher.error}")
+        if watcher.forecast:
+            st.caption(f"📈 {watcher.forecast['filename']}")
+        if watcher.stock:
+            st.caption(f"📦 {watcher.stock['filename']}")
+        if watcher.last_refresh:
+            st.caption(
+                f"🔄 Analiza z {time.strftime('%H:%M:%S', time.localtime(watcher.last_refresh))} "
+                f"({watcher.last_recomputed} przeliczonych materiałów, {watcher.last_refresh_seconds:.1f} s)"
+            )
+        elif watcher.last_scan:
+            st.caption("⏳ Oczekiwanie na kompletne pliki prognozy i stanu...")